@@ -8,3 +8,6 @@ class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.orders'
     verbose_name = 'Заказы'
+
+    def ready(self):
+        import apps.orders.signals  # noqa: F401
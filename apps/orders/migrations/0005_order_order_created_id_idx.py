@@ -0,0 +1,13 @@
+# Generated by Django 4.2.3 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [('orders', '0004_remove_delivery_created_remove_delivery_phone_and_more')]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order', index=models.Index(fields=['-created', '-id'], name='order_created_id_idx')
+        )
+    ]
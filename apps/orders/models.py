@@ -2,7 +2,7 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import Sum, UniqueConstraint
+from django.db.models import Prefetch, Sum, UniqueConstraint
 
 from apps.product.models import Product
 
@@ -47,6 +47,13 @@ class Delivery(models.Model):
         return self.address
 
 
+class OrderQuerySet(models.QuerySet):
+    def for_read(self):
+        """Заказы с доставкой и строками вместе с товарами - для OrderReadSerializer без запроса на строку."""
+        lines = OrderProduct.objects.select_related('product')
+        return self.select_related('delivery').prefetch_related(Prefetch('order_products', queryset=lines))
+
+
 class Order(models.Model):
     """Модель заказов."""
 
@@ -64,10 +71,13 @@ class Order(models.Model):
     )
     paid = models.BooleanField(verbose_name='Оплачено', default=False)
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
+        indexes = (models.Index(fields=('-created', '-id'), name='order_created_id_idx'),)
 
     def __str__(self):
         return f'Заказ: {self.id} - {self.user.email}'
@@ -6,7 +6,12 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from apps.orders.models import Delivery, DeliveryType, Order, OrderProduct, Storehouse
+from apps.product.catalog import bump_catalog_version
+from apps.product.models import Product
+from apps.product.popularity import record_order
+from apps.product.reference import ReferencePrimaryKeyRelatedField, delivery_types
 from apps.users.serializers import UserSerializer
+from common.metrics import ORDERS_CREATED, STOCK_CONFLICTS
 
 User = get_user_model()
 
@@ -22,7 +27,9 @@ class DeliveryTypeSerializer(serializers.ModelSerializer):
 class DeliverySerializer(serializers.ModelSerializer):
     """Сериализатор для модели Delivery."""
 
-    type_delivery = serializers.PrimaryKeyRelatedField(queryset=DeliveryType.objects.all(), allow_null=True)
+    type_delivery = ReferencePrimaryKeyRelatedField(
+        delivery_types, queryset=DeliveryType.objects.all(), allow_null=True
+    )
 
     class Meta:
         model = Delivery
@@ -85,6 +92,8 @@ class OrderWriteSerializer(serializers.ModelSerializer):
         order = Order.objects.create(user=user, delivery=delivery, **validated_data)
         self.update_storehouse(products)
         self.add_products(order, products)
+        record_order(order.created, [(product['product'], product['quantity']) for product in products])
+        transaction.on_commit(ORDERS_CREATED.inc)
         return order
 
     @staticmethod
@@ -98,6 +107,7 @@ class OrderWriteSerializer(serializers.ModelSerializer):
 
             storehouse_product_quantity = storehouse_product.quantity
             if storehouse_product_quantity < ordered_quantity:
+                STOCK_CONFLICTS.inc()
                 raise ValidationError(
                     f'Для заказа товара {ordered_product} доступно {storehouse_product_quantity} шт.'
                 )
@@ -106,23 +116,34 @@ class OrderWriteSerializer(serializers.ModelSerializer):
             storehouse.append(storehouse_product)
 
         Storehouse.objects.bulk_update(storehouse, ['quantity'])
+        bump_catalog_version('stock')
 
     @staticmethod
     @transaction.atomic
     def add_products(order, products):
-        """Сохраняет в базу данные заказа в OrderProduct, общую стоимость в Order."""
-        OrderProduct.objects.bulk_create(
-            [
+        """
+        Сохраняет в базу данные заказа в OrderProduct, общую стоимость в Order.
+
+        Цены считаются по скидкам, действующим на момент заказа, а не по сохранённой effective_price.
+        """
+        discounts = Product.objects.filter(pk__in=[product['product'].pk for product in products]).current_discounts()
+        product_discounts = {product['product'].pk: product['product'].active_discount for product in products}
+        order_products = []
+        for product in products:
+            price = product['product'].discounted_price(discounts.get(product['product'].pk, 0))
+            order_products.append(
                 OrderProduct(
                     order=order,
-                    product=product.get('product'),
-                    price=product.get('product').calculate_total_price(),
+                    product=product['product'],
+                    price=price,
                     quantity=product['quantity'],
-                    cost=product.get('product').calculate_total_price() * product['quantity'],
+                    cost=price * product['quantity'],
                 )
-                for product in products
-            ]
-        )
+            )
+        OrderProduct.objects.bulk_create(order_products)
+        # Заказ застал границу периода скидки раньше пересчёта по расписанию - сохранённые цены обновляются сразу.
+        if stale := [pk for pk, discount in discounts.items() if discount != product_discounts[pk]]:
+            transaction.on_commit(lambda: Product.objects.filter(pk__in=stale).update_discounts())
 
         order.total_cost = order.order_products.aggregate(Sum('cost'))['cost__sum']
         order.save()
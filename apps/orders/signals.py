@@ -0,0 +1,18 @@
+"""Сигналы приложения заказов."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.orders.models import DeliveryType, Storehouse
+from apps.product.catalog import bump_catalog_version
+
+
+@receiver((post_save, post_delete), sender=DeliveryType)
+def bump_delivery_types_on_change(sender, **kwargs):
+    """Увеличивает версию способов доставки."""
+    bump_catalog_version('delivery_types')
+
+
+@receiver((post_save, post_delete), sender=Storehouse)
+def bump_stock_on_change(sender, **kwargs):
+    """Увеличивает версию остатков при изменении склада."""
+    bump_catalog_version('stock')
@@ -16,32 +16,43 @@ from apps.orders.serializers import (
     OrderReadSerializer,
     OrderWriteSerializer,
 )
+from apps.product.catalog import CatalogCacheMixin
+from common.pagination import OrderPagination
+from common.streaming import StreamingListMixin
 
 
-class DeliveryTypeViewSet(viewsets.ReadOnlyModelViewSet):
+class DeliveryTypeViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для способов доставки."""
 
     queryset = DeliveryType.objects.all()
     serializer_class = DeliveryTypeSerializer
+    catalog_groups = ('delivery_types',)
 
 
 class DeliveryViewSet(viewsets.ModelViewSet):
     """Вьюсет для доставок."""
 
-    queryset = Delivery.objects.all().select_related('type_delivery')
+    queryset = Delivery.objects.all()
     serializer_class = DeliverySerializer
 
 
-class OrderViewSet(CreateModelMixin, RetrieveModelMixin, ListModelMixin, GenericViewSet):
+class OrderViewSet(StreamingListMixin, CreateModelMixin, RetrieveModelMixin, ListModelMixin, GenericViewSet):
     """Вьюсет для заказов. Создание заказа либо получение заказов."""
 
-    queryset = Order.objects.all().select_related('delivery').prefetch_related('products')
+    queryset = Order.objects.for_read()
+    pagination_class = OrderPagination
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return OrderReadSerializer
         return OrderWriteSerializer
 
+    def list(self, request, *args, **kwargs):
+        if self.is_streaming():
+            queryset = self.filter_queryset(self.get_queryset())
+            return self.get_streaming_response(queryset, self.get_serializer().to_representation)
+        return super().list(request, *args, **kwargs)
+
     def create(self, request, *args, **kwargs):
         if request.user.is_authenticated:
             request.data.pop('user')
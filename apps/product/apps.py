@@ -1,5 +1,7 @@
 """Конфигурация приложения product."""
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class ProductConfig(AppConfig):
@@ -8,3 +10,13 @@ class ProductConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.product'
     verbose_name = 'товары'
+
+    def ready(self):
+        import apps.product.signals  # noqa: F401
+        from apps.product.cart import CART_MERGE_POLICIES
+
+        if settings.CART_MERGE_POLICY not in CART_MERGE_POLICIES:
+            raise ImproperlyConfigured(
+                f'CART_MERGE_POLICY должна быть одной из {", ".join(CART_MERGE_POLICIES)}, '
+                f'получено {settings.CART_MERGE_POLICY!r}.'
+            )
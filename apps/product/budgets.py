@@ -0,0 +1,444 @@
+"""
+Бюджеты SQL-запросов и времени сериализации для маршрутов API.
+
+Проверка создаёт тестовую базу и заполняет её фиксированным набором данных (SyntheticData с seed=0).
+Затем она выполняет запросы CASES к каждому маршруту config.api_router от анонимного и авторизованного
+пользователя. Для каждого запроса считаются SQL-запросы и время работы сериализаторов. Результаты
+сравниваются с бюджетами из файла QUERY_BUDGET_FILE, который хранится в репозитории и меняется вместе
+с кодом.
+
+Каждый запрос выполняется дважды в откатываемой транзакции: первый прогревает кэши процесса, перед
+вторым, измеряемым, очищается общий кэш ответов. Поэтому бюджет описывает запрос без кэша ответа.
+"""
+import functools
+import io
+import json
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, resolve
+from rest_framework.serializers import BaseSerializer, ListSerializer, Serializer
+from rest_framework.test import APIClient
+
+from apps.orders.models import DeliveryType, Storehouse
+from apps.product.models import (
+    CartItem,
+    Category,
+    Collection,
+    Color,
+    Discount,
+    FurnitureDetails,
+    FurniturePicture,
+    Material,
+    Product,
+    ProductType,
+)
+from apps.product.row_serializers import RowSerializer
+from apps.product.synthetic import SyntheticData
+from apps.reviews.models import Review
+from apps.users.models import User
+
+ROLES = ('anon', 'auth')
+PASSWORD = 'synthetic'
+# Запас бюджета времени при обновлении файла: время сериализации заметно меняется от запуска к запуску.
+TIME_HEADROOM = 3
+MIN_TIME_MS = 5
+TRANSACTION_SQL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class Case:
+    """Запрос method к path (шаблон с полями ids из seed_dataset) с телом data от пользователей roles."""
+
+    def __init__(self, name, path, method='get', data=None, roles=ROLES):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.roles = roles
+
+
+CASES = (
+    Case('products-list', '/api/products/'),
+    Case('products-list-filtered', '/api/products/?category={category}&color={color}&ordering=-price'),
+    Case('products-list-search', '/api/products/?search=кресло'),
+    Case('products-list-fields', '/api/products/?fields=id,name,price,color&include=color'),
+    Case('products-list-stream', '/api/products/?stream=true'),
+    Case('products-detail', '/api/products/{product}/'),
+    Case('products-facets', '/api/products/facets/'),
+    Case('products-materials-by-category', '/api/products/materials_by_category/?category={category}'),
+    Case('materials-by-category', '/api/api/products/materials_by_category/'),
+    Case('products-popular', '/api/products/popular/'),
+    Case('products-suggest', '/api/products/suggest/?q=кре'),
+    Case('colors-list', '/api/colors/'),
+    Case('colors-detail', '/api/colors/{color_pk}/'),
+    Case('categories-list', '/api/categories/'),
+    Case('categories-detail', '/api/categories/{category}/'),
+    Case('materials-list', '/api/materials/'),
+    Case('materials-detail', '/api/materials/{material}/'),
+    Case('collections-list', '/api/collections/'),
+    Case('collections-detail', '/api/collections/{collection}/'),
+    Case('reviews-list', '/api/reviews/'),
+    Case('reviews-detail', '/api/reviews/{review}/'),
+    Case('reviews-update', '/api/reviews/{review}/', 'patch', {'rating': 5}, roles=('auth',)),
+    Case('reviews-delete', '/api/reviews/{review}/', 'delete', roles=('auth',)),
+    Case('discounts-list', '/api/discounts/'),
+    Case('discounts-detail', '/api/discounts/{discount}/'),
+    Case('delivery_types-list', '/api/delivery_types/'),
+    Case('delivery_types-detail', '/api/delivery_types/{delivery_type}/'),
+    Case('delivery-list', '/api/delivery/'),
+    Case('delivery-detail', '/api/delivery/{delivery}/'),
+    Case(
+        'delivery-create',
+        '/api/delivery/',
+        'post',
+        {
+            'address': 'ул. Тестовая, д. 1',
+            'type_delivery': '{delivery_type}',
+            'datetime_from': '2030-01-01T10:00:00Z',
+            'datetime_to': '2030-01-01T12:00:00Z',
+        },
+    ),
+    Case('delivery-update', '/api/delivery/{delivery}/', 'patch', {'elevator': True}),
+    Case('delivery-delete', '/api/delivery/{delivery}/', 'delete'),
+    Case('orders-list', '/api/orders/'),
+    Case('orders-list-stream', '/api/orders/?stream=true'),
+    Case('orders-detail', '/api/orders/{order}/'),
+    Case(
+        'orders-create',
+        '/api/orders/',
+        'post',
+        {
+            'products': [{'product': '{product}', 'quantity': 1}, {'product': '{new_product}', 'quantity': 2}],
+            'delivery': {
+                'address': 'ул. Тестовая, д. 1',
+                'type_delivery': '{delivery_type}',
+                'datetime_from': '2030-01-01T10:00:00Z',
+                'datetime_to': '2030-01-01T12:00:00Z',
+            },
+            'paid': False,
+            'user': {},
+        },
+        roles=('auth',),
+    ),
+    Case('orders-payment-confirmation', '/api/orders/{order}/payment_confirmation/', 'post'),
+    Case('orders-save-total-cost', '/api/orders/{order}/save_total_cost/', 'post'),
+    Case('cart-items', '/api/carts/items/'),
+    Case('cart-add-item', '/api/carts/add_item/', 'post', {'product': '{new_product}', 'quantity': 2}),
+    Case('cart-delete-item', '/api/carts/delete_item/{cart_product}/', 'delete'),
+    Case(
+        'cart-batch',
+        '/api/carts/batch/',
+        'post',
+        {
+            'operations': [
+                {'op': 'set', 'product': '{new_product}', 'quantity': 2},
+                {'op': 'increment', 'product': '{product}', 'quantity': 1},
+                {'op': 'remove', 'product': '{cart_product}'},
+            ],
+            'delta': True,
+        },
+    ),
+    Case('favorites-list', '/api/favorites/list/'),
+    Case('favorites-add', '/api/favorites/add_favorite/', 'post', {'product': '{new_product}'}),
+    Case('favorites-delete', '/api/favorites/delete_favorite/{favorite_product}/', 'delete'),
+    Case('users-me', '/api/users/me/', roles=('auth',)),
+    Case('users-me-update', '/api/users/me/', 'patch', {'first_name': 'Анна'}, roles=('auth',)),
+    Case(
+        'users-create',
+        '/api/users/me/',
+        'post',
+        {'email': 'budget@example.com', 'password': 'Budget-pass-123', 're_password': 'Budget-pass-123'},
+        roles=('anon',),
+    ),
+    Case(
+        'users-change-password',
+        '/api/users/change_password/',
+        'post',
+        {'current_password': PASSWORD, 'new_password': 'Budget-pass-456', 're_new_password': 'Budget-pass-456'},
+        roles=('auth',),
+    ),
+    Case('users-reset-password', '/api/users/reset_password/', 'post', {'email': '{email}'}, roles=('anon',)),
+    Case(
+        'users-reset-password-confirm',
+        '/api/users/reset_password_confirm/',
+        'post',
+        {'uid': 'MQ', 'token': 'invalid', 'new_password': 'Budget-pass-456'},
+        roles=('anon',),
+    ),
+    Case('users-my-orders', '/api/users/my_orders/', roles=('auth',)),
+    Case('brand-list', '/api/brand/'),
+)
+
+
+def fill(value, ids):
+    """Подставляет ids в строки value, в том числе во вложенные списки и словари."""
+    if isinstance(value, str):
+        value = value.format(**ids)
+        return int(value) if value.isdigit() else value
+    if isinstance(value, dict):
+        return {key: fill(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, ids) for item in value]
+    return value
+
+
+def seed_dataset():
+    """Заполняет пустую базу фиксированным набором данных и возвращает (пользователь, id для путей CASES)."""
+    chairs = Category.objects.create(name='Кресла', slug='chairs')
+    tables = Category.objects.create(name='Столы', slug='tables')
+    colors = [Color.objects.create(name=name) for name in ('Черный', 'Белый', 'Серый')]
+    materials = [Material.objects.create(name=name) for name in ('Дуб', 'Сталь', 'Текстиль')]
+    collection = Collection.objects.create(name='Комфо', slug='komfo')
+    details = FurnitureDetails.objects.create(purpose='Для дома', construction='С колесиками')
+    product_type = ProductType.objects.create(name='Кресло')
+    picture = FurniturePicture.objects.create()
+    delivery_type = DeliveryType.objects.create(name='Курьер')
+    DeliveryType.objects.create(name='Самовывоз')
+    templates = (
+        (chairs, 'Кресло офисное', '4200.00'),
+        (tables, 'Стол письменный', '9900.00'),
+        (chairs, 'Кресло', '15000'),
+    )
+    for index, (category, name, price) in enumerate(templates):
+        product = Product.objects.create(
+            article=index + 1,
+            name=name,
+            product_type=product_type,
+            width=60,
+            height=100,
+            length=60,
+            weight='12.00',
+            color=colors[index],
+            images=picture,
+            material=materials[index],
+            legs_material=materials[1],
+            furniture_details=details,
+            country='Россия',
+            brand='ЭргоМакс',
+            warranty=2,
+            price=price,
+            description='Удобная мебель для дома и офиса',
+            category=category,
+            collection=collection if category == chairs else None,
+        )
+        Storehouse.objects.create(product=product, quantity=100)
+    SyntheticData(seed=0, stdout=io.StringIO(), batch_size=1000, workers=0, password=PASSWORD).run(
+        users=5, products=60, orders=40, discounts=3, favorites=4, cart_items=4, reviews=3
+    )
+    user = (
+        User.objects.filter(
+            cartmodels__isnull=False, orders__isnull=False, reviews__isnull=False, favorites__isnull=False
+        )
+        .order_by('pk')
+        .first()
+    )
+    if user is None:
+        raise ValueError('В наборе данных нет пользователя с корзиной, заказами, отзывами и избранным.')
+    cart_products = set(CartItem.objects.filter(cart__user=user).values_list('product_id', flat=True))
+    favorite_products = set(user.favorites.values_list('product_id', flat=True))
+    order = user.orders.order_by('pk').first()
+    ids = {
+        'product': Product.objects.order_by('pk').first().pk,
+        'new_product': Product.objects.exclude(pk__in=cart_products | favorite_products).order_by('pk').first().pk,
+        'category': chairs.slug,
+        'color': colors[0].name,
+        'color_pk': colors[0].pk,
+        'material': materials[0].pk,
+        'collection': collection.pk,
+        'review': Review.objects.filter(user=user).order_by('pk').first().pk,
+        'discount': Discount.objects.order_by('pk').first().pk,
+        'delivery_type': delivery_type.pk,
+        'delivery': order.delivery_id,
+        'order': order.pk,
+        'cart_product': min(cart_products),
+        'favorite_product': min(favorite_products),
+        'email': user.email,
+    }
+    return user, ids
+
+
+class SerializerTimer:
+    """
+    Суммарное время внешних вызовов сериализаторов DRF и RowSerializer внутри блока with.
+
+    Учитываются и вызовы to_representation без .data: так сериализуются элементы потоковых списков.
+    """
+
+    def __init__(self):
+        self.elapsed = 0
+        self.depth = 0
+        self.patches = (
+            (BaseSerializer, 'data', property(self.timed(BaseSerializer.data.fget))),
+            (Serializer, 'to_representation', self.timed(Serializer.to_representation)),
+            (ListSerializer, 'to_representation', self.timed(ListSerializer.to_representation)),
+            (RowSerializer, 'to_representation', self.timed(RowSerializer.to_representation)),
+            (RowSerializer, 'represent', self.timed(RowSerializer.represent)),
+        )
+
+    def timed(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            # Вложенные сериализаторы уже учтены во времени внешнего.
+            if self.depth:
+                return function(*args, **kwargs)
+            self.depth += 1
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.elapsed += time.perf_counter() - started
+                self.depth -= 1
+
+        return wrapper
+
+    def __enter__(self):
+        self.originals = [(owner, name, owner.__dict__[name]) for owner, name, _ in self.patches]
+        for owner, name, replacement in self.patches:
+            setattr(owner, name, replacement)
+        return self
+
+    def __exit__(self, *exc_info):
+        for owner, name, original in self.originals:
+            setattr(owner, name, original)
+
+
+class Measurement:
+    """Результат измеряемого запроса."""
+
+    def __init__(self, status, queries, serializer_ms):
+        self.status = status
+        self.queries = [query for query in queries if not query['sql'].startswith(TRANSACTION_SQL)]
+        self.serializer_ms = serializer_ms
+
+    def as_budget(self):
+        return {
+            'status': self.status,
+            'queries': len(self.queries),
+            'serializer_ms': round(max(self.serializer_ms * TIME_HEADROOM, MIN_TIME_MS), 1),
+        }
+
+
+def get_routes():
+    """Маршруты config.api_router: [(шаблон пути, имя, функция представления)]."""
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns, prefix + str(pattern.pattern))
+            elif isinstance(pattern, URLPattern) and pattern.name != 'api-root':
+                yield prefix + str(pattern.pattern), pattern.name, pattern.callback
+
+    return list(walk(import_module('config.api_router').urlpatterns, 'api/'))
+
+
+class BudgetCheck:
+    """Выполняет CASES на тестовой базе и сравнивает результаты с бюджетами файла path."""
+
+    def __init__(self, path=None, time_factor=None, only=None):
+        self.path = path or settings.QUERY_BUDGET_FILE
+        # Время сериализации зависит от машины и проверяется только с явным множителем.
+        self.time_factor = time_factor
+        self.cases = [case for case in CASES if not only or only in case.name]
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {'version': 0, 'endpoints': {}}
+
+    def save(self, measurements):
+        budgets = self.load()
+        budgets['version'] += 1
+        budgets['endpoints'].update({key: measurement.as_budget() for key, measurement in measurements.items()})
+        budgets['endpoints'] = dict(sorted(budgets['endpoints'].items()))
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(budgets, file, ensure_ascii=False, indent=2)
+            file.write('\n')
+        return budgets['version']
+
+    def uncovered_routes(self, ids):
+        covered = {resolve(case.path.format(**ids).split('?')[0]).func for case in CASES}
+        return [(route, name) for route, name, callback in get_routes() if callback not in covered]
+
+    # Отдельный кэш: общий кэш не должен ни отдавать ответы проверке, ни получать её данные.
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'budgets'}},
+        REFERENCE_CACHE_CHECK_INTERVAL=60 * 60,
+    )
+    def measure_all(self):
+        """Возвращает ({'имя [роль]': Measurement}, маршруты без запросов в CASES); данные не сохраняются."""
+        with transaction.atomic():
+            result = self.measure_cases()
+            transaction.set_rollback(True)
+        return result
+
+    def measure_cases(self):
+        user, ids = seed_dataset()
+        clients = {'anon': APIClient(), 'auth': APIClient()}
+        # Анонимная корзина и избранное - в CART_STORAGE; изменения в сессии измеряемые запросы откатывают.
+        clients['anon'].post('/api/carts/add_item/', {'product': ids['cart_product'], 'quantity': 1}, format='json')
+        clients['anon'].post('/api/favorites/add_favorite/', {'product': ids['favorite_product']}, format='json')
+        measurements = {}
+        for case in self.cases:
+            for role in case.roles:
+                user_id = user.pk if role == 'auth' else None
+                measurements[f'{case.name} [{role}]'] = self.measure(clients[role], case, ids, user_id)
+        return measurements, self.uncovered_routes(ids)
+
+    def measure(self, client, case, ids, user_id):
+        path = case.path.format(**ids)
+        data = fill(case.data, ids)
+        self.authenticate(client, user_id)
+        self.request(client, case.method, path, data)
+        self.authenticate(client, user_id)
+        cache.clear()
+        with SerializerTimer() as timer, CaptureQueriesContext(connection) as queries:
+            status = self.request(client, case.method, path, data)
+        return Measurement(status, queries.captured_queries, timer.elapsed * 1000)
+
+    @staticmethod
+    def authenticate(client, user_id):
+        # Пользователь загружается заново: изменения предыдущего запроса откатываются только в базе.
+        if user_id is not None:
+            client.force_authenticate(User.objects.get(pk=user_id))
+
+    @staticmethod
+    def request(client, method, path, data):
+        """Выполняет запрос в транзакции, которая откатывается, и возвращает код ответа."""
+        with transaction.atomic():
+            response = getattr(client, method)(path, data, format='json')
+            # Потоковый ответ читается целиком: выборка и сериализация выполняются при чтении.
+            response.getvalue()
+            transaction.set_rollback(True)
+        return response.status_code
+
+    def compare(self, measurements):
+        """Список нарушений бюджетов: [(ключ, описание, Measurement)]."""
+        budgets = self.load()['endpoints']
+        failures = []
+        for key, measurement in measurements.items():
+            budget = budgets.get(key)
+            if budget is None:
+                failures.append((key, 'нет бюджета', measurement))
+                continue
+            if measurement.status != budget['status']:
+                failures.append((key, f'код ответа {measurement.status}, ожидался {budget["status"]}', measurement))
+            # Количество запросов сравнивается точно: уменьшение тоже требует записать новый бюджет.
+            if len(measurement.queries) != budget['queries']:
+                failures.append(
+                    (key, f'SQL-запросов {len(measurement.queries)}, бюджет {budget["queries"]}', measurement)
+                )
+            if self.time_factor is not None and measurement.serializer_ms > budget['serializer_ms'] * self.time_factor:
+                failures.append(
+                    (
+                        key,
+                        f'сериализация {measurement.serializer_ms:.1f} мс, бюджет {budget["serializer_ms"]} мс',
+                        measurement,
+                    )
+                )
+        return failures
@@ -1,75 +1,174 @@
 from django.conf import settings
+from django.utils.functional import cached_property
 
-from apps.product.models import Product
+from apps.product.cart_pricing import CartPricer
+from apps.product.cart_storage import final_quantities, get_cart_storage
+from apps.product.catalog import bump_catalog_version, favorites_group
+from apps.product.models import CartItem, CartModel, Favorite, Product
 
 
 class CartAndFavorites:
-    """Корзина товаров не авторизованного пользователя."""
+    """Корзина и избранное не авторизованного пользователя в хранилище CART_STORAGE."""
 
     def __init__(self, request, user=None):
         """Инициализация корзины."""
-        self.session = request.session
+        self.storage = get_cart_storage(request)
         self.user = user
-        self.cart = self.session.get(settings.CART_SESSION_ID) or {}
-        self.favorites = self.session.get(settings.FAVORITE_SESSION_ID) or {}
+
+    @cached_property
+    def cart(self):
+        """Количества товаров в корзине: {id товара: количество}."""
+        return self.storage.get_cart()
+
+    @cached_property
+    def favorites(self):
+        """Идентификаторы товаров в избранном."""
+        return self.storage.get_favorites()
 
     def __len__(self):
         """Количество всех товаров в корзине."""
-        return sum(item.get('quantity') for item in self.cart.values())
+        return sum(self.cart.values())
 
     def extract_items_cart(self):
-        """Возвращает содержимое корзины."""
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        products = [
-            {'product': product, 'quantity': self.cart[str(product.id)].get('quantity')} for product in products
-        ]
-        return {'products': products}
+        """Возвращает содержимое корзины с итогами (CartPricer)."""
+        return CartPricer.for_quantities(self.cart)
 
     def add(self, product_id, quantity=1):
         """Добавить продукт в корзину или обновить его количество."""
-        self.cart[str(product_id)] = {'quantity': quantity}
-        self.save()
+        self.storage.set_quantities({product_id: quantity})
+        self.__dict__.pop('cart', None)
 
-    def save(self):
-        """Сохраняет данные в сессии."""
-        self.session[settings.CART_SESSION_ID] = self.cart
-        self.session[settings.FAVORITE_SESSION_ID] = self.favorites
-        self.session.modified = True
+    def apply(self, operations):
+        """Применяет операции корзины и возвращает количества затронутых товаров."""
+        quantities = self.storage.apply(operations)
+        self.__dict__.pop('cart', None)
+        return quantities
 
     def remove(self, product_id):
         """Удаление товара из корзины."""
-        if str(product_id) in self.cart:
-            del self.cart[str(product_id)]
-            self.save()
+        self.storage.set_quantities({product_id: 0})
+        self.__dict__.pop('cart', None)
 
     def clear(self):
-        """Удаляет корзину из сессии."""
-        del self.session[settings.CART_SESSION_ID]
-        self.session.modified = True
+        """Удаляет корзину."""
+        self.storage.clear()
+        self.__dict__.pop('cart', None)
 
     def add_to_favorites(self, product_id):
         """Добавить товар в избранное."""
-        self.favorites[str(product_id)] = True
-        self.save()
+        self.storage.add_favorite(product_id)
+        self.__dict__.pop('favorites', None)
 
     def remove_from_favorites(self, product_id):
         """Удалить товар из избранного."""
-        if str(product_id) in self.favorites:
-            del self.favorites[str(product_id)]
-            self.save()
+        self.storage.remove_favorite(product_id)
+        self.__dict__.pop('favorites', None)
 
     def clear_favorites(self):
-        """Удаляет корзину из сессии."""
-        del self.session[settings.FAVORITE_SESSION_ID]
-        self.session.modified = True
+        """Удаляет избранное."""
+        self.storage.clear_favorites()
+        self.__dict__.pop('favorites', None)
 
     def extract_items_favorites(self):
         """Возвращает содержимое избранного."""
-        product_ids = self.favorites.keys()
-        products = Product.objects.filter(id__in=product_ids)
+        products = Product.objects.for_listing().filter(id__in=self.favorites)
         return {'products': products}
 
     def is_favorite(self, prodoct_id):
         """Возвращает True, если товар в списке избранного и False, если не в списке."""
-        return str(prodoct_id) in self.favorites.keys()
+        return int(prodoct_id) in self.favorites
+
+
+def extract_favorite_ids(request):
+    """
+    Возвращает неизменяемое множество идентификаторов товаров в избранном.
+
+    Для авторизованного пользователя читает Favorite одним запросом, для анонимного - хранилище CART_STORAGE.
+    """
+    if request is None:
+        return frozenset()
+    if request.user.is_authenticated:
+        return frozenset(Favorite.objects.filter(user=request.user).values_list('product_id', flat=True))
+    return frozenset(CartAndFavorites(request=request).favorites)
+
+
+def apply_user_cart_operations(user, operations):
+    """
+    Применяет операции к корзине пользователя и возвращает количества затронутых товаров.
+
+    Корзина блокируется до конца транзакции, поэтому одновременные increment не теряются. Новые и
+    изменённые строки записываются одним INSERT ... ON CONFLICT, убранные товары - одним DELETE.
+    """
+    cart, _ = CartModel.objects.select_for_update().get_or_create(user=user)
+    product_ids = {operation['product'] for operation in operations}
+    quantities = dict(cart.cartitems.filter(product_id__in=product_ids).values_list('product_id', 'quantity'))
+    result = final_quantities(quantities, operations)
+    changed = {
+        product_id: quantity for product_id, quantity in result.items() if quantity != quantities.get(product_id, 0)
+    }
+    CartItem.objects.bulk_create(
+        [
+            CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in changed.items()
+            if quantity
+        ],
+        update_conflicts=True,
+        unique_fields=('cart', 'product'),
+        update_fields=('quantity', 'updated_at'),
+    )
+    if removed := [product_id for product_id, quantity in changed.items() if not quantity]:
+        cart.cartitems.filter(product_id__in=removed).delete()
+    return result
+
+
+# Количество товара, который есть и в корзине пользователя, и в анонимной корзине: (в аккаунте, анонимное).
+CART_MERGE_POLICIES = {
+    'sum': lambda account, anonymous: account + anonymous,
+    'max': max,
+    'account': lambda account, anonymous: account,
+    'anonymous': lambda account, anonymous: anonymous,
+}
+
+
+def merge_anonymous_cart(request, user):
+    """
+    Переносит анонимную корзину и избранное запроса в корзину и избранное пользователя.
+
+    Количество товара, который уже есть в корзине пользователя, выбирается политикой CART_MERGE_POLICY.
+    Строки корзины записываются одним INSERT ... ON CONFLICT, избранное - одним INSERT ... ON CONFLICT DO
+    NOTHING, поэтому число запросов не зависит от размера корзины. Товары, удалённые из каталога,
+    пропускаются. После переноса анонимная корзина и избранное очищаются, чтобы повторный вход их не добавил.
+    """
+    anonymous = CartAndFavorites(request=request)
+    quantities, favorites = anonymous.cart, anonymous.favorites
+    if not quantities and not favorites:
+        return
+    existing = set(
+        Product.objects.filter(pk__in=quantities.keys() | favorites).order_by().values_list('pk', flat=True)
+    )
+
+    if quantities := {product_id: quantity for product_id, quantity in quantities.items() if product_id in existing}:
+        resolve = CART_MERGE_POLICIES[settings.CART_MERGE_POLICY]
+        cart, _ = CartModel.objects.select_for_update().get_or_create(user=user)
+        account = dict(cart.cartitems.filter(product_id__in=quantities).values_list('product_id', 'quantity'))
+        CartItem.objects.bulk_create(
+            [
+                CartItem(
+                    cart=cart,
+                    product_id=product_id,
+                    quantity=resolve(account[product_id], quantity) if product_id in account else quantity,
+                )
+                for product_id, quantity in quantities.items()
+            ],
+            update_conflicts=True,
+            unique_fields=('cart', 'product'),
+            update_fields=('quantity', 'updated_at'),
+        )
+    if favorites := favorites & existing:
+        Favorite.objects.bulk_create(
+            [Favorite(user=user, product_id=product_id) for product_id in favorites], ignore_conflicts=True
+        )
+        bump_catalog_version(favorites_group(user.pk))
+
+    anonymous.clear()
+    anonymous.clear_favorites()
@@ -0,0 +1,84 @@
+"""
+Расчёт корзины.
+
+CartPricer получает строки корзины одним запросом товаров через for_listing(): изображение, остаток и
+рейтинг подгружаются тем же запросом. Скидка считается тем же запросом на сегодняшнюю дату, как при
+оформлении заказа, а не берётся из active_discount, который обновляется по расписанию: корзина
+показывает ту же сумму, которую спишет заказ.
+Итоги и суммы строк считаются за один проход, поэтому число запросов не зависит от размера корзины.
+Корзина пользователя и корзина анонимного пользователя рассчитываются одинаково и выводятся CartModelSerializer.
+"""
+from django.db import models
+
+from apps.product.models import Product, current_discount
+
+
+class CartLine:
+    """Строка корзины: товар, количество и суммы по строке."""
+
+    __slots__ = ('product', 'quantity', 'price', 'discount_price', 'weight')
+
+    def __init__(self, product, quantity):
+        # Сохранённые скидка и цена заменяются действующими сегодня, их же выводит сериализатор товара.
+        if hasattr(product, 'current_discount'):
+            product.active_discount = product.current_discount
+            product.effective_price = product.discounted_price(product.current_discount)
+        self.product = product
+        self.quantity = quantity
+        self.price = product.price * quantity
+        self.discount_price = product.effective_price * quantity
+        self.weight = product.weight * quantity
+
+
+class CartPricer:
+    """Строки корзины и итоги: количество, стоимость, стоимость со скидкой и вес."""
+
+    def __init__(self, items):
+        """items - пары (товар из for_listing(), количество)."""
+        self.lines = []
+        self.total_quantity = 0
+        self.total_price = 0
+        self.total_discount_price = 0
+        self.total_weight = 0
+        for product, quantity in items:
+            line = CartLine(product, quantity)
+            self.lines.append(line)
+            self.total_quantity += line.quantity
+            self.total_price += line.price
+            self.total_discount_price += line.discount_price
+            self.total_weight += line.weight
+
+    def delta(self, product_ids):
+        """Итоги и только строки товаров product_ids; removed - товары из product_ids, которых нет в корзине."""
+        lines = [line for line in self.lines if line.product.pk in product_ids]
+        present = {line.product.pk for line in lines}
+        return {
+            'total_quantity': self.total_quantity,
+            'total_price': self.total_price,
+            'total_discount_price': self.total_discount_price,
+            'total_weight': self.total_weight,
+            'lines': lines,
+            'removed': sorted(set(product_ids) - present),
+        }
+
+    @classmethod
+    def for_user(cls, user):
+        """Корзина пользователя в порядке добавления товаров."""
+        products = (
+            Product.objects.for_listing()
+            .annotate(current_discount=current_discount())
+            .filter(cartitems__cart__user=user)
+            .annotate(cart_quantity=models.F('cartitems__quantity'))
+            .order_by('cartitems__pk')
+        )
+        return cls((product, product.cart_quantity) for product in products)
+
+    @classmethod
+    def for_quantities(cls, quantities):
+        """Корзина анонимного пользователя: {id товара: количество}."""
+        products = (
+            Product.objects.for_listing()
+            .annotate(current_discount=current_discount())
+            .filter(id__in=quantities.keys())
+        )
+        return cls((product, quantities[product.id]) for product in products)
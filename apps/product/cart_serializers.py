@@ -1,19 +1,17 @@
 """Сериализаторы для методов функционала корзины."""
-from django.db.models import Sum
+from django.conf import settings
 from rest_framework import serializers
 
-from apps.product.models import CartItem, CartModel, Product
+from apps.product.models import CartItem, Product
 from apps.product.serializers import ShortProductSerializer
 
 
-class CartItemSerializer(serializers.ModelSerializer):
-    """Сериализатор данных о товаре в корзине."""
+class CartItemSerializer(serializers.Serializer):
+    """Сериализатор строки корзины (CartLine)."""
 
     product = ShortProductSerializer()
-
-    class Meta:
-        model = CartItem
-        fields = ('product', 'quantity')
+    quantity = serializers.IntegerField()
+    cost = serializers.ReadOnlyField(source='discount_price')
 
 
 class CartItemCreateSerializer(serializers.ModelSerializer):
@@ -24,68 +22,59 @@ class CartItemCreateSerializer(serializers.ModelSerializer):
         fields = ('product', 'quantity')
 
 
-class CartModelSerializer(serializers.ModelSerializer):
-    """Сериализатор корзины пользователя."""
+class CartModelSerializer(serializers.Serializer):
+    """
+    Сериализатор корзины.
 
-    total_quantity = serializers.SerializerMethodField(method_name='calculate_total_quantity')
-    total_price = serializers.SerializerMethodField(method_name='calculate_total_price')
-    total_discount_price = serializers.SerializerMethodField(method_name='calculate_total_discount_price')
-    total_weight = serializers.SerializerMethodField(method_name='calculate_total_weight')
+    Ожидает CartPricer: корзину пользователя или анонимного пользователя.
+    """
 
-    products = CartItemSerializer(source='cartitems', many=True)
+    total_quantity = serializers.IntegerField()
+    total_price = serializers.ReadOnlyField()
+    total_discount_price = serializers.ReadOnlyField()
+    total_weight = serializers.ReadOnlyField()
+    products = CartItemSerializer(source='lines', many=True)
 
-    class Meta:
-        model = CartModel
-        fields = ('total_quantity', 'total_price', 'total_discount_price', 'total_weight', 'products')
 
-    def calculate_total_quantity(self, obj):
-        """Возвращает общее количество товара в корзине."""
-        return obj.cartitems.all().aggregate(Sum('quantity'))['quantity__sum'] or 0
+class CartDeltaSerializer(CartModelSerializer):
+    """Итоги корзины и только изменённые строки; removed - идентификаторы убранных товаров."""
 
-    def calculate_total_price(self, obj):
-        """Возвращает общую стоимость товара в корзине."""
-        return sum(item.product.price * item.quantity for item in obj.cartitems.all())
+    removed = serializers.ListField(child=serializers.IntegerField())
 
-    def calculate_total_discount_price(self, obj):
-        """Возвращает общую сумму товара в корзине с учётом скидки."""
-        return sum(item.product.calculate_total_price() * item.quantity for item in obj.cartitems.all())
 
-    def calculate_total_weight(self, obj):
-        """Возвращает общий вес товара в корзине."""
-        return sum(item.product.weight * item.quantity for item in obj.cartitems.all())
-
-
-class CartItemDictSerializer(serializers.Serializer):
-    """Сериализатор данных о товаре в корзине."""
-
-    product = ShortProductSerializer()
-    quantity = serializers.IntegerField()
+class CartOperationSerializer(serializers.Serializer):
+    """Операция пакетного изменения корзины."""
 
+    op = serializers.ChoiceField(choices=('set', 'increment', 'remove'))
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(required=False)
 
-class CartModelDictSerializer(serializers.Serializer):
-    """Сериализатор корзины пользователя."""
+    def validate(self, attrs):
+        quantity = attrs.get('quantity')
+        if attrs['op'] == 'set' and (quantity is None or quantity < 1):
+            raise serializers.ValidationError({'quantity': 'Для set укажите количество не меньше 1.'})
+        if attrs['op'] == 'increment' and not quantity:
+            raise serializers.ValidationError({'quantity': 'Для increment укажите ненулевое количество.'})
+        return attrs
 
-    total_quantity = serializers.SerializerMethodField(method_name='calculate_total_quantity')
-    total_price = serializers.SerializerMethodField(method_name='calculate_total_price')
-    total_discount_price = serializers.SerializerMethodField(method_name='calculate_total_discount_price')
-    total_weight = serializers.SerializerMethodField(method_name='calculate_total_weight')
-    products = CartItemDictSerializer(many=True, read_only=True)
 
-    def calculate_total_quantity(self, obj):
-        """Возвращает общее количество товара в корзине."""
-        return sum(item.get('quantity') for item in obj.get('products'))
+class CartBatchSerializer(serializers.Serializer):
+    """
+    Сериализатор пакетного изменения корзины.
 
-    def calculate_total_price(self, obj):
-        """Возвращает общую стоимость товара в корзине."""
-        return sum(item.get('product').price * item.get('quantity') for item in obj.get('products'))
+    Операции применяются по порядку. С delta=true ответ содержит только изменённые строки и итоги.
+    """
 
-    def calculate_total_discount_price(self, obj):
-        """Возвращает общую сумму товара в корзине с учётом скидки."""
-        return sum(item.get('product').calculate_total_price() * item.get('quantity') for item in obj.get('products'))
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=settings.CART_BATCH_MAX_OPERATIONS)
+    delta = serializers.BooleanField(default=False)
 
-    def calculate_total_weight(self, obj):
-        """Возвращает общий вес товара в корзине."""
-        return sum(item.get('product').weight * item.get('quantity') for item in obj.get('products'))
+    def validate_operations(self, operations):
+        """Проверяет одним запросом, что добавляемые товары существуют; убирать можно и удалённые товары."""
+        product_ids = {operation['product'] for operation in operations if operation['op'] != 'remove'}
+        existing = set(Product.objects.filter(pk__in=product_ids).order_by().values_list('pk', flat=True))
+        if missing := sorted(product_ids - existing):
+            raise serializers.ValidationError(f'Товары не найдены: {", ".join(map(str, missing))}.')
+        return operations
 
 
 class CartItemCreateDictSerializer(serializers.Serializer):
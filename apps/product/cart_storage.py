@@ -0,0 +1,336 @@
+"""
+Хранилища корзины и избранного анонимного пользователя.
+
+Хранилище выбирается настройкой CART_STORAGE:
+
+- SessionCartStorage хранит данные в сессии Django. С сессиями в базе каждое изменение переписывает всю
+  строку сессии, а каждое чтение заново её разбирает.
+- RedisCartStorage хранит корзину и избранное в хешах Redis по ключу сессии: {id товара: количество} и
+  {id товара: 1}. Изменения выполняются отдельными командами HSET/HINCRBY/HDEL, поэтому одновременные
+  запросы не затирают друг друга, а срок хранения продлевается при каждом изменении. Корзина и избранное,
+  сохранённые в сессии до перехода на RedisCartStorage, переносятся в хеш при первом обращении, пока хеша нет.
+- LocMemCartStorage - то же хранилище поверх LocalRedis, словаря в памяти процесса, для тестов и
+  локального запуска без Redis.
+
+Количества корзины у всех хранилищ - {id товара: количество}, избранное - множество id товаров.
+"""
+import functools
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def get_cart_storage(request):
+    """Хранилище корзины и избранного для запроса по настройке CART_STORAGE."""
+    return import_string(settings.CART_STORAGE['BACKEND'])(request)
+
+
+def final_quantities(quantities, operations):
+    """
+    Количества после операций: {id товара: количество} для всех товаров из operations.
+
+    set задаёт количество, increment прибавляет quantity (в том числе отрицательное), remove убирает товар.
+    Неположительное количество в конце означает, что товара в корзине нет, и заменяется на 0.
+    """
+    result = {}
+    for operation in operations:
+        product_id = operation['product']
+        current = result.get(product_id, quantities.get(product_id, 0))
+        if operation['op'] == 'set':
+            result[product_id] = operation['quantity']
+        elif operation['op'] == 'increment':
+            result[product_id] = current + operation['quantity']
+        else:
+            result[product_id] = 0
+    return {product_id: max(quantity, 0) for product_id, quantity in result.items()}
+
+
+class SessionCartStorage:
+    """Корзина и избранное в сессии Django."""
+
+    def __init__(self, request):
+        self.session = request.session
+
+    def get_cart(self):
+        cart = self.session.get(settings.CART_SESSION_ID) or {}
+        return {int(product_id): item['quantity'] for product_id, item in cart.items()}
+
+    def get_favorites(self):
+        return {int(product_id) for product_id in self.session.get(settings.FAVORITE_SESSION_ID) or {}}
+
+    def set_quantities(self, quantities):
+        """Записывает количества {id товара: количество}; товары с количеством 0 убираются."""
+        cart = self.session.get(settings.CART_SESSION_ID) or {}
+        for product_id, quantity in quantities.items():
+            if quantity:
+                cart[str(product_id)] = {'quantity': quantity}
+            else:
+                cart.pop(str(product_id), None)
+        self.session[settings.CART_SESSION_ID] = cart
+
+    def apply(self, operations):
+        """Применяет операции одной записью в сессию и возвращает количества затронутых товаров."""
+        quantities = final_quantities(self.get_cart(), operations)
+        self.set_quantities(quantities)
+        return quantities
+
+    def clear(self):
+        self.session.pop(settings.CART_SESSION_ID, None)
+
+    def add_favorite(self, product_id):
+        favorites = self.session.get(settings.FAVORITE_SESSION_ID) or {}
+        favorites[str(product_id)] = True
+        self.session[settings.FAVORITE_SESSION_ID] = favorites
+
+    def remove_favorite(self, product_id):
+        favorites = self.session.get(settings.FAVORITE_SESSION_ID) or {}
+        if favorites.pop(str(product_id), None):
+            self.session[settings.FAVORITE_SESSION_ID] = favorites
+
+    def clear_favorites(self):
+        self.session.pop(settings.FAVORITE_SESSION_ID, None)
+
+
+@functools.lru_cache(maxsize=None)
+def get_redis_client(url):
+    """Клиент Redis с пулом соединений, один на процесс."""
+    return redis.Redis.from_url(url)
+
+
+class RedisCartStorage:
+    """Корзина и избранное в хешах Redis по ключу сессии."""
+
+    def __init__(self, request):
+        self.session = request.session
+        self.client = self.get_client()
+        self.timeout = settings.CART_STORAGE.get('TIMEOUT', settings.SESSION_COOKIE_AGE)
+
+    def get_client(self):
+        return get_redis_client(settings.CART_STORAGE['LOCATION'])
+
+    def key(self, kind, create=False):
+        """
+        Ключ хеша корзины или избранного; без сессии - None.
+
+        Запись создаёт сессию, чтобы у клиента появилась кука с её ключом.
+        """
+        if self.session.session_key is None:
+            if not create:
+                return None
+            self.session.save()
+            self.session.modified = True
+        return f'anon_{kind}:{self.session.session_key}'
+
+    def write_key(self, kind):
+        """Ключ хеша для записи; если хеша ещё нет, в него сначала переносятся данные сессии."""
+        key = self.key(kind, create=True)
+        if not self.client.exists(key):
+            self.migrate_session(kind, key)
+        return key
+
+    def migrate_session(self, kind, key):
+        """
+        Переносит корзину или избранное SessionCartStorage из сессии в хеш и возвращает {id товара: значение}.
+
+        Данные убираются из сессии, поэтому переносятся один раз; товары, уже записанные в хеш, не меняются.
+        """
+        items = self.session.pop(settings.CART_SESSION_ID if kind == 'cart' else settings.FAVORITE_SESSION_ID, None)
+        if not items:
+            return {}
+        values = {int(product_id): item['quantity'] if kind == 'cart' else 1 for product_id, item in items.items()}
+        pipe = self.client.pipeline()
+        for product_id, value in values.items():
+            pipe.hsetnx(key, product_id, value)
+        pipe.expire(key, self.timeout)
+        pipe.execute()
+        return values
+
+    def get_cart(self):
+        if key := self.key('cart'):
+            cart = {int(product_id): int(quantity) for product_id, quantity in self.client.hgetall(key).items()}
+            return cart or self.migrate_session('cart', key)
+        return {}
+
+    def get_favorites(self):
+        if key := self.key('favorites'):
+            favorites = {int(product_id) for product_id in self.client.hkeys(key)}
+            return favorites or set(self.migrate_session('favorites', key))
+        return set()
+
+    def set_quantities(self, quantities):
+        key = self.write_key('cart')
+        pipe = self.client.pipeline()
+        if mapping := {product_id: quantity for product_id, quantity in quantities.items() if quantity}:
+            pipe.hset(key, mapping=mapping)
+        if removed := [product_id for product_id, quantity in quantities.items() if not quantity]:
+            pipe.hdel(key, *removed)
+        pipe.expire(key, self.timeout)
+        pipe.execute()
+
+    def apply(self, operations):
+        """
+        Применяет операции одной транзакцией MULTI и возвращает количества затронутых товаров.
+
+        increment выполняется через HINCRBY, поэтому одновременные увеличения складываются. Товары, количество
+        которых стало неположительным, убираются следующей командой HDEL.
+        """
+        key = self.write_key('cart')
+        pipe = self.client.pipeline()
+        for operation in operations:
+            if operation['op'] == 'set':
+                pipe.hset(key, operation['product'], operation['quantity'])
+            elif operation['op'] == 'increment':
+                pipe.hincrby(key, operation['product'], operation['quantity'])
+            else:
+                pipe.hdel(key, operation['product'])
+        pipe.expire(key, self.timeout)
+        results = pipe.execute()
+
+        quantities = {}
+        for operation, result in zip(operations, results):
+            if operation['op'] == 'set':
+                quantities[operation['product']] = operation['quantity']
+            elif operation['op'] == 'increment':
+                quantities[operation['product']] = result
+            else:
+                quantities[operation['product']] = None
+        if removed := [
+            product_id for product_id, quantity in quantities.items() if quantity is not None and quantity <= 0
+        ]:
+            self.client.hdel(key, *removed)
+        return {product_id: max(quantity or 0, 0) for product_id, quantity in quantities.items()}
+
+    def clear(self):
+        if key := self.key('cart'):
+            self.client.delete(key)
+
+    def add_favorite(self, product_id):
+        key = self.write_key('favorites')
+        pipe = self.client.pipeline()
+        pipe.hset(key, product_id, 1)
+        pipe.expire(key, self.timeout)
+        pipe.execute()
+
+    def remove_favorite(self, product_id):
+        if key := self.key('favorites'):
+            self.client.hdel(key, product_id)
+
+    def clear_favorites(self):
+        if key := self.key('favorites'):
+            self.client.delete(key)
+
+
+class LocalRedis:
+    """
+    Хеши Redis в памяти процесса: команды и конвейер, которые использует RedisCartStorage.
+
+    Значения, как и у Redis без decode_responses, возвращаются байтами.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = {}
+        self.expires = {}
+
+    def get_hash(self, key, create=False):
+        if key in self.expires and self.expires[key] <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        if create:
+            return self.data.setdefault(key, {})
+        return self.data.get(key, {})
+
+    @staticmethod
+    def encode(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def hgetall(self, key):
+        with self.lock:
+            return dict(self.get_hash(key))
+
+    def hkeys(self, key):
+        with self.lock:
+            return list(self.get_hash(key))
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        with self.lock:
+            values = self.get_hash(key, create=True)
+            added = sum(self.encode(field) not in values for field in items)
+            values.update((self.encode(field), self.encode(value)) for field, value in items.items())
+            return added
+
+    def hsetnx(self, key, field, value):
+        with self.lock:
+            values = self.get_hash(key, create=True)
+            if self.encode(field) in values:
+                return False
+            values[self.encode(field)] = self.encode(value)
+            return True
+
+    def hincrby(self, key, field, amount=1):
+        with self.lock:
+            values = self.get_hash(key, create=True)
+            result = int(values.get(self.encode(field), 0)) + amount
+            values[self.encode(field)] = self.encode(result)
+            return result
+
+    def hdel(self, key, *fields):
+        with self.lock:
+            values = self.get_hash(key)
+            return sum(values.pop(self.encode(field), None) is not None for field in fields)
+
+    def expire(self, key, seconds):
+        with self.lock:
+            self.get_hash(key)
+            if key not in self.data:
+                return False
+            self.expires[key] = time.monotonic() + seconds
+            return True
+
+    def exists(self, *keys):
+        with self.lock:
+            return sum(bool(self.get_hash(key)) for key in keys)
+
+    def delete(self, *keys):
+        with self.lock:
+            return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def pipeline(self):
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+    """Конвейер LocalRedis: команды выполняются вместе под блокировкой, как MULTI/EXEC."""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((getattr(self.client, name), args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        with self.client.lock:
+            results = [command(*args, **kwargs) for command, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+local_redis = LocalRedis()
+
+
+class LocMemCartStorage(RedisCartStorage):
+    """RedisCartStorage поверх LocalRedis: данные живут, пока жив процесс."""
+
+    def get_client(self):
+        return local_redis
@@ -4,11 +4,13 @@ from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from apps.product.cart import CartAndFavorites
+from apps.product.cart import CartAndFavorites, apply_user_cart_operations
+from apps.product.cart_pricing import CartPricer
 from apps.product.cart_serializers import (
+    CartBatchSerializer,
+    CartDeltaSerializer,
     CartItemCreateDictSerializer,
     CartItemCreateSerializer,
-    CartModelDictSerializer,
     CartModelSerializer,
     FavoriteCreateSerializer,
     FavoriteSerializer,
@@ -18,6 +20,7 @@ from apps.product.models import CartItem, CartModel, Favorite, Product
 from apps.product.openapi import (
     add_cartitem,
     add_favorite,
+    cart_batch,
     cart_items,
     delete_cartitem,
     delete_favorite,
@@ -31,12 +34,14 @@ def cart_items(request):
     """Возвращает данные о товарах в корзине пользователя."""
     user = request.user
     if user.is_authenticated:
-        cart, _ = CartModel.objects.get_or_create(user=user)
+        cart = CartPricer.for_user(user)
+        if not cart.lines:
+            CartModel.objects.get_or_create(user=user)
         serializer = CartModelSerializer(instance=cart, context={'request': request})
         return Response(serializer.data)
     cart = CartAndFavorites(request=request)
     cart_items = cart.extract_items_cart()
-    serializer = CartModelDictSerializer(instance=cart_items, context={'request': request})
+    serializer = CartModelSerializer(instance=cart_items, context={'request': request})
     return Response(serializer.data)
 
 
@@ -51,7 +56,7 @@ def add_cartitem(request):
         serializer.is_valid(raise_exception=True)
         cart.add(product_id=serializer.data.get('product'), quantity=serializer.data.get('quantity'))
         cart_items = cart.extract_items_cart()
-        serializer = CartModelDictSerializer(instance=cart_items, context={'request': request})
+        serializer = CartModelSerializer(instance=cart_items, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     serializer = CartItemCreateSerializer(data=request.data, context={'request': request})
     serializer.is_valid(raise_exception=True)
@@ -62,7 +67,7 @@ def add_cartitem(request):
     if not created:
         cart_item.quantity = int(quantity)
         cart_item.save(update_fields=('quantity',))
-    serializer = CartModelSerializer(instance=cart, context={'request': request})
+    serializer = CartModelSerializer(instance=CartPricer.for_user(user), context={'request': request})
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -76,12 +81,37 @@ def delete_cartitem(request, id):
         cart = CartAndFavorites(request=request)
         cart.remove(product_id=product.id)
         cart_items = cart.extract_items_cart()
-        serializer = CartModelDictSerializer(instance=cart_items, context={'request': request})
+        serializer = CartModelSerializer(instance=cart_items, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
     cart = user.cartmodels
     instance = get_object_or_404(CartItem, product=product, cart=cart)
     instance.delete()
-    serializer = CartModelSerializer(instance=cart, context={'request': request})
+    serializer = CartModelSerializer(instance=CartPricer.for_user(user), context={'request': request})
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@cart_batch
+@api_view(['POST'])
+def cart_batch(request):
+    """
+    Применяет список операций set/increment/remove к корзине.
+
+    Для пользователя - одна запись строк корзины в базу, для анонимного - одна запись в хранилище CART_STORAGE.
+    """
+    serializer = CartBatchSerializer(data=request.data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    operations = serializer.validated_data['operations']
+    if request.user.is_authenticated:
+        changed = apply_user_cart_operations(request.user, operations)
+        cart = CartPricer.for_user(request.user)
+    else:
+        anonymous_cart = CartAndFavorites(request=request)
+        changed = anonymous_cart.apply(operations)
+        cart = anonymous_cart.extract_items_cart()
+    if serializer.validated_data['delta']:
+        serializer = CartDeltaSerializer(instance=cart.delta(changed.keys()), context={'request': request})
+    else:
+        serializer = CartModelSerializer(instance=cart, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -91,7 +121,7 @@ def favorite_list(request):
     """Возвращает данные о товарах в избранном пользователя."""
     user = request.user
     if user.is_authenticated:
-        favorite_products = Product.objects.filter(favorites__user=user)
+        favorite_products = Product.objects.for_listing().filter(favorites__user=user)
         serializer = ProductFavoriteSerializer(instance=favorite_products, many=True, context={'request': request})
         return Response(serializer.data)
     cart = CartAndFavorites(request=request)
@@ -116,7 +146,7 @@ def add_favorite(request):
         serializer = FavoriteSerializer(instance=fav_items, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     Favorite.objects.get_or_create(user=user, product=product)
-    favorite_products = Product.objects.filter(favorites__user=user)
+    favorite_products = Product.objects.for_listing().filter(favorites__user=user)
     serializer = ProductFavoriteSerializer(instance=favorite_products, many=True, context={'request': request})
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -137,6 +167,6 @@ def delete_favorite(request, id):
     favorite = Favorite.objects.filter(user=user, product=product).first()
     if favorite:
         favorite.delete()
-    favorite_products = Product.objects.filter(favorites__user=user)
+    favorite_products = Product.objects.for_listing().filter(favorites__user=user)
     serializer = ProductFavoriteSerializer(instance=favorite_products, many=True, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
@@ -0,0 +1,267 @@
+"""
+Версии каталога для условных GET-запросов (ETag / If-None-Match) и кэша ответов.
+
+Для каждой группы моделей в кэше хранится монотонно растущий номер версии, который увеличивается
+сигналами после фиксации транзакции. Ключ ответа - версии групп, от которых зависит ответ, URL с
+нормализованными параметрами и заголовки согласования. По нему ответ ищется в общем кэше, а ETag
+дополнительно учитывает избранное пользователя, поэтому ответ 304 отдаётся без запросов к таблицам
+каталога и без сериализации. Изменение данных меняет версию, так что старые записи кэша просто
+перестают читаться. Версии должны храниться в общем для всех процессов кэше (Redis в production).
+
+В общем кэше ответ хранится с is_favorited=False у всех товаров, признак проставляется для
+конкретного пользователя при выдаче.
+"""
+import functools
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+CACHE_KEY_PREFIX = 'catalog_version:'
+RESPONSE_CACHE_KEY_PREFIX = 'catalog_response:'
+# Группы свойств товара. Остатки (stock), рейтинг (ratings), популярность (popularity) и похожие товары
+# (similar) меняются заказами, отзывами и фоновыми пересчётами, поэтому это отдельные группы: их добавляют
+# только ответы, которые от них зависят.
+PRODUCT_GROUPS = (
+    'products',
+    'categories',
+    'colors',
+    'materials',
+    'product_types',
+    'collections',
+    'furniture_details',
+    'discounts',
+)
+PRODUCT_STATE_GROUPS = ('stock', 'ratings', 'popularity', 'similar')
+
+
+def favorites_group(user_id):
+    """Группа избранного пользователя: от неё зависит поле is_favorited товаров."""
+    return f'favorites:{user_id}'
+
+
+def get_catalog_versions(groups):
+    """
+    Возвращает {группа: версия}, инициализируя отсутствующие в кэше версии текущим временем.
+
+    Если кэш недоступен (django_redis с IGNORE_EXCEPTIONS молча возвращает пустые значения), версия - None.
+    """
+    keys = {CACHE_KEY_PREFIX + group: group for group in groups}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        cache.add(key, time.time_ns(), timeout=None)
+        versions[key] = cache.get(key)
+    return {group: versions[key] for key, group in keys.items()}
+
+
+def increment_version(group):
+    key = CACHE_KEY_PREFIX + group
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Начальное значение - время в наносекундах, поэтому версия не повторится после вытеснения из кэша.
+        if not cache.add(key, time.time_ns(), timeout=None):
+            cache.incr(key)
+
+
+def increment_pending_versions(pending):
+    """Обработчик on_commit: увеличивает версии накопленных групп; следующие обработчики застают пустое множество."""
+    groups = list(pending)
+    pending.clear()
+    for group in groups:
+        increment_version(group)
+
+
+def bump_catalog_version(*groups, using=None):
+    """
+    Увеличивает версии групп после фиксации текущей транзакции.
+
+    Группы копятся в общем множестве подключения, и первый выполненный обработчик on_commit увеличивает
+    версии всех накопленных групп, поэтому в одной транзакции версия каждой группы увеличивается один раз.
+    Группы из откаченной транзакции остаются в множестве и увеличатся со следующей: лишнее увеличение
+    версии только сбрасывает кэш.
+    """
+    connection = transaction.get_connection(using)
+    if not hasattr(connection, 'catalog_pending_versions'):
+        connection.catalog_pending_versions = set()
+    connection.catalog_pending_versions.update(groups)
+    transaction.on_commit(
+        functools.partial(increment_pending_versions, connection.catalog_pending_versions), using=using
+    )
+
+
+class ShortCircuit(Exception):
+    """Готовый ответ, отдаваемый без выполнения обработчика."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+def get_viewer_key(request, versions):
+    """Часть ETag, зависящая от избранного пользователя."""
+    if request.user.is_authenticated:
+        return f'user={request.user.pk}:{versions[favorites_group(request.user.pk)]}'
+    # Локальный импорт: apps.product.cart зависит от моделей, которые используют этот модуль.
+    from apps.product.cart import CartAndFavorites
+
+    return 'favorites=' + ','.join(map(str, sorted(CartAndFavorites(request=request).favorites)))
+
+
+def md5(parts):
+    return hashlib.md5('\n'.join(parts).encode('utf-8'), usedforsecurity=False).hexdigest()
+
+
+class CatalogRequest:
+    """Ключ кэша и ETag ответа на GET-запрос к каталогу."""
+
+    def __init__(self, request, groups, personal=False, cacheable=True):
+        self.request = request
+        self.personal = personal
+        if personal and request.user.is_authenticated:
+            groups = (*groups, favorites_group(request.user.pk))
+        versions = get_catalog_versions(groups)
+        # Без версий ответ нельзя связать с состоянием данных: ETag и кэш для запроса отключаются.
+        self.enabled = None not in versions.values()
+        params = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+        parts = [
+            request.build_absolute_uri(request.path),
+            urlencode(params),
+            request.META.get('HTTP_ACCEPT', ''),
+            getattr(request, 'LANGUAGE_CODE', ''),
+            *(f'{group}={version}' for group, version in versions.items() if not group.startswith('favorites:')),
+        ]
+        self.cache_key = RESPONSE_CACHE_KEY_PREFIX + md5(parts)
+        if personal:
+            parts = [*parts, get_viewer_key(request, versions)]
+        self.etag = f'"{md5(parts)}"'
+        # Список избранного пользователя (?is_favorited=true) не кладётся в общий кэш.
+        self.cacheable = self.enabled and cacheable and 'is_favorited' not in request.query_params
+
+    def is_not_modified(self):
+        """Возвращает True, если клиент уже получил ответ с этим ETag."""
+        if not self.enabled:
+            return False
+        etags = parse_etags(self.request.META.get('HTTP_IF_NONE_MATCH', ''))
+        return '*' in etags or self.etag in etags or f'W/{self.etag}' in etags
+
+    def not_modified_response(self):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': self.etag})
+
+    def get_cached_response(self):
+        if not self.cacheable:
+            return None
+        data = cache.get(self.cache_key)
+        if data is None:
+            return None
+        return self.finalize(Response(self.personalize(data)))
+
+    def store(self, response):
+        """Сохраняет ответ в общий кэш и проставляет ETag и избранное пользователя."""
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        if self.cacheable:
+            cache.set(self.cache_key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+            response.data = self.personalize(response.data)
+        return self.finalize(response)
+
+    def finalize(self, response):
+        if self.enabled:
+            response['ETag'] = self.etag
+        return response
+
+    def personalize(self, data):
+        """Проставляет is_favorited товарам в данных, общих для всех пользователей."""
+        if not self.personal:
+            return data
+        # Локальный импорт: apps.product.cart зависит от моделей, которые используют этот модуль.
+        from apps.product.cart import extract_favorite_ids
+
+        favorite_ids = extract_favorite_ids(self.request)
+        if favorite_ids:
+            mark_favorites(data, favorite_ids)
+        return data
+
+
+def mark_favorites(data, favorite_ids):
+    if isinstance(data, dict):
+        if 'is_favorited' in data and 'id' in data:
+            data['is_favorited'] = data['id'] in favorite_ids
+        for value in data.values():
+            mark_favorites(value, favorite_ids)
+    elif isinstance(data, list):
+        for value in data:
+            mark_favorites(value, favorite_ids)
+
+
+class CatalogCacheMixin:
+    """
+    Кэш ответов и условные GET-запросы для вьюсетов каталога.
+
+    catalog_groups - группы, от которых зависит ответ, catalog_personal - содержит ли ответ
+    избранное пользователя (поле is_favorited товаров). Ответы, для которых is_catalog_cacheable()
+    возвращает False (например, потоковые), только помечаются ETag.
+    """
+
+    catalog_groups = ()
+    catalog_personal = False
+
+    def get_catalog_groups(self):
+        return self.catalog_groups
+
+    def is_catalog_cacheable(self):
+        return True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.catalog_request = None
+        groups = self.get_catalog_groups()
+        if request.method not in ('GET', 'HEAD') or not groups:
+            return
+        self.catalog_request = CatalogRequest(request, groups, self.catalog_personal, self.is_catalog_cacheable())
+        if self.catalog_request.is_not_modified():
+            raise ShortCircuit(self.catalog_request.not_modified_response())
+        if (response := self.catalog_request.get_cached_response()) is not None:
+            raise ShortCircuit(response)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if getattr(self, 'catalog_request', None) and self.catalog_request.cacheable:
+            context['favorite_ids'] = frozenset()
+        return context
+
+    def handle_exception(self, exc):
+        if isinstance(exc, ShortCircuit):
+            self.catalog_request = None
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'catalog_request', None):
+            response = self.catalog_request.store(response)
+        return response
+
+
+def catalog_cache(*groups):
+    """Декоратор функций-представлений DRF (под @api_view) с кэшем ответов и условными GET-запросами."""
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            catalog_request = CatalogRequest(request, groups)
+            if catalog_request.is_not_modified():
+                return catalog_request.not_modified_response()
+            if (response := catalog_request.get_cached_response()) is not None:
+                return response
+            return catalog_request.store(view(request, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,71 @@
+"""Подсчёт значений фильтров (фасетов) для отфильтрованного списка товаров."""
+from django.db import connections
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, Q
+
+
+def facet_expressions():
+    """Выражения для значений каждого фасета, имена совпадают с параметрами ProductsFilter."""
+    return {
+        'category': F('category__slug'),
+        'collection': F('collection__slug'),
+        'color': F('color__name'),
+        'material': F('material__name'),
+        'brand': F('brand'),
+        'purpose': F('furniture_details__purpose'),
+        'furniture_type': F('furniture_details__furniture_type'),
+        'construction': F('furniture_details__construction'),
+        'fast_delivery': F('fast_delivery'),
+        'has_discount': ExpressionWrapper(Q(active_discount__gt=0), output_field=BooleanField()),
+        'in_stock': ExpressionWrapper(Q(storehouse__quantity__gt=0), output_field=BooleanField()),
+    }
+
+
+def count_facets(queryset):
+    """
+    Возвращает количество товаров для каждого значения каждого фасета.
+
+    На PostgreSQL все фасеты считаются одним запросом с GROUPING SETS поверх отфильтрованной выборки.
+    """
+    expressions = facet_expressions()
+    aliases = {f'facet_{name}': name for name in expressions}
+    annotated = queryset.order_by().annotate(**{alias: expressions[name] for alias, name in aliases.items()})
+    if connections[queryset.db].vendor == 'postgresql':
+        rows = grouping_sets_counts(annotated.values('pk', *aliases).distinct(), list(aliases))
+    else:
+        rows = [
+            (alias, value, count)
+            for alias in aliases
+            for value, count in annotated.values(alias)
+            .annotate(count=Count('pk', distinct=True))
+            .values_list(alias, 'count')
+        ]
+    facets = {name: [] for name in expressions}
+    for alias, value, count in rows:
+        if value is not None:
+            facets[aliases[alias]].append({'value': value, 'count': count})
+    for values in facets.values():
+        values.sort(key=lambda item: (-item['count'], str(item['value'])))
+    return facets
+
+
+def grouping_sets_counts(facets_queryset, aliases):
+    """Возвращает строки (фасет, значение, количество), посчитанные одним запросом."""
+    connection = connections[facets_queryset.db]
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(alias) for alias in aliases)
+    sets = ', '.join(f'({quote(alias)})' for alias in aliases)
+    sql, params = facets_queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT GROUPING({columns}), {columns}, COUNT(*) FROM ({sql}) facets GROUP BY GROUPING SETS ({sets})',
+            params,
+        )
+        rows = cursor.fetchall()
+    # GROUPING() возвращает битовую маску, где 0 - столбцы текущего набора группировки.
+    full_mask = (1 << len(aliases)) - 1
+    masks = {full_mask ^ (1 << (len(aliases) - 1 - index)): index for index in range(len(aliases))}
+    result = []
+    for mask, *values, count in rows:
+        index = masks[mask]
+        result.append((aliases[index], values[index], count))
+    return result
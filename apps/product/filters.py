@@ -1,27 +1,43 @@
 """Модуль с фильтрами. """
-from django.db.models import F, Q
-from django.utils import timezone
 from django_filters import rest_framework as filters
 
-from apps.product.models import Category, Collection, Color, Material, Product
+from apps.product import reference
+from apps.product.models import Product
+from apps.product.search import get_search_backend
+
+
+class ReferenceMultipleChoiceFilter(filters.MultipleChoiceFilter):
+    """
+    Выбор нескольких значений поля to_field_name справочника table.
+
+    Значения проверяются по кэшу справочника в памяти процесса, а товары фильтруются по внешнему
+    ключу field_name без JOIN со справочником.
+    """
+
+    def __init__(self, *args, table, to_field_name, **kwargs):
+        self.table = table
+        self.to_field_name = to_field_name
+        # Функция, а не метод фильтра: choices копируется вместе с фильтром для каждого запроса.
+        kwargs['choices'] = lambda: [(getattr(obj, to_field_name),) * 2 for obj in table.all()]
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        pks = [obj.pk for item in value if (obj := self.table.get_by(self.to_field_name, item))]
+        return qs.filter(**{f'{self.field_name}__in': pks})
 
 
 class ProductsFilter(filters.FilterSet):
     """Фильтр для приложения продукты."""
 
-    category = filters.ModelMultipleChoiceFilter(
-        queryset=Category.objects.all(), field_name='category__slug', to_field_name='slug'
-    )
-    collection = filters.ModelMultipleChoiceFilter(
-        queryset=Collection.objects.all(), field_name='collection__slug', to_field_name='slug'
-    )
-    color = filters.ModelMultipleChoiceFilter(
-        queryset=Color.objects.all(), field_name='color__name', to_field_name='name'
-    )
+    category = ReferenceMultipleChoiceFilter(table=reference.categories, to_field_name='slug')
+    collection = ReferenceMultipleChoiceFilter(table=reference.collections, to_field_name='slug')
+    color = ReferenceMultipleChoiceFilter(table=reference.colors, to_field_name='name')
     brand = filters.CharFilter(lookup_expr='exact')
     fast_delivery = filters.BooleanFilter()
-    min_total_price = filters.NumberFilter(method='filter_total_price', lookup_expr='gte')
-    max_total_price = filters.NumberFilter(method='filter_total_price', lookup_expr='lte')
+    min_total_price = filters.NumberFilter(field_name='effective_price', lookup_expr='gte')
+    max_total_price = filters.NumberFilter(field_name='effective_price', lookup_expr='lte')
     weight = filters.RangeFilter()
     warranty = filters.RangeFilter()
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
@@ -29,9 +45,7 @@ class ProductsFilter(filters.FilterSet):
     min_rating = filters.NumberFilter(field_name='ratings__average_rating', lookup_expr='gte')
     max_rating = filters.NumberFilter(field_name='ratings__average_rating', lookup_expr='lte')
     name = filters.CharFilter(method='filter_name')
-    material = filters.ModelMultipleChoiceFilter(
-        queryset=Material.objects.all(), field_name='material__name', to_field_name='name'
-    )
+    material = ReferenceMultipleChoiceFilter(table=reference.materials, to_field_name='name')
     purpose = filters.CharFilter(field_name='furniture_details__purpose', lookup_expr='exact')
     furniture_type = filters.CharFilter(field_name='furniture_details__furniture_type', lookup_expr='exact')
     construction = filters.CharFilter(field_name='furniture_details__construction', lookup_expr='exact')
@@ -76,49 +90,12 @@ class ProductsFilter(filters.FilterSet):
             return queryset.filter(storehouse__quantity__gt=0)
         return queryset
 
-    def filter_total_price(self, queryset, name, value):
-        """Фильтрация товаров по цене."""
-        if value is not None:
-            now = timezone.now().date()
-            queryset = queryset.annotate(total_price=F('price') * (1 - F('discounts') / 100))
-            min_total_price = self.data.get('min_total_price')
-            max_total_price = self.data.get('max_total_price')
-            if min_total_price and max_total_price:
-                return queryset.filter(
-                    Q(Q(discounts__discount__isnull=True, price__range=(min_total_price, max_total_price)))
-                    | Q(
-                        discounts__discount_created_at__lte=now,
-                        discounts__discount_end_at__gte=now,
-                        total_price__range=(min_total_price, max_total_price),
-                    )
-                )
-            elif min_total_price:
-                return queryset.filter(
-                    Q(Q(discounts__discount__isnull=True) and Q(price__gte=min_total_price))
-                    | Q(
-                        discounts__discount_created_at__lte=now,
-                        discounts__discount_end_at__gte=now,
-                        total_price__gte=min_total_price,
-                    )
-                )
-            elif max_total_price:
-                return queryset.filter(
-                    Q(Q(discounts__discount__isnull=True) and Q(price__lte=max_total_price))
-                    | Q(
-                        total_price__lte=max_total_price,
-                        discounts__discount_created_at__lte=now,
-                        discounts__discount_end_at__gte=now,
-                    )
-                )
-        return queryset
-
     def filter_name(self, queryset, name, value):
-        """Фильтрация товаров по названию."""
-        return queryset.filter(name__icontains=value)
+        """Фильтрация товаров по названию, описанию и бренду с учётом морфологии и опечаток."""
+        return get_search_backend(queryset.db).filter(queryset, value)
 
     def filter_has_discount(self, queryset, name, value):
         """Фильтрация товаров по наличию скидки."""
         if value:
-            now = timezone.now()
-            return queryset.filter(Q(discounts__discount_created_at__lte=now, discounts__discount_end_at__gte=now))
+            return queryset.filter(active_discount__gt=0)
         return queryset
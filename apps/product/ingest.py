@@ -0,0 +1,389 @@
+"""
+Загрузка каталога из CSV в формате data/*.csv через COPY.
+
+Файлы читаются потоком. Внешние ключи проверяются по множествам id из базы и из уже прочитанных файлов,
+а строки через COPY попадают во временные таблицы. Из них таблицы каталога обновляются одним запросом
+INSERT ... ON CONFLICT на файл. Строки сохраняют id из файла, как при импорте из админки.
+
+Сигналы моделей при загрузке не вызываются. Поэтому цены со скидкой, поисковый индекс и версии каталога
+пересчитываются в конце загрузки, а похожие товары и копии изображений строятся отдельными командами.
+"""
+import csv
+import io
+from collections import defaultdict
+from pathlib import Path
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from apps.orders.models import DeliveryType, Storehouse
+from apps.product.catalog import PRODUCT_GROUPS, PRODUCT_STATE_GROUPS, bump_catalog_version
+from apps.product.models import (
+    Category,
+    Collection,
+    Color,
+    Discount,
+    FurnitureDetails,
+    FurniturePicture,
+    Material,
+    Product,
+)
+from apps.product.search import update_search_index
+
+# Значение NULL в данных COPY: пустая строка в CSV означает пустую строку, а не NULL.
+NULL = '\\N'
+BUFFER_SIZE = 64 * 1024
+
+
+class RowError(Exception):
+    """Строка файла не может быть загружена и пропускается."""
+
+
+class RowStream:
+    """Файлоподобный объект для COPY FROM STDIN, который пишет CSV из итератора строк по мере чтения."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+
+    def read(self, size=-1):
+        size = BUFFER_SIZE if size is None or size < 0 else size
+        while self.buffer.tell() < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+
+class Table:
+    """
+    Таблица модели model, загружаемая из файла filename.
+
+    columns - столбцы таблицы, значения которых берутся из файла: одноимённые столбцы CSV или результат
+    метода импортёра reader. Строки сопоставляются по столбцам key. Столбцы insert_only (SQL-выражения
+    по временной таблице) записываются только в новые строки.
+    """
+
+    def __init__(self, model, filename, columns, key=('id',), reader=None, insert_only=None):
+        self.model = model
+        self.filename = filename
+        self.columns = columns
+        self.key = key
+        self.reader = reader
+        self.insert_only = insert_only or {}
+
+    @property
+    def db_table(self):
+        return self.model._meta.db_table
+
+    @property
+    def staging(self):
+        return f'import_{self.db_table}'
+
+    @property
+    def changed(self):
+        """Временная таблица ключей добавленных и изменённых строк."""
+        return f'import_changed_{self.db_table}'
+
+    def defaults(self):
+        """{столбец: значение по умолчанию} для обязательных столбцов модели, которых нет в файле."""
+        return {
+            field.column: field.get_db_prep_save(field.get_default(), connection)
+            for field in self.model._meta.concrete_fields
+            if not field.primary_key
+            and field.has_default()
+            and field.column not in self.columns
+            and field.column not in self.insert_only
+        }
+
+
+PRODUCT_COLUMNS = (
+    'id',
+    'article',
+    'name',
+    'width',
+    'height',
+    'length',
+    'weight',
+    'color_id',
+    'images_id',
+    'material_id',
+    'legs_material_id',
+    'furniture_details_id',
+    'fast_delivery',
+    'country',
+    'brand',
+    'warranty',
+    'price',
+    'description',
+    'category_id',
+    'collection_id',
+)
+
+TABLES = (
+    Table(Color, 'colors.csv', ('id', 'name')),
+    Table(Material, 'materials.csv', ('id', 'name')),
+    Table(Category, 'category.csv', ('id', 'name', 'slug')),
+    Table(Collection, 'collections.csv', ('id', 'name', 'slug')),
+    Table(
+        FurnitureDetails,
+        'furniture_details.csv',
+        ('id', 'purpose', 'furniture_type', 'construction', 'swing_mechanism', 'armrest_adjustment'),
+    ),
+    Table(DeliveryType, 'delivery_type.csv', ('id', 'name')),
+    Table(Product, 'products.csv', PRODUCT_COLUMNS, reader='read_product', insert_only={'effective_price': 'price'}),
+    Table(Storehouse, 'store.csv', ('product_id', 'quantity'), key=('product_id',), reader='read_store'),
+    Table(
+        Discount, 'discounts.csv', ('id', 'discount', 'discount_created_at', 'discount_end_at'), reader='read_discount'
+    ),
+)
+
+
+def quote(*names, prefix=''):
+    return ', '.join(prefix + connection.ops.quote_name(name) for name in names)
+
+
+def equal(left, right, columns):
+    """SQL-условие: строки left и right совпадают в столбцах columns."""
+    return ' AND '.join(f'{left}.{column} = {right}.{column}' for column in map(connection.ops.quote_name, columns))
+
+
+def distinct(left, right, columns):
+    """SQL-условие: строки left и right различаются в столбцах columns."""
+    return f'({quote(*columns, prefix=left + ".")}) IS DISTINCT FROM ({quote(*columns, prefix=right + ".")})'
+
+
+class CatalogImporter:
+    """
+    Загружает файлы каталога из каталога path в одной транзакции.
+
+    При dry_run изменения не сохраняются, а для каждой таблицы выводятся количество новых, изменённых и
+    неизменных строк и до diff_limit изменённых строк с именами изменённых столбцов.
+    """
+
+    def __init__(self, path, stdout, dry_run=False, diff_limit=10):
+        self.path = Path(path)
+        self.stdout = stdout
+        self.dry_run = dry_run
+        self.diff_limit = diff_limit
+        # id строк справочников в базе и в прочитанных файлах: {модель: множество id}.
+        self.known = defaultdict(set)
+        self.pictures = {}
+        self.discount_products = []
+        self.errors = []
+        self.loaded = []
+
+    def run(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            for table in TABLES:
+                if (self.path / table.filename).exists():
+                    self.load(cursor, table)
+            if Discount in self.loaded:
+                self.load_discount_products(cursor)
+            if self.dry_run:
+                transaction.set_rollback(True)
+            else:
+                self.finish(cursor)
+        for error in self.errors[: self.diff_limit]:
+            self.stdout.write(f'  {error}')
+        if len(self.errors) > self.diff_limit:
+            self.stdout.write(f'  ... всего пропущено строк: {len(self.errors)}')
+        return len(self.errors)
+
+    def read(self, table):
+        """Строки файла таблицы в порядке столбцов table.columns; ошибочные строки пропускаются."""
+        nullable = {field.column for field in table.model._meta.concrete_fields if field.null}
+        reader = getattr(self, table.reader) if table.reader else self.read_columns
+        seen = set()
+        with open(self.path / table.filename, newline='', encoding='utf-8') as file:
+            rows = csv.DictReader(file)
+            rows.fieldnames = [name.strip() for name in rows.fieldnames]
+            for line, row in enumerate(rows, start=2):
+                try:
+                    values = dict(zip(table.columns, reader(table, row)))
+                    key = tuple(values[column] for column in table.key)
+                    if key in seen:
+                        raise RowError(f'повтор ключа {", ".join(map(str, key))}')
+                    if 'id' in values:
+                        self.known[table.model].add(int(values['id']))
+                except (RowError, KeyError, ValueError) as error:
+                    self.errors.append(f'{table.filename}:{line}: {error}')
+                    continue
+                seen.add(key)
+                yield [
+                    NULL if value is None or (value == '' and column in nullable) else value
+                    for column, value in values.items()
+                ]
+
+    def read_columns(self, table, row):
+        return [row[column].strip() for column in table.columns]
+
+    def reference(self, model, value):
+        """id строки справочника model из значения value или None; неизвестный id - ошибка строки."""
+        value = value.strip()
+        if not value:
+            return None
+        if not value.isdigit() or int(value) not in self.known[model]:
+            raise RowError(f'{model._meta.verbose_name} {value} не найден')
+        return value
+
+    def read_product(self, table, row):
+        # В файле материалы перечислены списком: первый - основной материал, последний - материал ножек/каркаса.
+        materials = [self.reference(Material, value) for value in row['material'].split(',') if value.strip()]
+        return [
+            row['id'].strip(),
+            row['article'].strip(),
+            row['name'].strip(),
+            row['width'].strip(),
+            row['height'].strip(),
+            row['length'].strip(),
+            row['weight'].strip(),
+            self.reference(Color, row['color']),
+            self.pictures.get(row['image'].strip()),
+            materials[0] if materials else None,
+            materials[-1] if len(materials) > 1 else None,
+            self.reference(FurnitureDetails, row['furniture_details']),
+            row['fast_delivery'].strip(),
+            row['country'].strip(),
+            row['brand'].strip(),
+            row['warranty'].strip(),
+            row['price'].strip(),
+            row['description'].strip(),
+            self.reference(Category, row['category']),
+            self.reference(Collection, row['collection']),
+        ]
+
+    def read_store(self, table, row):
+        return [self.reference(Product, row['product']), row['quantity'].strip()]
+
+    def read_discount(self, table, row):
+        values = self.read_columns(table, row)
+        for product in row['applied_products'].split(','):
+            if product.strip():
+                self.discount_products.append((values[0], self.reference(Product, product)))
+        return values
+
+    def prepare_pictures(self, table):
+        """Находит или создаёт изображения FurniturePicture для путей из столбца image файла товаров."""
+        with open(self.path / table.filename, newline='', encoding='utf-8') as file:
+            paths = {row['image'].strip() for row in csv.DictReader(file)} - {''}
+        for pk, path in (
+            FurniturePicture.objects.filter(main_image__in=paths).order_by('-pk').values_list('pk', 'main_image')
+        ):
+            self.pictures[path] = pk
+        missing = paths - self.pictures.keys()
+        for picture in FurniturePicture.objects.bulk_create(FurniturePicture(main_image=path) for path in missing):
+            self.pictures[picture.main_image.name] = picture.pk
+
+    def load(self, cursor, table):
+        self.known[table.model].update(table.model._default_manager.values_list('pk', flat=True))
+        if table.model is Product:
+            self.prepare_pictures(table)
+        cursor.execute(
+            f'CREATE TEMP TABLE {table.staging} ON COMMIT DROP AS '
+            f'SELECT {quote(*table.columns)} FROM {table.db_table} WITH NO DATA'
+        )
+        cursor.copy_expert(
+            f"COPY {table.staging} ({quote(*table.columns)}) FROM STDIN WITH (FORMAT csv, NULL '{NULL}')",
+            RowStream(self.read(table)),
+        )
+        compared = [column for column in table.columns if column not in table.key]
+        join = equal('s', 't', table.key)
+        cursor.execute(
+            f'SELECT count(*), count(*) FILTER (WHERE t.{quote(table.key[0])} IS NULL), '
+            f'count(*) FILTER (WHERE t.{quote(table.key[0])} IS NOT NULL AND {distinct("s", "t", compared)}) '
+            f'FROM {table.staging} s LEFT JOIN {table.db_table} t ON {join}'
+        )
+        total, created, changed = cursor.fetchone()
+        self.stdout.write(
+            f'{table.filename}: строк {total}, новых {created}, изменённых {changed}, '
+            f'без изменений {total - created - changed}'
+        )
+        if self.dry_run:
+            self.show_changes(cursor, table, compared, join)
+        else:
+            self.upsert(cursor, table, compared)
+        self.loaded.append(table.model)
+
+    def show_changes(self, cursor, table, compared, join):
+        changes = ', '.join(
+            f"CASE WHEN s.{quote(column)} IS DISTINCT FROM t.{quote(column)} THEN '{column}' END"
+            for column in compared
+        )
+        cursor.execute(
+            f'SELECT {quote(*table.key, prefix="s.")}, array_remove(ARRAY[{changes}], NULL) '
+            f'FROM {table.staging} s JOIN {table.db_table} t ON {join} '
+            f'WHERE {distinct("s", "t", compared)} ORDER BY 1 LIMIT %s',
+            [self.diff_limit],
+        )
+        for *key, columns in cursor.fetchall():
+            self.stdout.write(f'  {", ".join(map(str, key))}: {", ".join(columns)}')
+
+    def upsert(self, cursor, table, compared):
+        defaults = table.defaults()
+        columns = [*table.columns, *table.insert_only, *defaults]
+        values = [
+            quote(*table.columns, prefix='s.'),
+            *(f's.{expression}' for expression in table.insert_only.values()),
+            *(['%s'] * len(defaults)),
+        ]
+        updates = ', '.join(f'{quote(column)} = EXCLUDED.{quote(column)}' for column in compared)
+        cursor.execute(
+            f'CREATE TEMP TABLE {table.changed} ON COMMIT DROP AS '
+            f'SELECT {quote(*table.key)} FROM {table.db_table} WITH NO DATA'
+        )
+        cursor.execute(
+            f'WITH upserted AS (INSERT INTO {table.db_table} AS t ({quote(*columns)}) '
+            f'SELECT {", ".join(values)} FROM {table.staging} s '
+            f'ON CONFLICT ({quote(*table.key)}) DO UPDATE SET {updates} '
+            f'WHERE {distinct("t", "EXCLUDED", compared)} RETURNING {quote(*table.key, prefix="t.")}) '
+            f'INSERT INTO {table.changed} SELECT * FROM upserted',
+            list(defaults.values()),
+        )
+
+    def load_discount_products(self, cursor):
+        """Заменяет товары загруженных скидок товарами из столбца applied_products."""
+        through = Discount.applied_products.through._meta.db_table
+        staging = f'import_{through}'
+        discounts = f'import_{Discount._meta.db_table}'
+        cursor.execute(
+            f'CREATE TEMP TABLE {staging} ON COMMIT DROP AS '
+            f'SELECT discount_id, product_id FROM {through} WITH NO DATA'
+        )
+        cursor.copy_expert(
+            f'COPY {staging} (discount_id, product_id) FROM STDIN WITH (FORMAT csv)',
+            RowStream(set(self.discount_products)),
+        )
+        removed = (
+            f'FROM {through} t WHERE t.discount_id IN (SELECT id FROM {discounts}) AND NOT EXISTS '
+            f'(SELECT 1 FROM {staging} s WHERE s.discount_id = t.discount_id AND s.product_id = t.product_id)'
+        )
+        cursor.execute(
+            f'SELECT (SELECT count(*) FROM {staging} s WHERE NOT EXISTS (SELECT 1 FROM {through} t '
+            f'WHERE t.discount_id = s.discount_id AND t.product_id = s.product_id)), (SELECT count(*) {removed})'
+        )
+        added, deleted = cursor.fetchone()
+        self.stdout.write(f'Товары скидок: добавлено {added}, удалено {deleted}')
+        if not self.dry_run:
+            cursor.execute(f'DELETE {removed}')
+            cursor.execute(
+                f'INSERT INTO {through} (discount_id, product_id) SELECT discount_id, product_id FROM {staging} '
+                'ON CONFLICT DO NOTHING'
+            )
+
+    def finish(self, cursor):
+        """Пересчитывает данные, которые при сохранении через ORM обновляют сигналы."""
+        for sql in connection.ops.sequence_reset_sql(no_style(), [*self.loaded, FurniturePicture]):
+            cursor.execute(sql)
+        if Product in self.loaded or Discount in self.loaded:
+            Product.objects.all().update_discounts()
+        if Product in self.loaded:
+            changed = RawSQL(f'SELECT id FROM import_changed_{Product._meta.db_table}', ())
+            update_search_index(Product.objects.filter(pk__in=changed))
+        bump_catalog_version(*PRODUCT_GROUPS, *PRODUCT_STATE_GROUPS, 'delivery_types')
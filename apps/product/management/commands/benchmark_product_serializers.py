@@ -0,0 +1,64 @@
+"""Команда сравнения сериализаторов списков товаров."""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from apps.product.models import Product
+from apps.product.row_serializers import RowSerializer
+from apps.product.serializers import ProductSerializer, ShortProductSerializer
+
+
+class Command(BaseCommand):
+    """Измеряет время сериализации товаров DRF-сериализаторами и RowSerializer и сравнивает результат."""
+
+    help = (
+        'Выводит время выборки и сериализации одного товара для ShortProductSerializer и '
+        'ProductSerializer и проверяет, что RowSerializer отдаёт тот же JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Количество товаров в выборке.')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество повторов, берётся лучшее время.')
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.for_listing().order_by('name', 'pk')[: options['rows']]
+        total = queryset.count()
+        if not total:
+            raise CommandError('Нет товаров для сравнения.')
+        request = Request(RequestFactory().get('/api/products/'))
+        context = {'request': request, 'favorite_ids': frozenset()}
+        renderer = JSONRenderer()
+
+        for serializer_class in (ShortProductSerializer, ProductSerializer):
+            query_time, instances = self.measure(lambda: list(queryset.all()), options['repeat'])
+            serialize_time, data = self.measure(
+                lambda: serializer_class(instances, many=True, context=context).data, options['repeat']
+            )
+            columns = RowSerializer(serializer_class, context)
+            row_query_time, rows = self.measure(lambda: list(columns.get_rows(queryset)), options['repeat'])
+            row_serialize_time, row_data = self.measure(
+                lambda: RowSerializer(serializer_class, context).to_representation(rows), options['repeat']
+            )
+            if renderer.render(data) != renderer.render(row_data):
+                raise CommandError(f'{serializer_class.__name__}: результаты сериализаторов различаются.')
+            self.stdout.write(f'{serializer_class.__name__}, мкс/товар (выборка + сериализация):')
+            for label, query, serialize in (
+                ('DRF', query_time, serialize_time),
+                ('RowSerializer', row_query_time, row_serialize_time),
+            ):
+                self.stdout.write(f'  {label}: {query / total * 1e6:.1f} + {serialize / total * 1e6:.1f}')
+        self.stdout.write(self.style.SUCCESS(f'Результаты совпадают, товаров: {total}'))
+
+    @staticmethod
+    def measure(function, repeat):
+        """Лучшее время выполнения function и её результат."""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,43 @@
+"""Команда построения уменьшенных копий изображений товаров."""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.product.models import FurniturePicture
+from apps.product.renditions import RENDITION_FIELDS, get_sources, outdated_pictures, render_sources, save_renditions
+
+
+class Command(BaseCommand):
+    """Строит копии изображений FurniturePicture в нескольких процессах."""
+
+    help = (
+        'Строит уменьшенные копии и WebP/AVIF-варианты изображений товаров, для которых они ещё не построены '
+        'и не было ошибки чтения текущего файла. '
+        'Изображения обрабатываются в пуле процессов, карта копий сохраняется основным процессом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Количество процессов.')
+        parser.add_argument('--all', action='store_true', help='Перестроить копии всех изображений.')
+
+    def handle(self, *args, **options):
+        pictures = FurniturePicture.objects.all() if options['all'] else outdated_pictures()
+        tasks = {
+            picture.pk: get_sources(picture)
+            for picture in pictures.only('pk', *RENDITION_FIELDS).order_by('pk').iterator()
+        }
+        if not tasks:
+            self.stdout.write(self.style.SUCCESS('Копии всех изображений построены'))
+            return
+        # Дочерние процессы не должны получить открытые подключения родителя.
+        connections.close_all()
+        built = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            futures = {executor.submit(render_sources, sources): pk for pk, sources in tasks.items()}
+            for future in as_completed(futures):
+                pk = futures[future]
+                built += save_renditions(pk, tasks[pk], future.result())
+        self.stdout.write(self.style.SUCCESS(f'Построены копии изображений: {built} из {len(tasks)}'))
@@ -0,0 +1,24 @@
+"""Команда пересчёта похожих товаров."""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.product.models import Category
+from apps.product.similarity import rebuild_similar_products
+
+
+class Command(BaseCommand):
+    """Полностью пересчитывает таблицу похожих товаров по категориям."""
+
+    help = 'Пересчитывает похожие товары (ближайших соседей по характеристикам) для всех или указанных категорий.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', action='append', dest='categories', help='Slug категории, можно несколько.')
+        parser.add_argument('--count', type=int, help='Количество похожих товаров на товар.')
+
+    def handle(self, *args, **options):
+        category_ids = None
+        if options['categories']:
+            category_ids = list(Category.objects.filter(slug__in=options['categories']).values_list('pk', flat=True))
+            if len(category_ids) != len(set(options['categories'])):
+                raise CommandError('Не все категории найдены.')
+        total = rebuild_similar_products(category_ids=category_ids, count=options['count'])
+        self.stdout.write(self.style.SUCCESS(f'Сохранено похожих товаров: {total}'))
@@ -0,0 +1,53 @@
+"""Команда проверки бюджетов SQL-запросов и времени сериализации API."""
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from apps.product.budgets import BudgetCheck
+from common.queries import repeated_queries
+
+
+class Command(BaseCommand):
+    """Выполняет запросы ко всем маршрутам API на тестовой базе и сравнивает их с бюджетами."""
+
+    help = (
+        'Создаёт тестовую базу с фиксированным набором данных, выполняет запросы к каждому маршруту '
+        'config/api_router.py от анонимного и авторизованного пользователя и проверяет код ответа и точное '
+        'количество SQL-запросов по файлу QUERY_BUDGET_FILE, а с --time-factor - и время сериализации. '
+        'С --update записывает измерения в файл.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--update', action='store_true', help='Записать измерения в файл бюджетов.')
+        parser.add_argument(
+            '--time-factor',
+            type=float,
+            help='Проверять время сериализации с этим множителем бюджетов (1 - на машине, где они записаны).',
+        )
+        parser.add_argument('--case', help='Проверить только запросы, в имени которых есть эта строка.')
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую базу.')
+
+    def handle(self, *args, **options):
+        check = BudgetCheck(time_factor=options['time_factor'], only=options['case'])
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'], aliases={'default'})
+        try:
+            measurements, uncovered = check.measure_all()
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        for route, name in uncovered:
+            self.stdout.write(self.style.ERROR(f'Нет запроса к маршруту {route} ({name})'))
+        if options['update']:
+            version = check.save(measurements)
+            self.stdout.write(self.style.SUCCESS(f'Бюджеты записаны, версия {version}: {len(measurements)}'))
+            return
+
+        failures = check.compare(measurements)
+        for key, message, measurement in failures:
+            self.stdout.write(self.style.ERROR(f'{key}: {message}'))
+            for count, sql in repeated_queries(measurement.queries):
+                self.stdout.write(f'  {count} x {sql}')
+        if failures or uncovered:
+            raise CommandError(f'Нарушено бюджетов: {len(failures)}, маршрутов без запросов: {len(uncovered)}')
+        self.stdout.write(self.style.SUCCESS(f'Бюджеты соблюдены: {len(measurements)}'))
@@ -0,0 +1,54 @@
+"""Команда генерации синтетических данных для нагрузочных тестов."""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.product.synthetic import SyntheticData
+
+
+class Command(BaseCommand):
+    """Создаёт пользователей, товары, склад, скидки, избранное, корзины, отзывы и заказы по образцу сида."""
+
+    help = (
+        'Генерирует заданный объём данных по распределениям сида data/: товары с остатками, скидки с '
+        'пересекающимися периодами, пользователей с избранным, корзинами и отзывами, заказы с товарами. '
+        'Один и тот же --seed на одной и той же исходной базе даёт одинаковые данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора.')
+        parser.add_argument('--products', type=int, default=10000, help='Количество товаров.')
+        parser.add_argument('--users', type=int, default=1000, help='Количество пользователей.')
+        parser.add_argument('--orders', type=int, default=10000, help='Количество заказов.')
+        parser.add_argument('--discounts', type=int, default=20, help='Количество скидок.')
+        parser.add_argument('--favorites', type=float, default=5, help='Среднее число избранных товаров.')
+        parser.add_argument('--cart-items', type=float, default=3, help='Среднее число товаров в корзине.')
+        parser.add_argument('--reviews', type=float, default=2, help='Среднее число отзывов пользователя.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Количество строк в пачке.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Количество процессов.')
+        parser.add_argument('--password', default='synthetic', help='Пароль новых пользователей.')
+
+    def handle(self, *args, **options):
+        generator = SyntheticData(
+            options['seed'],
+            self.stdout,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            password=options['password'],
+        )
+        try:
+            created = generator.run(
+                users=options['users'],
+                products=options['products'],
+                orders=options['orders'],
+                discounts=options['discounts'],
+                favorites=options['favorites'],
+                cart_items=options['cart_items'],
+                reviews=options['reviews'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        for model, count in created.items():
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {count}')
+        self.stdout.write(self.style.SUCCESS('Данные созданы.'))
+        self.stdout.write('Для популярности и похожих товаров выполните rebuild_popularity и build_similar_products.')
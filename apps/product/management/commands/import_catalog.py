@@ -0,0 +1,36 @@
+"""Команда загрузки каталога из CSV."""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from apps.product.ingest import CatalogImporter
+
+
+class Command(BaseCommand):
+    """Загружает справочники, товары, склад и скидки из файлов data/*.csv через COPY."""
+
+    help = (
+        'Загружает colors, materials, category, collections, furniture_details, delivery_type, products, store и '
+        'discounts из CSV через COPY во временные таблицы и обновляет каталог одним INSERT ... ON CONFLICT на '
+        'файл. С --dry-run только показывает, какие строки будут добавлены и изменены.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='data', help='Каталог с CSV-файлами.')
+        parser.add_argument('--dry-run', action='store_true', help='Показать изменения без сохранения.')
+        parser.add_argument('--diff-limit', type=int, default=10, help='Сколько изменённых строк показывать.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Загрузка через COPY поддерживается только для PostgreSQL.')
+        importer = CatalogImporter(
+            options['path'], self.stdout, dry_run=options['dry_run'], diff_limit=options['diff_limit']
+        )
+        try:
+            skipped = importer.run()
+        except (OSError, DatabaseError) as error:
+            raise CommandError(error)
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Пробный запуск: изменения не сохранены.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Каталог загружен, пропущено строк: {skipped}'))
+        self.stdout.write('Для новых товаров и изображений выполните build_similar_products и build_renditions.')
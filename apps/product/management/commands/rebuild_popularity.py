@@ -0,0 +1,20 @@
+"""Команда пересчёта популярности товаров."""
+from django.core.management.base import BaseCommand
+
+from apps.product.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    """Полностью пересчитывает таблицу популярности товаров по истории заказов."""
+
+    help = (
+        'Пересчитывает популярность товаров по истории заказов с затуханием во времени. '
+        'Заказы, оформленные во время пересчёта, могут не попасть в результат.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Количество строк заказов в пачке.')
+
+    def handle(self, *args, **options):
+        total = rebuild_popularity(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитана популярность товаров: {total}'))
@@ -0,0 +1,36 @@
+"""Команда пересчёта действующих скидок товаров."""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.product.models import Discount, Product
+
+
+class Command(BaseCommand):
+    """Пересчитывает active_discount и effective_price товаров на границах периодов скидок."""
+
+    help = (
+        'Пересчитывает цены товаров, у скидок которых начался или закончился период. '
+        'Запускается сервисом scheduler (compose/*/django/scheduler) каждый час.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=1, help='За сколько последних дней учитывать границы периодов скидок.'
+        )
+        parser.add_argument('--all', action='store_true', help='Пересчитать все товары.')
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if not options['all']:
+            today = timezone.localdate()
+            since = today - timedelta(days=options['days'])
+            discounts = Discount.objects.filter(
+                Q(discount_created_at__gt=since, discount_created_at__lte=today)
+                | Q(discount_end_at__gte=since, discount_end_at__lt=today)
+            )
+            products = products.filter(pk__in=discounts.values('applied_products'))
+        updated = products.update_discounts()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано товаров: {updated}'))
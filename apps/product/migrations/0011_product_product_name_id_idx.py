@@ -0,0 +1,13 @@
+# Generated by Django 4.2.3 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [('product', '0010_alter_furnituredetails_furniture_type')]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product', index=models.Index(fields=['name', 'id'], name='product_name_id_idx')
+        )
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.3 on 2026-10-17 21:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [('product', '0011_product_product_name_id_idx')]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Позиция в списке')),
+                ('score', models.FloatField(verbose_name='Схожесть')),
+                (
+                    'product',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='similar_products',
+                        to='product.product',
+                        verbose_name='Товар',
+                    ),
+                ),
+                (
+                    'similar',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='similar_to',
+                        to='product.product',
+                        verbose_name='Похожий товар',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Похожий товар',
+                'verbose_name_plural': 'Похожие товары',
+                'ordering': ('product', 'rank'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='similarproduct',
+            constraint=models.UniqueConstraint(fields=('product', 'rank'), name='unique_similar_product_rank'),
+        ),
+    ]
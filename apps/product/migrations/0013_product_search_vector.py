@@ -0,0 +1,41 @@
+# Generated by Django 4.2.3 on 2026-10-17 21:55
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def fill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Product = apps.get_model('product', 'Product')
+    Collection = apps.get_model('product', 'Collection')
+    ProductType = apps.get_model('product', 'ProductType')
+    collection = Subquery(Collection.objects.filter(pk=OuterRef('collection_id')).values('name')[:1])
+    product_type = Subquery(ProductType.objects.filter(pk=OuterRef('product_type_id')).values('name')[:1])
+    Product.objects.update(
+        search_vector=SearchVector('name', weight='A', config='russian')
+        + SearchVector('brand', collection, product_type, weight='B', config='russian')
+        + SearchVector('description', weight='C', config='russian')
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [('product', '0012_similarproduct')]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name='Поисковый вектор'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:05
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [('product', '0013_product_search_vector')]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['name'], name='product_name_trgm_idx', opclasses=('gin_trgm_ops',)
+            ),
+        ),
+    ]
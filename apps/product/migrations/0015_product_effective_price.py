@@ -0,0 +1,59 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:30
+
+from django.db import migrations, models
+from django.db.models import F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+
+def fill_effective_prices(apps, schema_editor):
+    Product = apps.get_model('product', 'Product')
+    Discount = apps.get_model('product', 'Discount')
+    today = timezone.localdate()
+    active_discount = (
+        Discount.objects.filter(
+            applied_products=OuterRef('pk'), discount_created_at__lte=today, discount_end_at__gte=today
+        )
+        .order_by()
+        .values('applied_products')
+        .annotate(max_discount=Max('discount'))
+        .values('max_discount')
+    )
+    Product.objects.update(active_discount=Coalesce(Subquery(active_discount), Value(0)))
+    Product.objects.update(
+        effective_price=Round(
+            F('price') * (100 - F('active_discount')) / 100,
+            2,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [('product', '0014_product_name_trgm_idx')]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='active_discount',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Действующая скидка, %'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Цена со скидкой'
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='product', index=models.Index(fields=['effective_price', 'id'], name='product_price_id_idx')
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                condition=models.Q(('active_discount__gt', 0)), fields=['id'], name='product_discounted_idx'
+            ),
+        ),
+        migrations.RunPython(fill_effective_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [('product', '0015_product_effective_price')]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                (
+                    'product',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='popularity',
+                        serialize=False,
+                        to='product.product',
+                        verbose_name='Товар',
+                    ),
+                ),
+                ('score', models.FloatField(default=0, verbose_name='Популярность')),
+                (
+                    'category',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='product.category',
+                        verbose_name='Категория',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Популярность товара',
+                'verbose_name_plural': 'Популярность товаров',
+                'indexes': [
+                    models.Index(fields=['-score', 'product'], name='popularity_score_idx'),
+                    models.Index(fields=['category', '-score', 'product'], name='popularity_category_score_idx'),
+                ],
+            },
+        )
+    ]
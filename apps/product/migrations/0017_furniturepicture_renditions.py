@@ -0,0 +1,15 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [('product', '0016_productpopularity')]
+
+    operations = [
+        migrations.AddField(
+            model_name='furniturepicture',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Уменьшенные копии'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.3 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+def remove_duplicate_cart_items(apps, schema_editor):
+    """Оставляет из повторяющихся строк корзины последнюю изменённую."""
+    CartItem = apps.get_model('product', 'CartItem')
+    latest = (
+        CartItem.objects.filter(cart=models.OuterRef('cart'), product=models.OuterRef('product'))
+        .order_by('-updated_at', '-pk')
+        .values('pk')[:1]
+    )
+    CartItem.objects.exclude(pk=models.Subquery(latest)).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [('product', '0017_furniturepicture_renditions')]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='cart_product_unique'),
+        ),
+    ]
@@ -1,11 +1,15 @@
 """Модели приложения product."""
 from decimal import ROUND_HALF_UP, Decimal
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator
 from django.db import models
+from django.db.models.functions import Coalesce, Round
 from django.template.defaultfilters import slugify
 from django.utils import timezone
 
+from apps.product.catalog import bump_catalog_version
 from apps.users.models import User
 
 
@@ -53,6 +57,7 @@ class FurniturePicture(models.Model):
     third_image = models.ImageField(
         verbose_name='Фотография продукта', default='products/noimage_detail.png', blank=True
     )
+    renditions = models.JSONField(verbose_name='Уменьшенные копии', default=dict, blank=True, editable=False)
 
     class Meta:
         verbose_name = 'Изображение мебели'
@@ -150,6 +155,65 @@ class ProductType(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    """Набор запросов для товаров."""
+
+    def for_listing(self):
+        """
+        Аннотирует товары данными для отображения в списках одним SQL-запросом.
+
+        stock - количество на складе, rating - средний рейтинг. Скидка и цена с её учётом хранятся
+        в полях active_discount и effective_price.
+        """
+        return self.select_related('images').annotate(
+            stock=Coalesce('storehouse__quantity', models.Value(0), output_field=models.PositiveSmallIntegerField()),
+            rating=models.F('ratings__average_rating'),
+        )
+
+    def current_discounts(self):
+        """{id товара: максимальная скидка, действующая сегодня} одним запросом, без учёта active_discount."""
+        return dict(self.annotate(current_discount=current_discount()).values_list('pk', 'current_discount'))
+
+    def update_discounts(self):
+        """
+        Пересчитывает действующую скидку и цену с её учётом для товаров выборки.
+
+        Обновляются одним запросом только строки, у которых значения изменились, поэтому пересчёт
+        всего каталога не переписывает строки товаров без скидок.
+        """
+        active_discount = current_discount()
+        effective_price = Round(
+            models.F('price') * (100 - active_discount) / 100,
+            2,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+        updated = (
+            self.alias(new_discount=active_discount, new_price=effective_price)
+            .exclude(active_discount=models.F('new_discount'), effective_price=models.F('new_price'))
+            .update(active_discount=active_discount, effective_price=effective_price)
+        )
+        if updated:
+            bump_catalog_version('products')
+        return updated
+
+
+def current_discount():
+    """Выражение: максимальная скидка товара OuterRef('pk'), действующая сегодня; без скидок - 0."""
+    today = timezone.localdate()
+    return Coalesce(
+        models.Subquery(
+            Discount.objects.filter(
+                applied_products=models.OuterRef('pk'), discount_created_at__lte=today, discount_end_at__gte=today
+            )
+            .order_by()
+            .values('applied_products')
+            .annotate(max_discount=models.Max('discount'))
+            .values('max_discount')
+        ),
+        models.Value(0),
+    )
+
+
 class Product(models.Model):
     """Модель Продуктов(Товаров) магазина."""
 
@@ -214,31 +278,101 @@ class Product(models.Model):
     collection = models.ForeignKey(
         Collection, verbose_name='Коллекция', on_delete=models.SET_NULL, related_name='products', blank=True, null=True
     )
+    active_discount = models.PositiveSmallIntegerField(verbose_name='Действующая скидка, %', default=0, editable=False)
+    effective_price = models.DecimalField(
+        verbose_name='Цена со скидкой', max_digits=10, decimal_places=2, editable=False
+    )
+    search_vector = SearchVectorField(verbose_name='Поисковый вектор', null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         ordering = ('name',)
+        indexes = (
+            models.Index(fields=('name', 'id'), name='product_name_id_idx'),
+            models.Index(fields=('effective_price', 'id'), name='product_price_id_idx'),
+            models.Index(fields=('id',), condition=models.Q(active_discount__gt=0), name='product_discounted_idx'),
+            GinIndex(fields=('search_vector',), name='product_search_vector_idx'),
+            GinIndex(fields=('name',), opclasses=('gin_trgm_ops',), name='product_name_trgm_idx'),
+        )
 
     def __str__(self):
         return f'{self.article} - {self.name}'
 
+    def save(self, *args, **kwargs):
+        self.effective_price = self.discounted_price(self.active_discount)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'price' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'effective_price'}
+        super().save(*args, **kwargs)
+
+    def discounted_price(self, discount):
+        """Возвращает цену товара со скидкой discount процентов."""
+        return (Decimal(self.price) * (100 - discount) / 100).quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
+
     def extract_discount(self):
-        """Возвращает скидку на продукт."""
-        now = timezone.now()
-        return (
-            self.discounts.filter(
-                models.Q(discount_created_at=now, discount_end_at__gte=now)
-                | models.Q(discount_created_at__lte=now, discount_end_at__gte=now)
-            ).aggregate(max_discount=models.Max('discount'))['max_discount']
-            or 0
-        )
+        """
+        Возвращает скидку, действующую на продукт сегодня.
+
+        Скидка считается запросом к скидкам, а не берётся из active_discount: сохранённое значение
+        обновляется по расписанию и на границе периода скидки может отставать.
+        """
+        return Product.objects.filter(pk=self.pk).current_discounts().get(self.pk, 0)
 
     def calculate_total_price(self):
-        """Возвращает рассчитанную итоговую цену товара с учётом скидки."""
-        discount = self.extract_discount()
-        total_price = self.price * Decimal(1 - discount / 100)
-        return total_price.quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
+        """Возвращает итоговую цену товара с учётом скидки, действующей сегодня."""
+        return self.discounted_price(self.extract_discount())
+
+
+class SimilarProduct(models.Model):
+    """Предрассчитанные похожие товары: ближайшие соседи по вектору характеристик."""
+
+    product = models.ForeignKey(
+        Product, verbose_name='Товар', on_delete=models.CASCADE, related_name='similar_products'
+    )
+    similar = models.ForeignKey(
+        Product, verbose_name='Похожий товар', on_delete=models.CASCADE, related_name='similar_to'
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='Позиция в списке')
+    score = models.FloatField(verbose_name='Схожесть')
+
+    class Meta:
+        verbose_name = 'Похожий товар'
+        verbose_name_plural = 'Похожие товары'
+        ordering = ('product', 'rank')
+        constraints = (models.UniqueConstraint(fields=('product', 'rank'), name='unique_similar_product_rank'),)
+
+    def __str__(self):
+        return f'{self.product} ~ {self.similar}'
+
+
+class ProductPopularity(models.Model):
+    """
+    Популярность товара: заказанные единицы с экспоненциальным затуханием во времени.
+
+    Заказ в момент t добавляет к score количество * 2^((t - POPULARITY_EPOCH) / период полураспада).
+    Все значения затухают одинаково, поэтому сортировка по score совпадает с сортировкой по текущей
+    популярности, а текущее значение получается делением score на вес текущего момента.
+    """
+
+    product = models.OneToOneField(
+        Product, verbose_name='Товар', on_delete=models.CASCADE, primary_key=True, related_name='popularity'
+    )
+    category = models.ForeignKey(Category, verbose_name='Категория', on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(verbose_name='Популярность', default=0)
+
+    class Meta:
+        verbose_name = 'Популярность товара'
+        verbose_name_plural = 'Популярность товаров'
+        indexes = (
+            models.Index(fields=('-score', 'product'), name='popularity_score_idx'),
+            models.Index(fields=('category', '-score', 'product'), name='popularity_category_score_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.product}: {self.score}'
 
 
 class Discount(models.Model):
@@ -300,6 +434,7 @@ class CartItem(models.Model):
     class Meta:
         verbose_name = 'Корзина с товарами'
         verbose_name_plural = 'Корзины с товарами'
+        constraints = (models.UniqueConstraint(fields=('cart', 'product'), name='cart_product_unique'),)
 
     def __str__(self):
         return f'{self.product.name} {self.quantity}'
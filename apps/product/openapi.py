@@ -3,11 +3,13 @@ from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_sche
 from rest_framework import status
 
 from apps.product.cart_serializers import (
+    CartBatchSerializer,
     CartItemCreateSerializer,
     CartModelSerializer,
     FavoriteCreateSerializer,
     FavoriteSerializer,
 )
+from apps.product.serializers import SuggestionSerializer
 
 cart_items = extend_schema(responses={status.HTTP_200_OK: CartModelSerializer}, methods=['GET'])
 add_cartitem = extend_schema(
@@ -28,6 +30,16 @@ delete_cartitem = extend_schema(
     },
     methods=['DELETE'],
 )
+cart_batch = extend_schema(
+    request=CartBatchSerializer,
+    responses={
+        status.HTTP_200_OK: OpenApiResponse(
+            response=CartModelSerializer,
+            description='Корзина после изменения; с delta=true - только изменённые строки, итоги и removed',
+        )
+    },
+    methods=['POST'],
+)
 favorite_list = extend_schema(responses={status.HTTP_200_OK: FavoriteSerializer}, methods=['GET'])
 add_favorite = extend_schema(
     request=FavoriteCreateSerializer,
@@ -47,3 +59,28 @@ delete_favorite = extend_schema(
     },
     methods=['DELETE'],
 )
+suggest = extend_schema(
+    parameters=[
+        OpenApiParameter('q', OpenApiTypes.STR, OpenApiParameter.QUERY, description='Начало слова'),
+        OpenApiParameter('limit', OpenApiTypes.INT, OpenApiParameter.QUERY, description='Не более 10 подсказок'),
+    ],
+    responses={status.HTTP_200_OK: SuggestionSerializer(many=True)},
+    methods=['GET'],
+)
+product_fields = extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'fields', OpenApiTypes.STR, OpenApiParameter.QUERY, description='Выводимые поля товаров через запятую'
+        ),
+        OpenApiParameter(
+            'include',
+            OpenApiTypes.STR,
+            OpenApiParameter.QUERY,
+            description=(
+                'Поля справочников через запятую (category, color, collection, material, legs_material, '
+                'furniture_details): в товарах выводятся их id, а объекты - один раз в словаре included'
+            ),
+        ),
+    ],
+    methods=['GET'],
+)
@@ -0,0 +1,88 @@
+"""
+Популярность товаров с экспоненциальным затуханием.
+
+Счётчики в ProductPopularity увеличиваются при оформлении заказа и полностью пересчитываются
+по истории заказов командой rebuild_popularity.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+
+from apps.orders.models import OrderProduct
+from apps.product.catalog import bump_catalog_version
+from apps.product.models import Product, ProductPopularity
+
+# Точка отсчёта весов заказов, при изменении нужно пересчитать таблицу командой rebuild_popularity.
+POPULARITY_EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def decay_weight(moment):
+    """Вес заказа, сделанного в момент moment."""
+    half_life = settings.POPULARITY_HALF_LIFE_DAYS * 24 * 60 * 60
+    return 2 ** ((moment - POPULARITY_EPOCH).total_seconds() / half_life)
+
+
+def current_popularity(score, moment):
+    """Значение популярности в момент moment с учётом затухания."""
+    return score / decay_weight(moment)
+
+
+def record_order(created, items):
+    """
+    Добавляет к популярности товары заказа.
+
+    items - пары (товар, количество). Строки создаются при первом заказе товара, затем счётчики
+    увеличиваются одним UPDATE, поэтому одновременные заказы не теряют приращений.
+    """
+    bump_catalog_version('popularity')
+    weight = decay_weight(created)
+    increments = defaultdict(float)
+    categories = {}
+    for product, quantity in items:
+        increments[product.pk] += quantity * weight
+        categories[product.pk] = product.category_id
+    ProductPopularity.objects.bulk_create(
+        [ProductPopularity(product_id=pk, category_id=category_id) for pk, category_id in categories.items()],
+        ignore_conflicts=True,
+    )
+    ProductPopularity.objects.filter(product_id__in=increments).update(
+        score=F('score')
+        + Case(
+            *(When(product_id=pk, then=Value(increment)) for pk, increment in increments.items()),
+            output_field=FloatField(),
+        )
+    )
+
+
+def rebuild_popularity(batch_size=10000):
+    """Пересчитывает популярность всех товаров по истории заказов, читая её пачками по batch_size строк."""
+    scores = defaultdict(float)
+    last_pk = 0
+    while True:
+        batch = list(
+            OrderProduct.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', 'product_id', 'quantity', 'order__created')[:batch_size]
+        )
+        if not batch:
+            break
+        for _, product_id, quantity, created in batch:
+            scores[product_id] += quantity * decay_weight(created)
+        last_pk = batch[-1][0]
+
+    categories = dict(Product.objects.filter(pk__in=list(scores)).values_list('pk', 'category_id'))
+    with transaction.atomic():
+        ProductPopularity.objects.all().delete()
+        ProductPopularity.objects.bulk_create(
+            [
+                ProductPopularity(product_id=product_id, category_id=categories[product_id], score=score)
+                for product_id, score in scores.items()
+                if product_id in categories
+            ],
+            batch_size=batch_size,
+        )
+        bump_catalog_version('popularity')
+    return len(scores)
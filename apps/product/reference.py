@@ -0,0 +1,129 @@
+"""
+Кэш небольших справочников в памяти процесса.
+
+Категории, цвета, материалы, типы мебели, особенности конструкции, коллекции и типы доставки
+загружаются целиком и хранятся в словаре {pk: объект}. Валидация фильтров и вложенные сериализаторы
+берут объекты из него, без JOIN и отдельных запросов. Актуальность проверяется по версии группы каталога
+в общем кэше (см. apps.product.catalog) не чаще раза в REFERENCE_CACHE_CHECK_INTERVAL секунд, поэтому
+изменение строки в админке сбрасывает кэш во всех процессах gunicorn/uvicorn.
+
+Объекты справочников общие для всех запросов процесса и не должны изменяться.
+"""
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from drf_spectacular.utils import extend_schema_field
+from rest_framework import serializers
+
+from apps.product.catalog import get_catalog_versions
+
+
+class ReferenceTable:
+    """Все строки справочника model ('приложение.Модель'), сбрасываемые при изменении версии группы group."""
+
+    def __init__(self, model, group):
+        self.model_label = model
+        self.group = group
+        self.lock = threading.Lock()
+        # Строки и индексы по полям заменяются вместе, чтобы параллельные потоки не видели их разных версий.
+        self.snapshot = None
+        self.version = None
+        self.checked_at = None
+
+    def __deepcopy__(self, memo):
+        # Фильтры и поля копируются для каждого запроса, кэш должен оставаться общим.
+        return self
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def load(self):
+        """Возвращает ({pk: объект}, индексы), перезагружая строки, если версия группы изменилась."""
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < settings.REFERENCE_CACHE_CHECK_INTERVAL:
+            return self.snapshot
+        with self.lock:
+            # Версия читается до строк: изменение между двумя чтениями будет замечено при следующей проверке.
+            version = get_catalog_versions((self.group,))[self.group]
+            # Версия None - кэш недоступен: строки перечитываются при каждой проверке.
+            if self.snapshot is None or version is None or version != self.version:
+                self.snapshot = ({obj.pk: obj for obj in self.model._default_manager.all()}, {})
+                self.version = version
+            self.checked_at = now
+        return self.snapshot
+
+    def all(self):
+        return list(self.load()[0].values())
+
+    def get(self, pk):
+        return self.load()[0].get(pk)
+
+    def get_by(self, field, value):
+        """Возвращает объект по значению уникального поля field или None."""
+        rows, indexes = self.load()
+        if field not in indexes:
+            indexes[field] = {getattr(obj, field): obj for obj in rows.values()}
+        return indexes[field].get(value)
+
+
+class ReferenceSerializerField(serializers.Field):
+    """
+    Вложенный объект справочника table, взятый из кэша по значению внешнего ключа, без JOIN.
+
+    Если имя поля есть в context['include'], вместо объекта выводится его id, а сам объект один раз
+    записывается в context['included'][группа справочника][id].
+    """
+
+    def __init__(self, table, serializer_class, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+        self.table = table
+        self.serializer_class = serializer_class
+        extend_schema_field(serializer_class)(self)
+
+    def bind(self, field_name, parent):
+        if self.source is None:
+            self.source = f'{field_name}_id'
+        super().bind(field_name, parent)
+
+    def to_representation(self, pk):
+        obj = self.table.get(pk)
+        if obj is None:
+            return None
+        if self.field_name not in self.context.get('include', ()):
+            return self.serializer_class(obj, context=self.context).data
+        included = self.context['included'].setdefault(self.table.group, {})
+        if pk not in included:
+            included[pk] = self.serializer_class(obj, context=self.context).data
+        return pk
+
+
+class ReferencePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Ссылка на строку справочника table по первичному ключу, проверяемая по кэшу без запроса к базе."""
+
+    def __init__(self, table, **kwargs):
+        super().__init__(**kwargs)
+        self.table = table
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            obj = self.table.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
+categories = ReferenceTable('product.Category', 'categories')
+colors = ReferenceTable('product.Color', 'colors')
+materials = ReferenceTable('product.Material', 'materials')
+product_types = ReferenceTable('product.ProductType', 'product_types')
+furniture_details = ReferenceTable('product.FurnitureDetails', 'furniture_details')
+collections = ReferenceTable('product.Collection', 'collections')
+delivery_types = ReferenceTable('orders.DeliveryType', 'delivery_types')
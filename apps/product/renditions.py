@@ -0,0 +1,164 @@
+"""
+Уменьшенные копии изображений товаров (renditions).
+
+Для каждого изображения FurniturePicture строятся копии шириной IMAGE_RENDITION_WIDTHS в форматах
+IMAGE_RENDITION_FORMATS, которые поддерживает установленный Pillow (AVIF - с pillow-avif-plugin).
+Имя копии содержит хэш содержимого исходного файла, поэтому одинаковые изображения обрабатываются
+и хранятся один раз, а адреса копий можно кэшировать без срока. Карта копий хранится в
+FurniturePicture.renditions: {поле: {'source': имя исходного файла, формат: {ширина: имя копии}}}.
+Если файл не удалось прочитать, для поля сохраняется {'source': имя файла, 'error': описание}: такой файл
+не обрабатывается повторно, пока поле не получит другой файл (или до запуска build_renditions --all).
+
+Копии строит команда build_renditions: она выбирает запросом outdated_pictures изображения, копии
+которых не построены или построены для других файлов, и обрабатывает их в пуле процессов. В production
+и dev_prod её каждую минуту запускает сервис scheduler, поэтому веб-процессы не тратят процессор
+на кодирование изображений, а копии появляются с задержкой до минуты; до этого отдаются исходные изображения.
+
+При IMAGE_RENDITION_WORKERS > 0 (локальный запуск) копии новых изображений дополнительно строятся сразу
+после сохранения в фоновых потоках процесса. Очередь потоков живёт в памяти и пропадает при перезапуске,
+а кодирование занимает процессор веб-воркера; пропавшие задачи исправляет следующий запуск build_renditions.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.fields.json import KT
+from PIL import Image, ImageOps
+
+from apps.product.catalog import bump_catalog_version
+from apps.product.models import FurniturePicture
+
+try:
+    import pillow_avif  # noqa: F401 - регистрирует формат AVIF в Pillow
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FIELDS = ('main_image', 'first_image', 'second_image', 'third_image')
+EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp', 'avif': 'avif'}
+# Форматы без прозрачности: изображение накладывается на белый фон.
+OPAQUE_FORMATS = ('jpeg',)
+
+executor = (
+    ThreadPoolExecutor(max_workers=settings.IMAGE_RENDITION_WORKERS, thread_name_prefix='renditions')
+    if settings.IMAGE_RENDITION_WORKERS
+    else None
+)
+
+
+def supported_formats():
+    Image.init()
+    return [format for format in settings.IMAGE_RENDITION_FORMATS if format.upper() in Image.SAVE]
+
+
+def get_storage():
+    return FurniturePicture._meta.get_field(RENDITION_FIELDS[0]).storage
+
+
+def encode(image, width, format):
+    """Копия изображения шириной width в формате format."""
+    copy = image.copy()
+    copy.thumbnail((width, image.height), Image.LANCZOS)
+    if format in OPAQUE_FORMATS and copy.mode != 'RGB':
+        background = Image.new('RGB', copy.size, 'white')
+        copy = copy.convert('RGBA')
+        background.paste(copy, mask=copy.getchannel('A'))
+        copy = background
+    output = BytesIO()
+    copy.save(output, format=format.upper(), quality=settings.IMAGE_RENDITION_QUALITY)
+    return output.getvalue()
+
+
+def render_file(name):
+    """Строит копии файла name и возвращает {формат: {ширина: имя копии}}."""
+    storage = get_storage()
+    with storage.open(name, 'rb') as file:
+        content = file.read()
+    digest = hashlib.sha256(content).hexdigest()
+    image = ImageOps.exif_transpose(Image.open(BytesIO(content)))
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    # Копии не шире исходного изображения: большие ширины заменяются исходной.
+    widths = sorted({min(width, image.width) for width in settings.IMAGE_RENDITION_WIDTHS})
+    renditions = {}
+    for format in supported_formats():
+        renditions[format] = {}
+        for width in widths:
+            target = f'renditions/{digest[:2]}/{digest}_{width}.{EXTENSIONS[format]}'
+            if not storage.exists(target):
+                saved = storage.save(target, ContentFile(encode(image, width, format)))
+                # Тот же файл одновременно сохранил другой процесс, хранилище выбрало новое имя.
+                if saved != target:
+                    storage.delete(saved)
+            renditions[format][str(width)] = target
+    return renditions
+
+
+def render_sources(sources):
+    """Строит копии изображений {поле: имя файла} и возвращает карту копий для FurniturePicture.renditions."""
+    renditions = {}
+    for field, name in sources.items():
+        if not name:
+            continue
+        try:
+            renditions[field] = {'source': name, **render_file(name)}
+        except (OSError, Image.DecompressionBombError) as error:
+            logger.warning('Не удалось построить копии изображения %s: %s', name, error)
+            renditions[field] = {'source': name, 'error': str(error)}
+    return renditions
+
+
+def get_sources(picture):
+    return {field: getattr(picture, field).name for field in RENDITION_FIELDS}
+
+
+def is_outdated(picture):
+    """True, если копии построены не для текущих файлов изображений."""
+    renditions = picture.renditions or {}
+    return any(
+        name and (renditions.get(field) or {}).get('source') != name for field, name in get_sources(picture).items()
+    )
+
+
+def outdated_pictures():
+    """Изображения, для которых is_outdated истинно, - условием SQL по ключам source карты копий."""
+    sources = {f'{field}_rendered': KT(f'renditions__{field}__source') for field in RENDITION_FIELDS}
+    condition = Q()
+    for field in RENDITION_FIELDS:
+        rendered = f'{field}_rendered'
+        condition |= ~Q(**{field: ''}) & (Q(**{f'{rendered}__isnull': True}) | ~Q(**{rendered: F(field)}))
+    return FurniturePicture.objects.annotate(**sources).filter(condition)
+
+
+def save_renditions(pk, sources, renditions):
+    """Сохраняет карту копий, если файлы изображений не изменились, пока она строилась."""
+    updated = FurniturePicture.objects.filter(pk=pk, **sources).update(renditions=renditions)
+    if updated:
+        bump_catalog_version('products')
+    return updated
+
+
+def update_renditions(pk):
+    """Строит и сохраняет копии изображений FurniturePicture с первичным ключом pk."""
+    try:
+        picture = FurniturePicture.objects.filter(pk=pk).first()
+        if picture is not None:
+            sources = get_sources(picture)
+            save_renditions(pk, sources, render_sources(sources))
+    except Exception:
+        logger.exception('Не удалось обновить копии изображений %s', pk)
+    finally:
+        # Поток пула не обслуживает запросы, поэтому подключения закрываются явно.
+        connections.close_all()
+
+
+def schedule_renditions(picture):
+    """Ставит построение копий изображений в очередь фоновых потоков; без потоков копии построит build_renditions."""
+    if executor is not None:
+        executor.submit(update_renditions, picture.pk)
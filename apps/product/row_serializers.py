@@ -0,0 +1,140 @@
+"""
+Быстрая сериализация списков товаров.
+
+ShortProductSerializer и ProductSerializer для каждого товара создают объект модели и обходят поля и
+методы DRF, что занимает основное время ответа списков. RowSerializer один раз на запрос разбирает поля
+сериализатора в функции над строками values_list() и строит из строк словари того же вида, что и
+сериализатор DRF. Сравнение скорости и результата обоих способов - команда benchmark_product_serializers.
+"""
+import operator
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from apps.product.reference import ReferenceSerializerField, product_types
+from common.profiling import timed
+
+# Поля, значение которых из базы уже совпадает с представлением DRF.
+PLAIN_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+
+
+def is_relative_path(path):
+    """True, если urljoin(base_url, path) равен base_url + path."""
+    return ':' not in path and not path.startswith('.') and '/.' not in path
+
+
+class RowSerializer:
+    """
+    Представление строк выборки товаров полями serializer_class.
+
+    Поля модели, вложенные сериализаторы и поля справочников разбираются автоматически, для каждого
+    SerializerMethodField в method_columns указаны столбец и метод его преобразования (None - без изменений).
+    """
+
+    method_columns = {
+        'analyze_is_favorited': ('pk', 'is_favorited'),
+        'extract_discount': ('active_discount', None),
+        'calculate_total_price': ('effective_price', None),
+        'fetch_available_quantity': ('stock', None),
+        'fetch_product_type': ('product_type', 'product_type_name'),
+    }
+    # Столбцы, которые читает пагинация по ключу (см. common.pagination.ProductPagination).
+    key_columns = ('pk', 'name', 'effective_price')
+
+    def __init__(self, serializer_class, context):
+        self.serializer = serializer_class(context=context)
+        self.request = context.get('request')
+        self.columns = []
+        self.accessors = [(field.field_name, self.compile_field(field)) for field in self.serializer._readable_fields]
+
+    def get_rows(self, queryset):
+        """Выборка строк (именованных кортежей) со всеми столбцами сериализатора и ключа пагинации."""
+        columns = [*self.columns, *(column for column in self.key_columns if column not in self.columns)]
+        if 'search_rank' in queryset.query.annotations:
+            columns.append('search_rank')
+        return queryset.values_list(*columns, named=True)
+
+    @timed('serialize')
+    def to_representation(self, rows):
+        accessors = self.accessors
+        return [{name: accessor(row) for name, accessor in accessors} for row in rows]
+
+    @timed('serialize')
+    def represent(self, row):
+        """Представление одной строки, для потоковой выдачи."""
+        return {name: accessor(row) for name, accessor in self.accessors}
+
+    def column(self, name):
+        # Поле id и ключ пагинации pk - один столбец.
+        name = 'pk' if name == 'id' else name
+        if name not in self.columns:
+            self.columns.append(name)
+        return operator.itemgetter(self.columns.index(name))
+
+    def compile_field(self, field):
+        if isinstance(field, serializers.SerializerMethodField):
+            column, method_name = self.method_columns[field.method_name]
+            get = self.column(column)
+            if method_name is None:
+                return get
+            method = getattr(self, method_name)
+            return lambda row: method(get(row))
+        if isinstance(field, ReferenceSerializerField):
+            # Строк справочников мало, представление каждой строится один раз на запрос.
+            representations = {}
+
+            def represent(pk):
+                if pk not in representations:
+                    representations[pk] = field.to_representation(pk)
+                return representations[pk]
+
+            return self.nullable(self.column(field.source), represent)
+        if isinstance(field, serializers.BaseSerializer):
+            get_pk = self.column(field.source)
+            nested = [
+                (nested_field.field_name, self.compile_value(nested_field, f'{field.source}__{nested_field.source}'))
+                for nested_field in field._readable_fields
+            ]
+            return lambda row: None if get_pk(row) is None else {name: accessor(row) for name, accessor in nested}
+        return self.compile_value(field, field.source)
+
+    def compile_value(self, field, column):
+        get = self.column(column)
+        if isinstance(field, serializers.FileField):
+            file_url = self.file_url(field)
+            return lambda row: file_url(name) if (name := get(row)) else None
+        if type(field) in PLAIN_FIELDS:
+            return get
+        return self.nullable(get, field.to_representation)
+
+    @staticmethod
+    def nullable(get, to_representation):
+        return lambda row: None if (value := get(row)) is None else to_representation(value)
+
+    def file_url(self, field):
+        """Функция от имени файла, возвращающая то же, что FileField.to_representation."""
+        if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return str
+        storage = field.parent.Meta.model._meta.get_field(field.source).storage
+        url = storage.url
+        if isinstance(storage, FileSystemStorage) and storage.base_url.startswith('/'):
+            # Адрес файла - base_url и путь файла, абсолютный адрес base_url вычисляется один раз.
+            prefix = self.request.build_absolute_uri(storage.base_url) if self.request else storage.base_url
+            return (
+                lambda name: prefix + path
+                if is_relative_path(path := filepath_to_uri(name).lstrip('/'))
+                else url(name)
+            )
+        if self.request is None:
+            return url
+        return lambda name: self.request.build_absolute_uri(url(name))
+
+    def is_favorited(self, pk):
+        return pk in self.serializer.favorite_ids
+
+    @staticmethod
+    def product_type_name(pk):
+        product_type = product_types.get(pk)
+        return product_type.name if product_type else None
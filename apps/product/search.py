@@ -0,0 +1,174 @@
+"""
+Полнотекстовый и нечёткий поиск товаров.
+
+На PostgreSQL используется поле Product.search_vector (tsvector с конфигурацией russian), которое
+обновляется сигналами, и триграммный индекс по названию для устойчивости к опечаткам. На остальных СУБД
+(например, SQLite в тестах) тот же API обслуживает инвертированный индекс в памяти процесса.
+"""
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import Case, F, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Cast
+from rest_framework.filters import SearchFilter
+
+from apps.product.models import Collection, Product, ProductType
+from common.stemmer import tokenize
+
+SEARCH_CONFIG = 'russian'
+# Веса полей: A - название, B - бренд, коллекция и тип мебели, C - описание.
+FIELD_WEIGHTS = {'name': 'A', 'brand': 'B', 'collection__name': 'B', 'product_type__name': 'B', 'description': 'C'}
+# Значения весов как в ts_rank по умолчанию.
+RANK_WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+# Минимальная триграммная схожесть основ для нечёткого совпадения, как pg_trgm.similarity_threshold.
+TRIGRAM_THRESHOLD = 0.3
+
+
+def product_search_vector():
+    """Выражение tsvector товара для UPDATE без JOIN."""
+    collection = Subquery(Collection.objects.filter(pk=OuterRef('collection_id')).values('name')[:1])
+    product_type = Subquery(ProductType.objects.filter(pk=OuterRef('product_type_id')).values('name')[:1])
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('brand', collection, product_type, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+class PostgresSearchBackend:
+    """Поиск по tsvector и триграммам PostgreSQL."""
+
+    def update(self, queryset):
+        queryset.update(search_vector=product_search_vector())
+
+    def remove(self, product_id):
+        """Вектор хранится в строке товара и удаляется вместе с ней."""
+
+    def filter(self, queryset, text):
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.filter(Q(search_vector=query) | Q(name__trigram_word_similar=text))
+
+    def search(self, queryset, text):
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        # Приведение к double precision, чтобы значение из курсора пагинации точно совпадало с рангом в базе.
+        rank = Cast(SearchRank(F('search_vector'), query) + TrigramWordSimilarity(text, 'name'), FloatField())
+        return self.filter(queryset, text).annotate(search_rank=rank)
+
+
+def trigrams(word):
+    """Триграммы слова по правилам pg_trgm."""
+    padded = f'  {word} '
+    return {''.join(letters) for letters in zip(padded, padded[1:], padded[2:])}
+
+
+class InvertedIndex:
+    """Инвертированный индекс основ слов товаров с весами полей."""
+
+    def __init__(self, rows):
+        self.postings = defaultdict(dict)
+        for product_id, *values in rows:
+            for field, value in zip(FIELD_WEIGHTS, values):
+                weight = RANK_WEIGHTS[FIELD_WEIGHTS[field]]
+                for token in set(tokenize(value)):
+                    postings = self.postings[token]
+                    postings[product_id] = max(postings.get(product_id, 0), weight)
+        self.trigram_index = defaultdict(set)
+        self.token_trigrams = {}
+        for token in self.postings:
+            self.token_trigrams[token] = trigrams(token)
+            for trigram in self.token_trigrams[token]:
+                self.trigram_index[trigram].add(token)
+
+    def similar_tokens(self, token):
+        """Основы из индекса, похожие на token, со значением схожести."""
+        if token in self.postings:
+            return {token: 1.0}
+        query_trigrams = trigrams(token)
+        candidates = set().union(*(self.trigram_index.get(trigram, ()) for trigram in query_trigrams))
+        similar = {}
+        for candidate in candidates:
+            candidate_trigrams = self.token_trigrams[candidate]
+            score = len(query_trigrams & candidate_trigrams) / len(query_trigrams | candidate_trigrams)
+            if score >= TRIGRAM_THRESHOLD:
+                similar[candidate] = score
+        return similar
+
+    def search(self, text):
+        """Возвращает {id товара: ранг} для товаров, содержащих все слова запроса."""
+        scores = None
+        for token in set(tokenize(text)):
+            token_scores = {}
+            for similar, similarity in self.similar_tokens(token).items():
+                for product_id, weight in self.postings[similar].items():
+                    token_scores[product_id] = max(token_scores.get(product_id, 0), weight * similarity)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {pk: score + token_scores[pk] for pk, score in scores.items() if pk in token_scores}
+        return scores or {}
+
+
+class InvertedIndexSearchBackend:
+    """Поиск по инвертированному индексу в памяти процесса для СУБД без полнотекстового поиска."""
+
+    def __init__(self):
+        self.index = None
+
+    def get_index(self):
+        if self.index is None:
+            self.index = InvertedIndex(Product.objects.values_list('pk', *FIELD_WEIGHTS))
+        return self.index
+
+    def invalidate(self):
+        """Сбрасывает индекс: он будет построен заново при следующем поиске."""
+        self.index = None
+
+    def update(self, queryset):
+        self.invalidate()
+
+    def remove(self, product_id):
+        self.invalidate()
+
+    def filter(self, queryset, text):
+        return queryset.filter(pk__in=list(self.get_index().search(text)))
+
+    def search(self, queryset, text):
+        scores = self.get_index().search(text)
+        rank = Case(
+            *(When(pk=product_id, then=Value(score)) for product_id, score in scores.items()),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=list(scores)).annotate(search_rank=rank)
+
+
+postgres_backend = PostgresSearchBackend()
+inverted_index_backend = InvertedIndexSearchBackend()
+
+
+def get_search_backend(using='default'):
+    """Возвращает бэкенд поиска для СУБД подключения."""
+    if connections[using].vendor == 'postgresql':
+        return postgres_backend
+    return inverted_index_backend
+
+
+def update_search_index(queryset):
+    """Обновляет поисковый индекс для товаров queryset."""
+    get_search_backend(queryset.db).update(queryset)
+
+
+def remove_from_search_index(product_id, using='default'):
+    """Убирает удалённый товар из поискового индекса."""
+    get_search_backend(using).remove(product_id)
+
+
+class ProductSearchFilter(SearchFilter):
+    """Поиск товаров по названию, бренду, описанию, коллекции и типу с сортировкой по релевантности."""
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return get_search_backend(queryset.db).search(queryset, text)
@@ -1,8 +1,10 @@
 """Сериализаторы для приложения product."""
 from drf_extra_fields.fields import Base64ImageField
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
-from apps.product.cart import CartAndFavorites
+from apps.product.cart import extract_favorite_ids
 from apps.product.models import (
     Category,
     Collection,
@@ -13,6 +15,15 @@ from apps.product.models import (
     Material,
     Product,
 )
+from apps.product.reference import (
+    ReferenceSerializerField,
+    categories,
+    collections,
+    colors,
+    furniture_details,
+    materials,
+    product_types,
+)
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -66,15 +77,64 @@ class CollectionSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+@extend_schema_field(OpenApiTypes.OBJECT)
+class RenditionsField(serializers.Field):
+    """
+    Уменьшенные копии изображений в виде srcset: {поле: {формат: 'адрес 320w, адрес 640w'}}.
+
+    Поля, копии которых не удалось построить, не выводятся.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, renditions):
+        request = self.context.get('request')
+        storage = FurniturePicture._meta.get_field('main_image').storage
+
+        def url(name):
+            return request.build_absolute_uri(storage.url(name)) if request else storage.url(name)
+
+        return {
+            field: {
+                format: ', '.join(f'{url(names[width])} {width}w' for width in sorted(names, key=int))
+                for format, names in formats.items()
+                if format != 'source'
+            }
+            for field, formats in renditions.items()
+            if 'error' not in formats
+        }
+
+
 class FurniturePictureSerializer(serializers.ModelSerializer):
     """Сериалайзер для отображения изображений товара."""
 
+    renditions = RenditionsField()
+
     class Meta:
         model = FurniturePicture
-        fields = ('main_image', 'first_image', 'second_image', 'third_image')
+        fields = ('main_image', 'first_image', 'second_image', 'third_image', 'renditions')
 
 
-class ShortProductSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Вывод только полей из context['fields'] (?fields=), остальные поля и методы не вычисляются.
+
+    Поле id выводится всегда: по нему проставляется избранное в ответах из общего кэша.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        if requested is None:
+            return fields
+        if unknown := requested - fields.keys():
+            raise serializers.ValidationError({'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}.'})
+        return {name: field for name, field in fields.items() if name in requested or name == 'id'}
+
+
+class ShortProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериалайзер для отображения товаров."""
 
     is_favorited = serializers.SerializerMethodField(method_name='analyze_is_favorited')
@@ -82,7 +142,7 @@ class ShortProductSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField(method_name='calculate_total_price')
     images = FurniturePictureSerializer()
     available_quantity = serializers.SerializerMethodField(method_name='fetch_available_quantity')
-    product_type = serializers.SlugRelatedField(slug_field='name', read_only=True)
+    product_type = serializers.SerializerMethodField(method_name='fetch_product_type')
 
     class Meta:
         model = Product
@@ -99,39 +159,47 @@ class ShortProductSerializer(serializers.ModelSerializer):
             'images',
         )
 
+    @property
+    def favorite_ids(self):
+        """Идентификаторы избранных товаров, загружаемые один раз на запрос и общие через контекст."""
+        context = self.context
+        if 'favorite_ids' not in context:
+            context['favorite_ids'] = extract_favorite_ids(context.get('request'))
+        return context['favorite_ids']
+
     def analyze_is_favorited(self, obj):
-        """Возвращает True, если товар добавлен в избранное для авторизированного пользователя."""
-        request = self.context.get('request')
-        if not request:
-            return False
-        if not request.user.is_authenticated:
-            cart_and_favorite_list = CartAndFavorites(request=request)
-            return cart_and_favorite_list.is_favorite(obj.id)
-        is_favorite = obj.favorites.filter(user=request.user).exists()
-        return is_favorite
+        """Возвращает True, если товар добавлен в избранное пользователя."""
+        return obj.id in self.favorite_ids
 
     def extract_discount(self, obj):
-        """Возвращает скидку на продукт."""
-        return obj.extract_discount()
+        """Возвращает действующую скидку на продукт."""
+        return obj.active_discount
 
     def calculate_total_price(self, obj):
-        """Возвращает рассчитанную итоговую цену товара с учётом скидки."""
-        return obj.calculate_total_price()
+        """Возвращает итоговую цену товара с учётом скидки."""
+        return obj.effective_price
 
     def fetch_available_quantity(self, obj):
         """Возвращает доступное для заказ количество товара на складе."""
+        if hasattr(obj, 'stock'):
+            return obj.stock
         return obj.storehouse.quantity
 
+    def fetch_product_type(self, obj) -> str:
+        """Возвращает название типа мебели из кэша справочника."""
+        product_type = product_types.get(obj.product_type_id)
+        return product_type.name if product_type else None
+
 
 class ProductSerializer(ShortProductSerializer):
     """Сериалайзер для модели Product."""
 
-    category = CategorySerializer()
-    color = ColorSerializer()
-    collection = CollectionSerializer()
-    material = MaterialSerializer()
-    legs_material = MaterialSerializer()
-    furniture_details = FurnitureDetailsSerializer()
+    category = ReferenceSerializerField(categories, CategorySerializer)
+    color = ReferenceSerializerField(colors, ColorSerializer)
+    collection = ReferenceSerializerField(collections, CollectionSerializer)
+    material = ReferenceSerializerField(materials, MaterialSerializer)
+    legs_material = ReferenceSerializerField(materials, MaterialSerializer)
+    furniture_details = ReferenceSerializerField(furniture_details, FurnitureDetailsSerializer)
 
     class Meta(ShortProductSerializer.Meta):
         fields = ShortProductSerializer.Meta.fields + (
@@ -169,3 +237,11 @@ class BrandSerializer(serializers.Serializer):
 
     class Meta:
         fields = ('brand',)
+
+
+class SuggestionSerializer(serializers.Serializer):
+    """Сериализатор подсказки строки поиска."""
+
+    type = serializers.ChoiceField(choices=('product', 'brand', 'collection', 'category'))
+    value = serializers.CharField(help_text='id товара, название бренда или slug коллекции/категории')
+    label = serializers.CharField()
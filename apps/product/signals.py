@@ -0,0 +1,210 @@
+"""Сигналы приложения product."""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.product.catalog import bump_catalog_version, favorites_group
+from apps.product.models import (
+    Category,
+    Collection,
+    Color,
+    Discount,
+    Favorite,
+    FurnitureDetails,
+    FurniturePicture,
+    Material,
+    Product,
+    ProductPopularity,
+    ProductType,
+    SimilarProduct,
+)
+from apps.product.renditions import is_outdated, schedule_renditions
+from apps.product.search import remove_from_search_index, update_search_index
+from apps.product.similarity import FEATURE_FIELDS, similarity_updates
+from apps.product.suggest import suggest_index
+
+
+def saves_features(update_fields):
+    """True, если сохранение с update_fields может изменить характеристики товара для похожих товаров."""
+    return update_fields is None or any(
+        Product._meta.get_field(name).attname in FEATURE_FIELDS for name in update_fields
+    )
+
+
+@receiver(pre_save, sender=Product)
+def remember_similarity_features(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Запоминает характеристики товара до сохранения, чтобы пересчитывать похожие только при их изменении."""
+    if raw or instance._state.adding or not saves_features(update_fields):
+        return
+    instance._similarity_features = sender.objects.filter(pk=instance.pk).values_list(*FEATURE_FIELDS).first()
+
+
+@receiver(post_save, sender=Product)
+def update_similar_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Ставит товар в очередь пересчёта похожих, если изменились его характеристики."""
+    if raw or not saves_features(update_fields):
+        return
+    previous = getattr(instance, '_similarity_features', None)
+    if not created and previous == tuple(getattr(instance, name) for name in FEATURE_FIELDS):
+        return
+    product_id = instance.pk
+    transaction.on_commit(lambda: similarity_updates.add([product_id]))
+
+
+@receiver(pre_delete, sender=Product)
+def update_similar_on_delete(sender, instance, **kwargs):
+    """Ставит в очередь пересчёта товары, в списках которых был удаляемый товар."""
+    dependents = list(SimilarProduct.objects.filter(similar=instance).values_list('product_id', flat=True))
+    if dependents:
+        transaction.on_commit(lambda: similarity_updates.add(dependents))
+
+
+@receiver(post_save, sender=Product)
+def update_search_on_save(sender, instance, raw=False, **kwargs):
+    """Обновляет поисковый индекс сохранённого товара."""
+    if raw:
+        return
+    update_search_index(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+def update_search_on_delete(sender, instance, using, **kwargs):
+    """Убирает удалённый товар из поискового индекса."""
+    remove_from_search_index(instance.pk, using=using)
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_save, sender=ProductType)
+def update_search_on_related_save(sender, instance, raw=False, **kwargs):
+    """Обновляет поисковый индекс товаров коллекции или типа мебели после изменения названия."""
+    if raw:
+        return
+    update_search_index(instance.products.all())
+
+
+@receiver(pre_delete, sender=Collection)
+@receiver(pre_delete, sender=ProductType)
+def update_search_on_related_delete(sender, instance, **kwargs):
+    """Обновляет поисковый индекс товаров удаляемой коллекции или типа мебели."""
+    product_ids = list(instance.products.values_list('pk', flat=True))
+    if product_ids:
+        transaction.on_commit(lambda: update_search_index(Product.objects.filter(pk__in=product_ids)))
+
+
+@receiver(post_save, sender=Product)
+def update_suggestions_on_save(sender, instance, raw=False, **kwargs):
+    """Обновляет подсказки поиска сохранённого товара."""
+    if raw:
+        return
+    transaction.on_commit(lambda: suggest_index.update_product(instance))
+
+
+@receiver(post_delete, sender=Product)
+def update_suggestions_on_delete(sender, instance, **kwargs):
+    """Убирает удалённый товар из подсказок поиска."""
+    product_id = instance.pk
+    transaction.on_commit(lambda: suggest_index.delete_product(product_id))
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_save, sender=Category)
+def update_group_suggestions_on_save(sender, instance, raw=False, **kwargs):
+    """Обновляет подсказку коллекции или категории."""
+    if raw:
+        return
+    kind = sender._meta.model_name
+    transaction.on_commit(lambda: suggest_index.update_group(kind, instance))
+
+
+@receiver(post_delete, sender=Collection)
+@receiver(post_delete, sender=Category)
+def update_group_suggestions_on_delete(sender, instance, **kwargs):
+    """Убирает удалённую коллекцию или категорию из подсказок."""
+    kind, pk = sender._meta.model_name, instance.pk
+    transaction.on_commit(lambda: suggest_index.delete_group(kind, pk))
+
+
+@receiver(post_save, sender=Discount)
+def update_discounts_on_save(sender, instance, raw=False, **kwargs):
+    """Пересчитывает цены товаров скидки после изменения её размера или периода."""
+    if raw:
+        return
+    Product.objects.filter(discounts=instance).update_discounts()
+
+
+@receiver(m2m_changed, sender=Discount.applied_products.through)
+def update_discounts_on_products_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Пересчитывает цены товаров, добавленных в скидку или убранных из неё."""
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Product.objects.filter(pk=instance.pk).update_discounts()
+    elif action in ('post_add', 'post_remove'):
+        Product.objects.filter(pk__in=pk_set).update_discounts()
+    elif action == 'pre_clear':
+        product_ids = list(instance.applied_products.values_list('pk', flat=True))
+        transaction.on_commit(lambda: Product.objects.filter(pk__in=product_ids).update_discounts())
+
+
+@receiver(pre_delete, sender=Discount)
+def update_discounts_on_delete(sender, instance, **kwargs):
+    """Пересчитывает цены товаров удаляемой скидки."""
+    product_ids = list(instance.applied_products.values_list('pk', flat=True))
+    transaction.on_commit(lambda: Product.objects.filter(pk__in=product_ids).update_discounts())
+
+
+@receiver(post_save, sender=Product)
+def update_popularity_category(sender, instance, raw=False, **kwargs):
+    """Переносит популярность товара в рейтинг его новой категории."""
+    if raw:
+        return
+    ProductPopularity.objects.filter(product=instance).exclude(category_id=instance.category_id).update(
+        category_id=instance.category_id
+    )
+
+
+CATALOG_GROUPS = {
+    Category: 'categories',
+    Color: 'colors',
+    Material: 'materials',
+    Collection: 'collections',
+    FurnitureDetails: 'furniture_details',
+    Discount: 'discounts',
+    Product: 'products',
+    ProductType: 'product_types',
+    FurniturePicture: 'products',
+}
+
+
+@receiver((post_save, post_delete), sender=Category)
+@receiver((post_save, post_delete), sender=Color)
+@receiver((post_save, post_delete), sender=Material)
+@receiver((post_save, post_delete), sender=Collection)
+@receiver((post_save, post_delete), sender=FurnitureDetails)
+@receiver((post_save, post_delete), sender=Discount)
+@receiver((post_save, post_delete), sender=Product)
+@receiver((post_save, post_delete), sender=ProductType)
+@receiver((post_save, post_delete), sender=FurniturePicture)
+def bump_catalog_on_change(sender, **kwargs):
+    """Увеличивает версию группы каталога изменённой модели."""
+    bump_catalog_version(CATALOG_GROUPS[sender])
+
+
+@receiver(m2m_changed, sender=Discount.applied_products.through)
+def bump_catalog_on_discount_products_change(sender, action, **kwargs):
+    """Увеличивает версию скидок при изменении состава товаров скидки."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_version('discounts')
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def bump_favorites_on_change(sender, instance, **kwargs):
+    """Увеличивает версию избранного пользователя."""
+    bump_catalog_version(favorites_group(instance.user_id))
+
+
+@receiver(post_save, sender=FurniturePicture)
+def update_renditions_on_save(sender, instance, raw=False, **kwargs):
+    """Строит уменьшенные копии новых изображений после фиксации транзакции."""
+    if raw or not is_outdated(instance):
+        return
+    transaction.on_commit(lambda: schedule_renditions(instance))
@@ -0,0 +1,212 @@
+"""
+Поиск похожих товаров по вектору характеристик.
+
+Товар описывается числовыми признаками (габариты, вес, цена) и категориальными (материалы, цвет,
+коллекция, особенности конструкции). Похожесть считается внутри категории как взвешенное расстояние:
+числовые признаки логарифмируются и стандартизуются, категориальные дают штраф за несовпадение.
+Списки ближайших соседей хранятся в SimilarProduct и пересчитываются командой build_similar_products
+(сервис scheduler запускает её раз в сутки) и инкрементально после изменения характеристик товара:
+изменения копятся в similarity_updates и пересчитываются фоновым потоком пачкой через
+SIMILAR_PRODUCTS_UPDATE_DELAY секунд. Очередь живёт в памяти процесса, пропавшие при перезапуске
+изменения исправляет суточный пересчёт.
+"""
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Min
+
+from apps.product.catalog import bump_catalog_version
+from apps.product.models import Category, Product, SimilarProduct
+
+NUMERIC_WEIGHTS = {'width': 1.0, 'height': 1.0, 'length': 1.0, 'weight': 0.5, 'price': 2.0}
+CATEGORICAL_WEIGHTS = {
+    'material_id': 1.0,
+    'legs_material_id': 0.5,
+    'color_id': 0.5,
+    'collection_id': 1.5,
+    'furniture_details_id': 1.0,
+}
+# Поля товара, от которых зависят его похожие товары.
+FEATURE_FIELDS = ('category_id', *NUMERIC_WEIGHTS, *CATEGORICAL_WEIGHTS)
+# Количество строк матрицы расстояний, обрабатываемых за один шаг.
+CHUNK_SIZE = 512
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryFeatures:
+    """Векторы характеристик всех товаров одной категории."""
+
+    def __init__(self, category_id):
+        rows = list(
+            Product.objects.filter(category_id=category_id)
+            .order_by('pk')
+            .values_list('pk', *NUMERIC_WEIGHTS, *CATEGORICAL_WEIGHTS)
+        )
+        numeric_end = 1 + len(NUMERIC_WEIGHTS)
+        self.category_id = category_id
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.positions = {product_id: position for position, product_id in enumerate(self.ids.tolist())}
+
+        numeric = np.array([row[1:numeric_end] for row in rows], dtype=np.float64).reshape(
+            len(rows), len(NUMERIC_WEIGHTS)
+        )
+        if rows:
+            numeric = np.log1p(numeric)
+            std = numeric.std(axis=0)
+            std[std == 0] = 1
+            numeric = (numeric - numeric.mean(axis=0)) / std * np.sqrt(list(NUMERIC_WEIGHTS.values()))
+        self.numeric = numeric.astype(np.float32)
+        self.norms = (self.numeric**2).sum(axis=1)
+
+        codes = [[-1 if value is None else value for value in row[numeric_end:]] for row in rows]
+        self.codes = np.array(codes, dtype=np.int64).reshape(len(rows), len(CATEGORICAL_WEIGHTS))
+        self.categorical_weights = np.array(list(CATEGORICAL_WEIGHTS.values()), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def distances(self, rows):
+        """Квадраты взвешенных расстояний от товаров с позициями rows до всех товаров категории."""
+        rows = np.asarray(rows)
+        distances = self.norms[rows, None] + self.norms[None, :] - 2 * self.numeric[rows] @ self.numeric.T
+        np.maximum(distances, 0, out=distances)
+        for column, weight in enumerate(self.categorical_weights):
+            distances += weight * (self.codes[rows, column, None] != self.codes[None, :, column])
+        distances[np.arange(len(rows)), rows] = np.inf
+        return distances
+
+    def neighbours(self, rows, count):
+        """Возвращает пары (id товара, [(id соседа, схожесть), ...]) по убыванию схожести."""
+        count = min(count, len(self) - 1)
+        for start in range(0, len(rows), CHUNK_SIZE):
+            end = start + CHUNK_SIZE
+            chunk = rows[start:end]
+            if count <= 0:
+                yield from ((self.ids[row].item(), []) for row in chunk)
+                continue
+            distances = self.distances(chunk)
+            nearest = np.argpartition(distances, count - 1, axis=1)[:, :count]
+            for index, row in enumerate(chunk):
+                candidates = nearest[index]
+                candidate_distances = distances[index, candidates]
+                order = np.lexsort((self.ids[candidates], candidate_distances))
+                yield self.ids[row].item(), [
+                    (self.ids[candidates[position]].item(), similarity(candidate_distances[position]))
+                    for position in order
+                ]
+
+
+def similarity(distance):
+    """Переводит квадрат расстояния в схожесть от 0 до 1."""
+    return float(1 / (1 + np.sqrt(distance)))
+
+
+def build_rows(features, rows, count):
+    """Создаёт объекты SimilarProduct для товаров с позициями rows."""
+    return [
+        SimilarProduct(product_id=product_id, similar_id=similar_id, rank=rank, score=score)
+        for product_id, neighbours in features.neighbours(rows, count)
+        for rank, (similar_id, score) in enumerate(neighbours, start=1)
+    ]
+
+
+def rebuild_similar_products(category_ids=None, count=None):
+    """Полностью пересчитывает похожие товары в указанных (по умолчанию - всех) категориях."""
+    count = count or settings.SIMILAR_PRODUCTS_COUNT
+    if category_ids is None:
+        category_ids = Category.objects.values_list('pk', flat=True)
+    total = 0
+    for category_id in category_ids:
+        features = CategoryFeatures(category_id)
+        similar_products = build_rows(features, range(len(features)), count)
+        with transaction.atomic():
+            SimilarProduct.objects.filter(product__category_id=category_id).delete()
+            SimilarProduct.objects.bulk_create(similar_products, batch_size=1000)
+            bump_catalog_version('similar')
+        total += len(similar_products)
+    return total
+
+
+def update_similar_products(product_ids, count=None):
+    """
+    Инкрементально обновляет похожие товары после изменения товаров product_ids.
+
+    Пересчитываются списки самих товаров, товаров, в чьих списках они уже были, и товаров, в чьи списки
+    они теперь попадают по схожести. Параметры стандартизации берутся по текущему составу категории.
+    """
+    count = count or settings.SIMILAR_PRODUCTS_COUNT
+    changed = set(product_ids)
+    dependents = set(SimilarProduct.objects.filter(similar_id__in=changed).values_list('product_id', flat=True))
+    category_ids = (
+        Product.objects.filter(pk__in=changed | dependents).order_by().values_list('category_id', flat=True).distinct()
+    )
+    for category_id in category_ids:
+        features = CategoryFeatures(category_id)
+        targets = {features.positions[pk] for pk in changed | dependents if pk in features.positions}
+        changed_rows = [features.positions[pk] for pk in changed if pk in features.positions]
+        if changed_rows and len(features) > 1:
+            targets.update(entering_rows(features, changed_rows, count))
+        targets = sorted(targets)
+        similar_products = build_rows(features, targets, count)
+        with transaction.atomic():
+            SimilarProduct.objects.filter(product_id__in=features.ids[targets].tolist()).delete()
+            SimilarProduct.objects.bulk_create(similar_products, batch_size=1000)
+            bump_catalog_version('similar')
+
+
+def entering_rows(features, changed_rows, count):
+    """Позиции товаров, в чьи списки похожих должны войти изменённые товары."""
+    stats = (
+        SimilarProduct.objects.filter(product__category_id=features.category_id)
+        .order_by()
+        .values('product_id')
+        .annotate(size=Count('pk'), min_score=Min('score'))
+        .values_list('product_id', 'size', 'min_score')
+    )
+    thresholds = np.full(len(features), -1.0)
+    for product_id, size, min_score in stats:
+        position = features.positions.get(product_id)
+        if position is not None and size >= min(count, len(features) - 1):
+            thresholds[position] = min_score
+    best = 1 / (1 + np.sqrt(features.distances(changed_rows).min(axis=0)))
+    return np.flatnonzero(best > thresholds).tolist()
+
+
+class SimilarityUpdates:
+    """Очередь товаров для отложенного инкрементального пересчёта похожих товаров."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Пересчёты выполняются по одному, чтобы не перезаписывать одни и те же списки одновременно.
+        self.update_lock = threading.Lock()
+        self.product_ids = set()
+        self.timer = None
+
+    def add(self, product_ids):
+        """Ставит товары в очередь; пересчёт начнётся через SIMILAR_PRODUCTS_UPDATE_DELAY секунд."""
+        with self.lock:
+            self.product_ids.update(product_ids)
+            if self.timer is None:
+                self.timer = threading.Timer(settings.SIMILAR_PRODUCTS_UPDATE_DELAY, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            product_ids, self.product_ids = self.product_ids, set()
+            self.timer = None
+        try:
+            with self.update_lock:
+                update_similar_products(product_ids)
+        except Exception:
+            logger.exception('Не удалось пересчитать похожие товары %s', sorted(product_ids))
+        finally:
+            # Поток не обслуживает запросы, поэтому подключения закрываются явно.
+            connections.close_all()
+
+
+similarity_updates = SimilarityUpdates()
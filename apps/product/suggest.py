@@ -0,0 +1,270 @@
+"""
+Подсказки для строки поиска (typeahead).
+
+Индекс хранится в памяти процесса: отсортированный список ключей (начала слов названий товаров,
+брендов, коллекций и категорий) ищется бинарным поиском по префиксу, без обращений к базе данных.
+Вес подсказки - текущая популярность товара из ProductPopularity + 1, для брендов, коллекций и
+категорий - сумма весов их товаров. Лучшие подсказки коротких префиксов кэшируются.
+
+Запросы читают неизменяемый срез индекса (SuggestSnapshot) без блокировок и без обращений к базе данных.
+Срезы строит один фоновый поток процесса: полностью - при первом запросе и когда срез старше
+SUGGEST_INDEX_MAX_AGE секунд, инкрементально - по изменениям товаров, коллекций и категорий из сигналов
+того процесса, где они произошли. Готовый срез подменяет текущий одним присваиванием. Пока первый срез
+строится, подсказки пусты, устаревший срез продолжает отвечать до замены.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.product.models import Category, Collection, Product, ProductPopularity
+from apps.product.popularity import current_popularity
+
+logger = logging.getLogger(__name__)
+
+SUGGESTIONS_LIMIT = 10
+# Для префиксов не длиннее этого лучшие подсказки кэшируются, длинные префиксы покрывают мало ключей.
+CACHED_PREFIX_LENGTH = 3
+
+
+def normalize(text):
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+def word_suffixes(label):
+    """Ключи подсказки: нормализованная строка с начала каждого слова."""
+    words = normalize(label).split(' ')
+    return {' '.join(words[index:]) for index in range(len(words)) if words[index]}
+
+
+class SuggestSnapshot:
+    """
+    Срез префиксного индекса подсказок. Подсказка задаётся парой (тип, id) и хранит значение и подпись.
+
+    Срез изменяется только фоновым потоком до публикации; опубликованный срез запросы только читают,
+    кэш лучших подсказок top дополняется ими значениями, которые определяются содержимым среза.
+    """
+
+    def __init__(self, source=None):
+        """Пустой срез или копия среза source для инкрементальных изменений."""
+        if source is None:
+            self.built_at = time.monotonic()
+            self.keys, self.entries, self.products, self.top = [], {}, {}, {}
+            self.weights, self.sizes = defaultdict(float), defaultdict(int)
+        else:
+            self.built_at = source.built_at
+            self.keys = list(source.keys)
+            self.entries = dict(source.entries)
+            self.products = dict(source.products)
+            self.top = dict(source.top)
+            self.weights, self.sizes = source.weights.copy(), source.sizes.copy()
+
+    @classmethod
+    def build(cls):
+        """Строит срез по всем товарам, коллекциям и категориям."""
+        snapshot = cls()
+        now = timezone.now()
+        products = Product.objects.annotate(score=Coalesce('popularity__score', Value(0.0))).values_list(
+            'pk', 'name', 'brand', 'collection_id', 'category_id', 'score'
+        )
+        for pk, slug, name in Collection.objects.values_list('pk', 'slug', 'name'):
+            snapshot.add_entry(('collection', pk), slug, name)
+        for pk, slug, name in Category.objects.values_list('pk', 'slug', 'name'):
+            snapshot.add_entry(('category', pk), slug, name)
+        for pk, name, brand, collection_id, category_id, score in products:
+            snapshot.add_product(pk, name, brand, collection_id, category_id, current_popularity(score, now))
+        return snapshot
+
+    def suggest(self, text, limit=SUGGESTIONS_LIMIT):
+        """Возвращает подсказки для начала слова text по убыванию популярности."""
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        if len(prefix) > CACHED_PREFIX_LENGTH:
+            entries = self.best_entries(prefix)
+        else:
+            entries = self.top.get(prefix)
+            if entries is None:
+                entries = self.top[prefix] = self.best_entries(prefix)
+        return [
+            {'type': entry[0], 'value': self.entries[entry][0], 'label': self.entries[entry][1]}
+            for entry in entries[:limit]
+        ]
+
+    def best_entries(self, prefix):
+        keys = self.keys
+        candidates = set()
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            candidates.add(keys[position][1])
+            position += 1
+        return heapq.nsmallest(
+            SUGGESTIONS_LIMIT, candidates, key=lambda entry: (-self.weights[entry], self.entries[entry][1], entry)
+        )
+
+    def invalidate(self, entry):
+        """Сбрасывает кэш лучших подсказок для префиксов ключей entry."""
+        for key in word_suffixes(self.entries[entry][1]):
+            for length in range(1, CACHED_PREFIX_LENGTH + 1):
+                self.top.pop(key[:length], None)
+
+    def add_entry(self, entry, value, label):
+        if entry in self.entries:
+            self.remove_keys(entry)
+        self.entries[entry] = (value, label)
+        for key in word_suffixes(label):
+            insort(self.keys, (key, entry))
+        self.invalidate(entry)
+
+    def remove_entry(self, entry):
+        if entry in self.entries:
+            self.remove_keys(entry)
+            del self.entries[entry]
+            self.weights.pop(entry, None)
+            self.sizes.pop(entry, None)
+
+    def remove_keys(self, entry):
+        self.invalidate(entry)
+        for key in word_suffixes(self.entries[entry][1]):
+            position = bisect_left(self.keys, (key, entry))
+            if position < len(self.keys) and self.keys[position] == (key, entry):
+                del self.keys[position]
+
+    def add_product(self, pk, name, brand, collection_id, category_id, popularity):
+        weight = popularity + 1
+        self.add_entry(('product', pk), pk, name)
+        self.weights['product', pk] = weight
+        if brand and ('brand', brand) not in self.entries:
+            self.add_entry(('brand', brand), brand, brand)
+        groups = [
+            entry
+            for entry in (('brand', brand), ('collection', collection_id), ('category', category_id))
+            if entry in self.entries
+        ]
+        for entry in groups:
+            self.weights[entry] += weight
+            self.sizes[entry] += 1
+            self.invalidate(entry)
+        self.products[pk] = (groups, weight)
+
+    def remove_product(self, pk):
+        if pk not in self.products:
+            return
+        groups, weight = self.products.pop(pk)
+        self.remove_entry(('product', pk))
+        for entry in groups:
+            if entry not in self.entries:
+                continue
+            self.weights[entry] -= weight
+            self.sizes[entry] -= 1
+            self.invalidate(entry)
+            if entry[0] == 'brand' and not self.sizes[entry]:
+                self.remove_entry(entry)
+
+    def apply(self, changes):
+        """Применяет изменения из сигналов; изменение, уже учтённое в срезе, применяется повторно без вреда."""
+        scores = dict(
+            ProductPopularity.objects.filter(
+                product_id__in=[change[1] for change in changes if change[0] == 'product']
+            ).values_list('product_id', 'score')
+        )
+        now = timezone.now()
+        for kind, pk, *values in changes:
+            if kind == 'product':
+                self.remove_product(pk)
+                self.add_product(pk, *values, current_popularity(scores.get(pk, 0), now))
+            elif kind == 'delete_product':
+                self.remove_product(pk)
+            elif kind == 'delete_group':
+                self.remove_entry((values[0], pk))
+            else:
+                self.add_entry((kind, pk), *values)
+
+
+class SuggestIndex:
+    """
+    Текущий срез подсказок и фоновый поток, который строит следующие срезы.
+
+    Изменения из сигналов копятся в очереди и применяются потоком пачкой к копии среза, поэтому
+    частые изменения не копируют индекс на каждое из них.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.changes = []
+        self.rebuild_requested = False
+        self.worker = None
+
+    def suggest(self, text, limit=SUGGESTIONS_LIMIT):
+        """Подсказки из текущего среза; пустой или устаревший срез перестраивается в фоне."""
+        snapshot = self.snapshot
+        if snapshot is None or time.monotonic() - snapshot.built_at > settings.SUGGEST_INDEX_MAX_AGE:
+            self.schedule(rebuild=True)
+        if snapshot is None:
+            return []
+        return snapshot.suggest(text, limit)
+
+    def schedule(self, change=None, rebuild=False):
+        """Добавляет изменение или полное перестроение в очередь и запускает фоновый поток."""
+        with self.lock:
+            if change is not None:
+                # До первого среза изменения не нужны: его построение прочитает их из базы.
+                if self.snapshot is None and self.worker is None:
+                    return
+                self.changes.append(change)
+            self.rebuild_requested = self.rebuild_requested or rebuild
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name='suggest-index', daemon=True)
+                self.worker.start()
+
+    def run(self):
+        try:
+            while True:
+                with self.lock:
+                    changes, self.changes = self.changes, []
+                    rebuild, self.rebuild_requested = self.rebuild_requested, False
+                    if not changes and not rebuild:
+                        self.worker = None
+                        return
+                if rebuild or self.snapshot is None:
+                    snapshot = SuggestSnapshot.build()
+                else:
+                    snapshot = SuggestSnapshot(self.snapshot)
+                # Изменения, зафиксированные до чтения базы при перестроении, применяются повторно:
+                # порядок изменений сохраняется, поэтому срез не откатывается к старым значениям.
+                if changes:
+                    snapshot.apply(changes)
+                self.snapshot = snapshot
+        except Exception:
+            logger.exception('Не удалось обновить подсказки поиска')
+            with self.lock:
+                self.worker = None
+        finally:
+            # Поток не обслуживает запросы, поэтому подключения закрываются явно.
+            connections.close_all()
+
+    def update_product(self, product):
+        """Обновляет подсказки товара после сохранения."""
+        self.schedule(('product', product.pk, product.name, product.brand, product.collection_id, product.category_id))
+
+    def delete_product(self, pk):
+        self.schedule(('delete_product', pk))
+
+    def update_group(self, kind, instance):
+        """Обновляет подсказку коллекции или категории после сохранения."""
+        self.schedule((kind, instance.pk, instance.slug, instance.name))
+
+    def delete_group(self, kind, pk):
+        self.schedule(('delete_group', pk, kind))
+
+
+suggest_index = SuggestIndex()
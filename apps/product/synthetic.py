@@ -0,0 +1,339 @@
+"""
+Синтетические данные для нагрузочных тестов.
+
+Новые товары копируют характеристики товаров сида (data/*.csv, загруженного import_catalog, или
+data/db_dump.json) с небольшим разбросом цены и размеров. Остатки на складе, количество товаров в заказе
+и размеры скидок берутся из распределений сида. Пользователи, товары, избранное, корзины, отзывы и
+заказы создаются bulk_create пачками в пуле процессов.
+
+Данные воспроизводимы: первичные ключи новых строк идут подряд после существующих, а каждая пачка
+генерируется своим генератором случайных чисел, зависящим только от seed и номера первой строки пачки.
+Поэтому на одной и той же исходной базе один и тот же seed даёт те же данные при любом числе процессов;
+от дня запуска зависят только даты.
+"""
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections, models, transaction
+from django.utils import timezone
+
+from apps.orders.models import Delivery, DeliveryType, Order, OrderProduct, Storehouse
+from apps.product.catalog import PRODUCT_GROUPS, PRODUCT_STATE_GROUPS, bump_catalog_version
+from apps.product.models import CartItem, CartModel, Collection, Color, Discount, Favorite, Product
+from apps.product.search import update_search_index
+from apps.reviews.models import Rating, Review
+from apps.users.models import User
+
+TEMPLATE_FIELDS = (
+    'name',
+    'product_type_id',
+    'width',
+    'height',
+    'length',
+    'weight',
+    'images_id',
+    'material_id',
+    'legs_material_id',
+    'furniture_details_id',
+    'fast_delivery',
+    'country',
+    'brand',
+    'warranty',
+    'price',
+    'description',
+    'category_id',
+    'collection_id',
+)
+RATING_WEIGHTS = (1, 1, 2, 4, 6)
+FEEDBACK = (None, 'Отличный товар', 'Соответствует описанию', 'Быстрая доставка', 'Ожидал большего')
+# Доля пользователей с корзиной.
+CART_SHARE = 0.5
+# Заказы распределяются по этому числу последних дней.
+ORDER_DAYS = 365
+
+# Общие данные пачек, передаваемые каждому процессу пула один раз.
+state = {}
+
+
+def init_worker(shared):
+    django.setup()
+    state.update(shared)
+
+
+def get_random(kind, start):
+    """Генератор случайных чисел пачки kind, начинающейся со строки start."""
+    return random.Random(f'{state["seed"]}:{kind}:{start}')
+
+
+def pick(rng, items):
+    """Случайный элемент items: начало списка выбирается чаще, как популярные товары."""
+    return items[int(len(items) * rng.random() ** 2)]
+
+
+def sample(rng, items, count):
+    """Не больше count разных элементов items, выбранных через pick."""
+    count = min(count, len(items))
+    result = {}
+    while len(result) < count:
+        item = pick(rng, items)
+        result[item] = None
+    return list(result)
+
+
+def around(rng, mean):
+    """Случайное целое от 0 до 2 * mean со средним mean."""
+    return rng.randint(0, round(2 * mean))
+
+
+def create_users(start, count):
+    rng = get_random('users', start)
+    users = [
+        User(
+            pk=pk,
+            email=f'synthetic{pk}@example.com',
+            password=state['password'],
+            first_name=rng.choice(('Анна', 'Иван', 'Мария', 'Олег', 'Елена', 'Пётр')),
+            date_joined=state['now'] - timedelta(days=rng.randint(0, 730)),
+        )
+        for pk in range(start, start + count)
+    ]
+    return len(User.objects.bulk_create(users))
+
+
+def create_products(start, count):
+    """Товары с первичными ключами от start и их остатки на складе."""
+    rng = get_random('products', start)
+    products, stock = [], []
+    for pk in range(start, start + count):
+        values = dict(rng.choice(state['templates']))
+        price = (values['price'] * Decimal(rng.randint(80, 125)) / 100).quantize(Decimal('0.01'))
+        for field in ('width', 'height', 'length'):
+            values[field] = max(1, min(15000, round(values[field] * rng.uniform(0.9, 1.1))))
+        values.update(
+            price=price,
+            effective_price=price,
+            color_id=rng.choice(state['colors']),
+            collection_id=rng.choice(state['collections']) if values['collection_id'] else None,
+            fast_delivery=rng.random() < state['fast_delivery_share'],
+        )
+        products.append(Product(pk=pk, article=state['article_start'] + pk - state['product_start'], **values))
+        stock.append(Storehouse(product_id=pk, quantity=rng.choice(state['stock'])))
+    with transaction.atomic():
+        Product.objects.bulk_create(products)
+        Storehouse.objects.bulk_create(stock)
+    return len(products)
+
+
+def create_user_data(start, count):
+    """Избранное, корзины и отзывы пользователей с первичными ключами от start."""
+    rng = get_random('user_data', start)
+    favorites, carts, items, reviews = [], [], [], []
+    for user_id in range(start, start + count):
+        for product_id in sample(rng, state['products'], around(rng, state['favorites'])):
+            favorites.append(Favorite(user_id=user_id, product_id=product_id))
+        if rng.random() < CART_SHARE:
+            cart_id = state['cart_start'] + user_id - state['user_start']
+            carts.append(CartModel(pk=cart_id, user_id=user_id))
+            for product_id in sample(rng, state['products'], max(1, around(rng, state['cart_items']))):
+                items.append(
+                    CartItem(cart_id=cart_id, product_id=product_id, quantity=rng.choice(state['quantities']))
+                )
+        for product_id in sample(rng, state['products'], around(rng, state['reviews'])):
+            reviews.append(
+                Review(
+                    user_id=user_id,
+                    product_id=product_id,
+                    rating=rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0],
+                    feedback=rng.choice(FEEDBACK),
+                )
+            )
+    with transaction.atomic():
+        Favorite.objects.bulk_create(favorites)
+        CartModel.objects.bulk_create(carts)
+        CartItem.objects.bulk_create(items)
+        Review.objects.bulk_create(reviews)
+    return len(favorites) + len(carts) + len(items) + len(reviews)
+
+
+def create_orders(start, count):
+    """Заказы с первичными ключами от start, их доставки и товары."""
+    rng = get_random('orders', start)
+    deliveries, orders, lines = [], [], []
+    order_products, created = {}, {}
+    for pk in range(start, start + count):
+        delivery_id = state['delivery_start'] + pk - state['order_start']
+        created[pk] = state['now'] - timedelta(seconds=rng.randint(0, ORDER_DAYS * 24 * 60 * 60))
+        datetime_from = created[pk] + timedelta(days=rng.randint(1, 30), hours=rng.randint(9, 18))
+        deliveries.append(
+            Delivery(
+                pk=delivery_id,
+                address=f'ул. Тестовая, д. {rng.randint(1, 200)}, кв. {rng.randint(1, 500)}',
+                type_delivery_id=rng.choice(state['delivery_types']) if state['delivery_types'] else None,
+                datetime_from=datetime_from,
+                datetime_to=datetime_from + timedelta(hours=rng.choice((2, 4))),
+                elevator=rng.random() < 0.5,
+            )
+        )
+        orders.append(
+            Order(pk=pk, user_id=rng.choice(state['users']), delivery_id=delivery_id, paid=rng.random() < 0.7)
+        )
+        order_products[pk] = sample(rng, state['products'], max(1, rng.choice(state['order_sizes'])))
+    prices = dict(
+        Product.objects.filter(pk__in={pk for ids in order_products.values() for pk in ids}).values_list(
+            'pk', 'effective_price'
+        )
+    )
+    for order in orders:
+        order.total_cost = 0
+        for product_id in order_products[order.pk]:
+            quantity = rng.choice(state['quantities'])
+            cost = prices[product_id] * quantity
+            lines.append(
+                OrderProduct(
+                    order_id=order.pk, product_id=product_id, price=prices[product_id], quantity=quantity, cost=cost
+                )
+            )
+            order.total_cost += cost
+    with transaction.atomic():
+        Delivery.objects.bulk_create(deliveries)
+        Order.objects.bulk_create(orders)
+        # bulk_create заполняет created текущим временем (auto_now_add), поэтому даты записываются отдельно.
+        for order in orders:
+            order.created = order.updated = created[order.pk]
+        Order.objects.bulk_update(orders, ('created', 'updated'))
+        OrderProduct.objects.bulk_create(lines)
+    return len(orders)
+
+
+def next_pk(model):
+    return (model.objects.aggregate(value=models.Max('pk'))['value'] or 0) + 1
+
+
+def values_or(queryset, default):
+    """Список значений queryset, а если сид пуст - default."""
+    return list(queryset) or list(default)
+
+
+class SyntheticData:
+    """Генерирует данные пачками по batch_size строк в workers процессах, при workers=0 - в текущем процессе."""
+
+    def __init__(self, seed, stdout, batch_size=5000, workers=None, password='synthetic'):
+        self.seed = seed
+        self.stdout = stdout
+        self.batch_size = batch_size
+        self.workers = workers
+        self.password = password
+
+    def run(self, users, products, orders, discounts, favorites, cart_items, reviews):
+        """Создаёт данные и возвращает {модель: количество новых строк}."""
+        templates = list(Product.objects.order_by('pk').values(*TEMPLATE_FIELDS))
+        if not templates:
+            raise ValueError('Нет товаров сида: загрузите data/ командой import_catalog или loaddata.')
+        before = {model: model.objects.count() for model in self.models}
+        shared = {
+            'seed': self.seed,
+            'now': timezone.now(),
+            'password': make_password(self.password),
+            'templates': templates,
+            'colors': list(Color.objects.order_by('pk').values_list('pk', flat=True)),
+            'collections': values_or(Collection.objects.order_by('pk').values_list('pk', flat=True), [None]),
+            'delivery_types': list(DeliveryType.objects.order_by('pk').values_list('pk', flat=True)),
+            'fast_delivery_share': sum(template['fast_delivery'] for template in templates) / len(templates),
+            'stock': values_or(Storehouse.objects.order_by('pk').values_list('quantity', flat=True), range(51)),
+            'quantities': values_or(OrderProduct.objects.order_by('pk').values_list('quantity', flat=True), [1]),
+            'order_sizes': values_or(
+                Order.objects.order_by('pk')
+                .annotate(size=models.Count('order_products'))
+                .values_list('size', flat=True),
+                [1, 2, 3],
+            ),
+            'favorites': favorites,
+            'cart_items': cart_items,
+            'reviews': reviews,
+            'user_start': next_pk(User),
+            'product_start': next_pk(Product),
+            'article_start': (Product.objects.aggregate(value=models.Max('article'))['value'] or 0) + 1,
+            'cart_start': next_pk(CartModel),
+            'order_start': next_pk(Order),
+            'delivery_start': next_pk(Delivery),
+        }
+        self.run_batches(create_users, shared['user_start'], users, shared)
+        self.run_batches(create_products, shared['product_start'], products, shared)
+        shared['products'] = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        shared['users'] = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        self.run_batches(create_user_data, shared['user_start'], users, shared)
+        # Заказы оцениваются по effective_price, поэтому скидки создаются и применяются до них.
+        self.create_discounts(discounts, shared['products'])
+        if shared['users']:
+            self.run_batches(create_orders, shared['order_start'], orders, shared)
+        self.finish(shared['product_start'])
+        return {model: model.objects.count() - count for model, count in before.items()}
+
+    @property
+    def models(self):
+        return (User, Product, Storehouse, Favorite, CartModel, CartItem, Review, Order, OrderProduct, Discount)
+
+    def run_batches(self, function, start, total, shared):
+        """Вызывает function(начало пачки, размер пачки) для строк от start до start + total в пуле процессов."""
+        if not total:
+            return
+        starts = range(start, start + total, self.batch_size)
+        counts = [min(self.batch_size, start + total - batch) for batch in starts]
+        if self.workers == 0:
+            state.update(shared)
+            created = sum(map(function, starts, counts))
+        else:
+            # Дочерние процессы не должны получить открытые подключения родителя.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=self.workers, initializer=init_worker, initargs=(shared,)
+            ) as executor:
+                created = sum(executor.map(function, starts, counts))
+        self.stdout.write(f'{function.__name__}: {created}')
+
+    def create_discounts(self, count, products):
+        """Скидки с пересекающимися периодами вокруг текущей даты на случайные наборы товаров и цены с их учётом."""
+        rng = random.Random(f'{self.seed}:discounts')
+        sizes = values_or(Discount.objects.order_by('pk').values_list('discount', flat=True), (5, 10, 15, 20, 30))
+        today = timezone.localdate()
+        start = next_pk(Discount)
+        discounts, links = [], []
+        for pk in range(start, start + count):
+            created_at = today + timedelta(days=rng.randint(-90, 30))
+            discounts.append(
+                Discount(
+                    pk=pk,
+                    discount=rng.choice(sizes),
+                    discount_created_at=created_at,
+                    discount_end_at=created_at + timedelta(days=rng.randint(7, 90)),
+                )
+            )
+            for product_id in sample(rng, products, rng.randint(10, 500)):
+                links.append(Discount.applied_products.through(discount_id=pk, product_id=product_id))
+        with transaction.atomic():
+            Discount.objects.bulk_create(discounts)
+            Discount.applied_products.through.objects.bulk_create(links, batch_size=self.batch_size)
+            Product.objects.all().update_discounts()
+
+    def finish(self, product_start):
+        """Пересчитывает данные, которые при сохранении через ORM обновляют save() и сигналы."""
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), self.models + (Delivery,)):
+                    cursor.execute(sql)
+            update_search_index(Product.objects.filter(pk__gte=product_start))
+            # Как в Review.save(): средняя оценка округляется вниз.
+            ratings = Review.objects.order_by().values('product').annotate(average=models.Avg('rating'))
+            Rating.objects.bulk_create(
+                (Rating(product_id=row['product'], average_rating=int(row['average'])) for row in ratings.iterator()),
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=('product',),
+                update_fields=('average_rating',),
+            )
+            bump_catalog_version(*PRODUCT_GROUPS, *PRODUCT_STATE_GROUPS)
@@ -1,12 +1,19 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.http import Http404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action, api_view
-from rest_framework.filters import SearchFilter
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from apps.product.catalog import PRODUCT_GROUPS, CatalogCacheMixin, catalog_cache
+from apps.product.facets import count_facets
 from apps.product.filters import ProductsFilter
 from apps.product.models import Category, Collection, Color, Discount, FurnitureDetails, Material, Product
+from apps.product.openapi import product_fields, suggest
+from apps.product.reference import categories
+from apps.product.row_serializers import RowSerializer
+from apps.product.search import ProductSearchFilter
 from apps.product.serializers import (
     BrandSerializer,
     CategorySerializer,
@@ -19,114 +26,233 @@ from apps.product.serializers import (
     ProductSerializer,
     ShortProductSerializer,
 )
+from apps.product.suggest import SUGGESTIONS_LIMIT, suggest_index
+from common.pagination import ProductPagination
+from common.streaming import StreamingListMixin
 
 
-class CategoryViewSet(ReadOnlyModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет для категорий товаров."""
 
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    catalog_groups = ('categories',)
     lookup_field = 'slug'
 
 
-class MaterialViewSet(ReadOnlyModelViewSet):
+class MaterialViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет для материалов товаров."""
 
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
+    catalog_groups = ('materials',)
 
 
-class DiscountViewSet(ReadOnlyModelViewSet):
+class DiscountViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет для скидок товаров."""
 
     queryset = Discount.objects.all().prefetch_related('applied_products')
     serializer_class = DiscountSerializer
+    catalog_groups = ('discounts',)
 
 
-class ColorViewSet(ReadOnlyModelViewSet):
+class ColorViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет для цветов товаров."""
 
     queryset = Color.objects.all()
     serializer_class = ColorSerializer
+    catalog_groups = ('colors',)
 
 
-class FurnitureDetailsViewSet(ReadOnlyModelViewSet):
+class FurnitureDetailsViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет для отображения особенностей конструкции товаров."""
 
     queryset = FurnitureDetails.objects.all()
     serializer_class = FurnitureDetailsSerializer
+    catalog_groups = ('furniture_details',)
 
 
-class ProductViewSet(ReadOnlyModelViewSet):
+class ProductFieldsMixin:
+    """
+    Состав полей товаров в ответе.
+
+    ?fields=id,name,total_price - только перечисленные поля. ?include=category,color - объекты справочников
+    выводятся один раз в словаре included по id, а в товарах остаются только их id.
+    """
+
+    includable_fields = ('category', 'color', 'collection', 'material', 'legs_material', 'furniture_details')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        params = self.request.query_params
+        if fields := params.get('fields'):
+            context['fields'] = set(self.split_names(fields))
+        if include := params.get('include'):
+            names = set(self.split_names(include))
+            if unknown := names - set(self.includable_fields):
+                raise ValidationError({'include': f'Неизвестные поля: {", ".join(sorted(unknown))}.'})
+            context['include'], context['included'] = names, {}
+        return context
+
+    @staticmethod
+    def split_names(value):
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    @staticmethod
+    def with_included(data, context):
+        """Добавляет к данным ответа объекты справочников, собранные при сериализации."""
+        if 'included' in context:
+            data['included'] = context['included']
+        return data
+
+
+class ProductViewSet(ProductFieldsMixin, StreamingListMixin, CatalogCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет для товаров."""
 
-    queryset = Product.objects.all().select_related(
-        'product_type', 'color', 'images', 'material', 'legs_material', 'furniture_details', 'category', 'collection'
-    )
+    queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = (DjangoFilterBackend, SearchFilter)
+    filter_backends = (DjangoFilterBackend, ProductSearchFilter)
     filterset_class = ProductsFilter
-    search_fields = ('name',)
+    pagination_class = ProductPagination
+    catalog_groups = PRODUCT_GROUPS
+    catalog_personal = True
+    # Группы состояния товаров, от которых зависят ответы действий: остатки выводятся в товарах, рейтинг -
+    # фильтр списка и фасетов, популярность и похожие товары - отдельные подборки.
+    catalog_state_groups = {
+        'list': ('stock', 'ratings'),
+        'facets': ('stock', 'ratings'),
+        'retrieve': ('stock', 'similar'),
+        'popular': ('stock', 'popularity'),
+    }
+
+    def get_catalog_groups(self):
+        # Подсказки обновляются в каждом процессе со своей задержкой и не помечаются версией каталога.
+        if self.action == 'suggest':
+            return ()
+        return (*self.catalog_groups, *self.catalog_state_groups.get(self.action, ()))
+
+    def get_queryset(self):
+        """Товары с аннотациями остатка и рейтинга."""
+        return super().get_queryset().for_listing()
+
+    def is_catalog_cacheable(self):
+        return not self.is_streaming()
+
+    @product_fields
+    def list(self, request, *args, **kwargs):
+        """Список товаров, сериализуемый из строк выборки без создания объектов моделей."""
+        context = self.get_serializer_context()
+        serializer = RowSerializer(self.get_serializer_class(), context)
+        rows = serializer.get_rows(self.filter_queryset(self.get_queryset()))
+        if self.is_streaming():
+            # В потоке нет места для словаря included, справочники выводятся в товарах целиком.
+            context.pop('include', None)
+            return self.get_streaming_response(rows, serializer.represent)
+        page = self.paginate_queryset(rows)
+        response = self.get_paginated_response(serializer.to_representation(page))
+        self.with_included(response.data, context)
+        return response
 
+    @product_fields
     def retrieve(self, request, *args, **kwargs):
-        """Выводит информацию о товаре и таких же товарах в другом цвете."""
+        """Выводит информацию о товаре, таких же товарах в другом цвете и похожих товарах."""
         product = self.get_object()
-        similar_products = self.get_queryset().filter(category=product.category)
-        other_color_same_products = similar_products.filter(
-            product_type=product.product_type, name=product.name
-        ).exclude(color=product.color)
+        same_category_products = self.get_queryset().filter(category_id=product.category_id)
+        other_color_same_products = same_category_products.filter(
+            product_type_id=product.product_type_id, name=product.name
+        ).exclude(color_id=product.color_id)
+        similar_products = (
+            list(self.get_queryset().filter(similar_to__product=product).order_by('similar_to__rank'))
+            or same_category_products.exclude(pk=product.pk)[: settings.SIMILAR_PRODUCTS_COUNT]
+        )
+        context = self.get_serializer_context()
         serializer = ProductAllColors(
             instance={
                 'product': product,
                 'other_color_same_products': other_color_same_products,
                 'similar_products': similar_products,
             },
-            context={'request': request},
+            context=context,
         )
-        return Response(serializer.data)
+        return Response(self.with_included(serializer.data, context))
 
+    @product_fields
     @action(detail=False)
     def popular(self, request, top=6):
-        """Возвращает топ популярных товаров."""
-        popular_products = (
-            Product.objects.annotate(total_quantity=Sum('order_products__quantity'))
-            .filter(total_quantity__gt=0)
-            .order_by('-total_quantity')[:top]
-        )
-        serializer = ShortProductSerializer(popular_products, many=True, context={'request': request})
-        return Response(serializer.data)
+        """Возвращает топ популярных товаров, в том числе в категории (?category=slug)."""
+        popular_products = Product.objects.for_listing().filter(popularity__score__gt=0)
+        if slug := request.query_params.get('category'):
+            category = categories.get_by('slug', slug)
+            if category is None:
+                raise Http404
+            popular_products = popular_products.filter(popularity__category_id=category.pk)
+        serializer = RowSerializer(ShortProductSerializer, self.get_serializer_context())
+        rows = serializer.get_rows(popular_products.order_by('-popularity__score', 'pk'))[:top]
+        return Response(serializer.to_representation(rows))
 
     @action(detail=False, methods=['GET'])
-    def materials_by_category(self, request):
-        categories = Category.objects.all()
-        materials_by_category = {}
+    def facets(self, request):
+        """Количество товаров по значениям каждого фильтра с учётом применённых фильтров."""
+        return Response(count_facets(self.filter_queryset(Product.objects.all())))
 
-        for category in categories:
-            products = Product.objects.filter(category=category)
-            materials = Material.objects.filter(products__in=products).distinct()
-            serializer = MaterialSerializer(materials, many=True)
-            materials_by_category[category.slug] = serializer.data
+    @suggest
+    @action(detail=False, methods=['GET'])
+    def suggest(self, request):
+        """Подсказки для строки поиска из индекса в памяти, без запросов к базе данных."""
+        try:
+            limit = min(max(int(request.query_params.get('limit', SUGGESTIONS_LIMIT)), 1), SUGGESTIONS_LIMIT)
+        except ValueError:
+            limit = SUGGESTIONS_LIMIT
+        return Response(suggest_index.suggest(request.query_params.get('q', ''), limit))
 
+    @action(detail=False, methods=['GET'])
+    def materials_by_category(self, request):
+        """Материалы товаров по категориям."""
+        rows = (
+            Category.objects.order_by('pk', 'products__material__name')
+            .values_list('slug', 'products__material__id', 'products__material__name')
+            .distinct()
+        )
+        materials_by_category = {}
+        for slug, material_id, material_name in rows:
+            materials = materials_by_category.setdefault(slug, [])
+            if material_id is not None:
+                materials.append({'id': material_id, 'name': material_name})
         return Response(materials_by_category)
 
 
-class CollectionViewSet(ReadOnlyModelViewSet):
+class CollectionViewSet(ProductFieldsMixin, CatalogCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет для коллекций. Только чтение одного или списка объектов."""
 
     queryset = Collection.objects.all()
+    catalog_groups = PRODUCT_GROUPS
+    catalog_personal = True
+
+    def get_catalog_groups(self):
+        if self.action == 'list':
+            return ('collections',)
+        return (*self.catalog_groups, 'stock')
 
     def get_serializer_class(self):
         if self.action == 'list':
             return CollectionSerializer
         return ProductSerializer
 
+    @product_fields
     def retrieve(self, request, *args, **kwargs):
         collection = self.get_object()
-        serializer = self.get_serializer(collection.products, many=True)
-        return Response(serializer.data)
+        products = Product.objects.for_listing().filter(collection=collection)
+        context = self.get_serializer_context()
+        serializer = RowSerializer(self.get_serializer_class(), context)
+        paginator = ProductPagination()
+        page = paginator.paginate_queryset(serializer.get_rows(products), request, view=self)
+        response = paginator.get_paginated_response(serializer.to_representation(page))
+        self.with_included(response.data, context)
+        return response
 
 
 @api_view(('GET',))
+@catalog_cache('products')
 def brand_list(request):
     """Список брендов товаров."""
     brand_list = Product.objects.values('brand').order_by().distinct()
@@ -8,3 +8,6 @@ class ReviewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.reviews'
     verbose_name = 'отзывы'
+
+    def ready(self):
+        import apps.reviews.signals  # noqa: F401
@@ -0,0 +1,12 @@
+"""Сигналы приложения отзывов."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.product.catalog import bump_catalog_version
+from apps.reviews.models import Rating
+
+
+@receiver((post_save, post_delete), sender=Rating)
+def bump_ratings_on_change(sender, **kwargs):
+    """Увеличивает версию рейтингов товаров."""
+    bump_catalog_version('ratings')
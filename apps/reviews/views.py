@@ -1,14 +1,22 @@
 """Модуль представления для приложения отзывов."""
+from django.db.models import Prefetch
 from rest_framework.viewsets import ModelViewSet
 
+from apps.product.models import Product
 from apps.reviews.models import Review
 from apps.reviews.serializers import ReviewSerializer
+from common.pagination import ReviewPagination
 from common.permisions import IsOwner
 
 
 class ReviewViewSet(ModelViewSet):
     """Представление для отзывов."""
 
-    queryset = Review.objects.all().select_related('user', 'product')
+    queryset = Review.objects.all().select_related('user')
     serializer_class = ReviewSerializer
     permission_classes = (IsOwner,)
+    pagination_class = ReviewPagination
+
+    def get_queryset(self):
+        """Отзывы с товарами, аннотированными для отображения."""
+        return super().get_queryset().prefetch_related(Prefetch('product', queryset=Product.objects.for_listing()))
@@ -1,12 +1,17 @@
 """Классы представлений для пользователей."""
 from django.contrib.auth import get_user_model
 from djoser.views import UserViewSet as DjoserUserViewSet
+from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.views import TokenObtainPairView as SimpleJWTTokenObtainPairView
 
 from apps.orders.models import Order
 from apps.orders.serializers import OrderReadSerializer
+from apps.product.cart import merge_anonymous_cart
 from apps.users.serializers import UserSerializer
+from common.pagination import OrderPagination
 
 User = get_user_model()
 
@@ -20,6 +25,21 @@ class UserViewSet(DjoserUserViewSet):
     @action(detail=False)
     def my_orders(self, request):
         """Заказы пользователя."""
-        queryset = Order.objects.filter(user=request.user)
-        serializer = OrderReadSerializer(queryset, many=True)
-        return Response(serializer.data)
+        queryset = Order.objects.for_read().filter(user=request.user)
+        paginator = OrderPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = OrderReadSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class TokenObtainPairView(SimpleJWTTokenObtainPairView):
+    """Выдача JWT по email и паролю с переносом анонимной корзины и избранного в аккаунт."""
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as error:
+            raise InvalidToken(error.args[0])
+        merge_anonymous_cart(request, serializer.user)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
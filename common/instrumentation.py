@@ -0,0 +1,77 @@
+"""
+Измерение чтений кэша.
+
+Обёртки get и get_many подключаются к классам бэкендов кэша один раз и передают каждое внешнее чтение
+подписчикам: common.metrics считает попадания и промахи по пространствам ключей, common.profiling - время
+и попадания профилируемого запроса. Вложенные чтения (BaseCache.get_many вызывает get для каждого ключа)
+подписчикам не передаются, поэтому каждый ключ учитывается один раз.
+"""
+import functools
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Подписчики: функции (results, duration), где results - пары (ключ, попадание), duration - секунды.
+cache_listeners = []
+
+reading = ContextVar('cache_reading', default=False)
+
+
+def notify(results, duration):
+    for listener in cache_listeners:
+        listener(results, duration)
+
+
+def counted_get(function):
+    """Обёртка cache.get: промах - возврат значения по умолчанию."""
+
+    @functools.wraps(function)
+    def wrapper(self, key, default=None, *args, **kwargs):
+        if reading.get():
+            return function(self, key, default, *args, **kwargs)
+        token = reading.set(True)
+        started = time.perf_counter()
+        try:
+            value = function(self, key, default, *args, **kwargs)
+        finally:
+            reading.reset(token)
+        notify([(key, value is not default)], time.perf_counter() - started)
+        return value
+
+    return wrapper
+
+
+def counted_get_many(function):
+    @functools.wraps(function)
+    def wrapper(self, keys, *args, **kwargs):
+        if reading.get():
+            return function(self, keys, *args, **kwargs)
+        keys = list(keys)
+        token = reading.set(True)
+        started = time.perf_counter()
+        try:
+            values = function(self, keys, *args, **kwargs)
+        finally:
+            reading.reset(token)
+        notify([(key, key in values) for key in keys], time.perf_counter() - started)
+        return values
+
+    return wrapper
+
+
+def on_cache_read(listener):
+    """Подписывает listener на чтения кэша и при первом вызове подключает обёртки; повторная подписка не действует."""
+    global installed
+    if listener not in cache_listeners:
+        cache_listeners.append(listener)
+    if installed:
+        return
+    installed = True
+    for backend in {type(caches[alias]) for alias in settings.CACHES}:
+        backend.get = counted_get(backend.get)
+        backend.get_many = counted_get_many(backend.get_many)
+
+
+installed = False
@@ -0,0 +1,111 @@
+"""
+Метрики Prometheus.
+
+MetricsMiddleware учитывает для каждого запроса следующие метрики:
+- время ответа по имени маршрута (view_name из config/api_router.py);
+- код ответа;
+- количество SQL-запросов.
+
+Попадания и промахи кэша считаются по пространству ключей, то есть по части ключа до первого ':', через
+общие обёртки кэша common.instrumentation.
+Заказы и конфликты остатков считают сериализаторы заказов. Метрики отдаёт metrics_view в текстовом
+формате Prometheus.
+
+Каждый воркер gunicorn/uvicorn - отдельный процесс. Если задана переменная окружения
+PROMETHEUS_MULTIPROC_DIR, prometheus_client пишет значения в файлы этого каталога, а metrics_view
+суммирует файлы всех процессов. Переменная должна быть задана до запуска воркеров, а каталог - очищаться
+при перезапуске сервиса (см. compose/*/django/start). Без неё метрики собирает только текущий процесс.
+"""
+import hmac
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from common.instrumentation import on_cache_read
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Время ответа на запрос.', ('route', 'method'))
+RESPONSES = Counter('http_responses', 'Ответы по кодам.', ('route', 'method', 'status'))
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Количество SQL-запросов на запрос.',
+    ('route',),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, float('inf')),
+)
+CACHE_REQUESTS = Counter('cache_requests', 'Чтения кэша: result - hit или miss.', ('namespace', 'result'))
+ORDERS_CREATED = Counter('orders_created', 'Созданные заказы.')
+STOCK_CONFLICTS = Counter('stock_conflicts', 'Заказы, отклонённые из-за нехватки товара на складе.')
+
+# Маршрут запросов, не найденных в URLconf: путь в метку не попадает, чтобы не плодить ряды.
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+def get_namespace(key):
+    return key.partition(':')[0] if isinstance(key, str) and ':' in key else 'other'
+
+
+def count_cache_reads(results, duration):
+    """Подписчик common.instrumentation: попадания и промахи по пространствам ключей."""
+    for key, hit in results:
+        CACHE_REQUESTS.labels(get_namespace(key), 'hit' if hit else 'miss').inc()
+
+
+class QueryCounter:
+    """execute_wrapper, считающий SQL-запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Учитывает время, код ответа и количество SQL-запросов по маршрутам."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        on_cache_read(count_cache_reads)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        counter = QueryCounter()
+        with connections['default'].execute_wrapper(counter):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else UNMATCHED_ROUTE
+        REQUEST_DURATION.labels(route, request.method).observe(duration)
+        RESPONSES.labels(route, request.method, response.status_code).inc()
+        REQUEST_QUERIES.labels(route).observe(counter.count)
+        return response
+
+
+def get_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """
+    Метрики всех процессов в текстовом формате Prometheus - только с токеном METRICS_TOKEN.
+
+    Без токена метрики отдаются только при DEBUG, иначе адрес не существует.
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            raise Http404
+    elif not hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', '').encode(), f'Bearer {settings.METRICS_TOKEN}'.encode()
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,231 @@
+"""Пагинация по ключу сортировки (keyset) с оценкой общего количества записей."""
+import json
+from base64 import b64decode, b64encode
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по ключу сортировки.
+
+    Курсор хранит значения полей ordering у крайнего элемента страницы, поэтому следующая страница
+    выбирается условием (name, id) > (:name, :id) по индексу, без OFFSET. Общее количество записей
+    возвращается только по запросу (?count=true) и для больших выборок берётся из оценки планировщика.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_query_param = 'count'
+    # Последнее поле должно быть уникальным, чтобы ключ однозначно определял позицию.
+    ordering = ('pk',)
+    # Начиная с этой оценки количества строк вместо COUNT(*) используется оценка планировщика.
+    estimate_count_threshold = 10000
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.key_fields = self.get_ordering(queryset)
+        values, self.reverse = self.decode_cursor(request)
+
+        self.count = None
+        if self.is_count_requested(request):
+            self.count, self.count_is_estimated = self.get_count(queryset)
+
+        ordering = [self.flip(field) for field in self.key_fields] if self.reverse else list(self.key_fields)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, values))
+        results = list(queryset.order_by(*ordering)[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.has_next = (not self.reverse and has_more) or (self.reverse and values is not None)
+        self.has_previous = (self.reverse and has_more) or (not self.reverse and values is not None)
+        self.first_values = self.get_item_values(results[0]) if results else None
+        self.last_values = self.get_item_values(results[-1]) if results else None
+        return results
+
+    def order_queryset(self, queryset, request):
+        """Выборка целиком в порядке страниц, для выдачи списка без пагинации."""
+        self.request = request
+        return queryset.order_by(*self.get_ordering(queryset))
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.count is not None:
+            response.update(count=self.count, count_is_estimated=self.count_is_estimated)
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer', 'description': f'Только при ?{self.count_query_param}=true'},
+                'count_is_estimated': {'type': 'boolean'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Курсор страницы из ссылок next/previous.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Количество элементов на странице, не более {self.max_page_size}.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Вернуть общее количество элементов (для больших выборок - оценку).',
+                'schema': {'type': 'boolean'},
+            },
+        ]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def is_count_requested(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.last_values, reverse=False)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_values is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.first_values, reverse=True)
+        )
+
+    def encode_cursor(self, values, reverse):
+        # str() сохраняет микросекунды у datetime, в отличие от DjangoJSONEncoder.
+        data = json.dumps({'v': values, 'r': reverse}, default=str, separators=(',', ':'))
+        return b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        """Возвращает значения ключа и направление обхода из курсора запроса."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            values, reverse = data['v'], bool(data['r'])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.key_fields):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def get_ordering(self, queryset):
+        """Поля сортировки для выборки, по умолчанию - ordering."""
+        return self.ordering
+
+    def get_item_values(self, item):
+        return [getattr(item, field.lstrip('-')) for field in self.key_fields]
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def get_keyset_filter(ordering, values):
+        """Строит условие "строка после ключа" для составной сортировки."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def get_count(self, queryset):
+        """Возвращает количество записей и признак того, что это оценка планировщика."""
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            estimate = self.estimate_count(queryset, connection)
+            if estimate >= self.estimate_count_threshold:
+                return estimate, True
+        return queryset.count(), False
+
+    @staticmethod
+    def estimate_count(queryset, connection):
+        """Оценка количества строк по плану запроса (EXPLAIN) без его выполнения."""
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class ProductPagination(KeysetPagination):
+    """Пагинация товаров по названию или цене (?ordering=), а результатов поиска - по релевантности."""
+
+    ordering = ('name', 'pk')
+    ordering_query_param = 'ordering'
+    orderings = {'name': ordering, 'price': ('effective_price', 'pk'), '-price': ('-effective_price', '-pk')}
+    search_ordering = ('-search_rank', 'pk')
+
+    def get_ordering(self, queryset):
+        if 'search_rank' in queryset.query.annotations:
+            return self.search_ordering
+        return self.orderings.get(self.request.query_params.get(self.ordering_query_param), self.ordering)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.ordering_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Сортировка: name (по умолчанию), price или -price.',
+                'schema': {'type': 'string', 'enum': list(self.orderings)},
+            }
+        ]
+
+
+class ReviewPagination(KeysetPagination):
+    """Пагинация отзывов, новые первыми."""
+
+    ordering = ('-pk',)
+
+
+class OrderPagination(KeysetPagination):
+    """Пагинация заказов, новые первыми."""
+
+    ordering = ('-created', '-pk')
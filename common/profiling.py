@@ -0,0 +1,216 @@
+"""
+Профилирование запросов.
+
+ProfilingMiddleware собирает для профилируемого запроса следующие измерения:
+- количество и время SQL-запросов;
+- попадания и промахи кэша;
+- время сериализации;
+- время представления.
+
+Профилируются запросы, попавшие в выборку PROFILING_SAMPLE_RATE, и запросы, в которых значение заголовка
+PROFILING_HEADER совпадает с PROFILING_TOKEN (без токена заголовок действует только при DEBUG). Заголовок
+проверяется до представления, поэтому прочие запросы не включают обёртки сериализаторов. Результат
+отдаётся в заголовке Server-Timing и записывается в лог profiling вместе с самыми частыми шаблонами SQL.
+
+Чтения кэша приходят из общих обёрток common.instrumentation: без текущего профиля подписчик только
+проверяет ContextVar. Сериализаторы DRF оборачиваются только на время профилируемых запросов, поэтому
+при выключенной выборке остальные запросы через обёртки не проходят. Потоковые ответы
+формируются после выхода из middleware, для них учитывается только подготовка ответа.
+"""
+import functools
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.serializers import BaseSerializer, ListSerializer, Serializer
+
+from common.instrumentation import on_cache_read
+from common.queries import repeated_queries
+
+logger = logging.getLogger('profiling')
+
+current_profile = ContextVar('current_profile', default=None)
+
+# Виды измерений в порядке вывода в Server-Timing.
+TIMINGS = ('db', 'cache', 'serialize', 'view', 'total')
+
+
+class Profile:
+    """Измерения одного запроса; внутри блока with - профиль текущего запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.queries = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # {вид из TIMINGS: секунды}.
+        self.timings = defaultdict(float)
+        # Виды, время которых сейчас измеряется: вложенные вызовы не учитываются повторно.
+        self.active = set()
+
+    def __enter__(self):
+        self.token = current_profile.set(self)
+        self.stack = ExitStack()
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self.execute))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+        current_profile.reset(self.token)
+        now = time.perf_counter()
+        self.timings['total'] = now - self.started
+        if self.view_started is not None:
+            self.timings['view'] = now - self.view_started
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.timings['db'] += duration
+            self.queries.append({'sql': sql, 'time': duration})
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing."""
+        descriptions = {
+            'db': f'{len(self.queries)} queries',
+            'cache': f'{self.cache_hits} hits, {self.cache_misses} misses',
+        }
+        return ', '.join(
+            f'{name};dur={self.timings[name] * 1000:.1f}'
+            + (f';desc="{descriptions[name]}"' if name in descriptions else '')
+            for name in TIMINGS
+            if name in self.timings
+        )
+
+    def as_dict(self, request, response):
+        match = getattr(request, 'resolver_match', None)
+        return {
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': len(self.queries),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            **{f'{name}_ms': round(self.timings[name] * 1000, 1) for name in TIMINGS if name in self.timings},
+            'repeated_queries': repeated_queries(self.queries),
+        }
+
+
+def timed(kind):
+    """Декоратор: время вызовов добавляется к виду kind профиля текущего запроса."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None or kind in profile.active:
+                return function(*args, **kwargs)
+            profile.active.add(kind)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.timings[kind] += time.perf_counter() - started
+                profile.active.discard(kind)
+
+        return wrapper
+
+    return decorator
+
+
+def profile_cache_reads(results, duration):
+    """Подписчик common.instrumentation: время и попадания кэша в профиле текущего запроса."""
+    if profile := current_profile.get():
+        hits = sum(hit for _, hit in results)
+        profile.cache_hits += hits
+        profile.cache_misses += len(results) - hits
+        profile.timings['cache'] += duration
+
+
+class SerializerPatches:
+    """
+    Обёртки сериализаторов DRF, подключённые, пока идёт хотя бы один профилируемый запрос.
+
+    Первый профилируемый запрос подменяет методы классов, последний завершившийся - возвращает исходные.
+    Одновременные непрофилируемые запросы в это время проходят через обёртки, но только проверяют ContextVar.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+        self.originals = []
+
+    def __enter__(self):
+        with self.lock:
+            if not self.users:
+                self.originals = [
+                    (owner, name, owner.__dict__[name])
+                    for owner, name in (
+                        (BaseSerializer, 'data'),
+                        (Serializer, 'to_representation'),
+                        (ListSerializer, 'to_representation'),
+                    )
+                ]
+                BaseSerializer.data = property(timed('serialize')(BaseSerializer.data.fget))
+                Serializer.to_representation = timed('serialize')(Serializer.to_representation)
+                ListSerializer.to_representation = timed('serialize')(ListSerializer.to_representation)
+            self.users += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.lock:
+            self.users -= 1
+            if not self.users:
+                for owner, name, original in self.originals:
+                    setattr(owner, name, original)
+
+
+serializer_patches = SerializerPatches()
+
+
+class ProfilingMiddleware:
+    """Профилирует часть запросов и отдаёт результат в Server-Timing и в лог profiling."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.header = 'HTTP_' + settings.PROFILING_HEADER.upper().replace('-', '_')
+        on_cache_read(profile_cache_reads)
+
+    def __call__(self, request):
+        if not (random.random() < self.sample_rate or self.requested(request)):
+            return self.get_response(request)
+        with serializer_patches, Profile() as profile:
+            request.profile = profile
+            response = self.get_response(request)
+        response['Server-Timing'] = profile.server_timing()
+        logger.info(json.dumps(profile.as_dict(request, response), ensure_ascii=False))
+        return response
+
+    def requested(self, request):
+        """Профиль запрошен заголовком с токеном PROFILING_TOKEN; без токена - любым значением при DEBUG."""
+        value = request.META.get(self.header)
+        if value is None:
+            return False
+        if not settings.PROFILING_TOKEN:
+            return settings.DEBUG
+        return hmac.compare_digest(value.encode(), settings.PROFILING_TOKEN.encode())
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if profile := getattr(request, 'profile', None):
+            profile.view_started = time.perf_counter()
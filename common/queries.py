@@ -0,0 +1,20 @@
+"""Шаблоны SQL-запросов для поиска повторяющихся запросов (N+1)."""
+import re
+from collections import Counter
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+LISTS = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Запрос без значений: строки и числа заменяются на ?, списки IN - на (...)."""
+    sql = LITERALS.sub('?', sql)
+    sql = LISTS.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def repeated_queries(queries, limit=5):
+    """До limit шаблонов запросов, выполненных больше одного раза: [(количество, шаблон)]."""
+    counts = Counter(fingerprint(query['sql']) for query in queries)
+    return [(count, sql) for sql, count in counts.most_common(limit) if count > 1]
@@ -0,0 +1,128 @@
+"""Стеммер русского языка по алгоритму Snowball (Портера)."""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'), ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему',
+    'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)  # fmt: skip
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило',
+        'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)  # fmt: skip
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям',
+    'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+)  # fmt: skip
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+WORD_RE = re.compile(r'\w+')
+
+
+def regions(word):
+    """Возвращает начала областей RV и R2 слова."""
+    rv = r1 = r2 = len(word)
+    for index, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def find_ending(word, start, endings, preceded=False):
+    """Возвращает самое длинное окончание из endings в области слова, начиная с позиции start."""
+    for ending in sorted(endings, key=len, reverse=True):
+        if word.endswith(ending) and len(word) - len(ending) >= start:
+            if not preceded:
+                return ending
+            position = len(word) - len(ending) - 1
+            if position >= start and word[position] in 'ая':
+                return ending
+    return None
+
+
+def remove_grouped(word, start, groups):
+    """Удаляет окончание из групп: первая группа требует предшествующей «а» или «я»."""
+    candidates = [
+        ending
+        for ending in (find_ending(word, start, groups[0], preceded=True), find_ending(word, start, groups[1]))
+        if ending
+    ]
+    if not candidates:
+        return None
+    return word[: -len(max(candidates, key=len))]
+
+
+def remove_adjectival(word, start):
+    ending = find_ending(word, start, ADJECTIVE)
+    if not ending:
+        return None
+    word = word[: -len(ending)]
+    return remove_grouped(word, start, PARTICIPLE) or word
+
+
+def stem(word):
+    """Возвращает основу русского слова."""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = regions(word)
+    if rv >= len(word):
+        return word
+
+    # Шаг 1
+    result = remove_grouped(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        ending = find_ending(word, rv, REFLEXIVE)
+        if ending:
+            word = word[: -len(ending)]
+        for remove in (
+            lambda value: remove_adjectival(value, rv),
+            lambda value: remove_grouped(value, rv, VERB),
+            lambda value: value[: -len(noun)] if (noun := find_ending(value, rv, NOUN)) else None,
+        ):
+            result = remove(word)
+            if result is not None:
+                break
+        else:
+            result = word
+    word = result
+
+    # Шаг 2
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3
+    ending = find_ending(word, r2, DERIVATIONAL)
+    if ending:
+        word = word[: -len(ending)]
+
+    # Шаг 4
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    ending = find_ending(word, rv, SUPERLATIVE)
+    if ending:
+        word = word[: -len(ending)]
+        return word[:-1] if word.endswith('нн') else word
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Разбивает текст на основы слов."""
+    return [stem(word) for word in WORD_RE.findall(text or '')]
@@ -0,0 +1,76 @@
+"""
+Потоковая выдача списков в JSON.
+
+Выборка читается iterator(chunk_size), каждый элемент кодируется orjson отдельно, а JSON-массив отдаётся
+StreamingHttpResponse кусками по BUFFER_SIZE байт, поэтому память процесса не зависит от размера списка.
+Под ASGI куски отдаются асинхронным итератором: синхронный итератор Django собрал бы в память целиком.
+"""
+import orjson
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+BUFFER_SIZE = 64 * 1024
+
+# Типы, которые не поддерживает orjson (Decimal, ленивые строки), кодируются как в JSONRenderer DRF.
+encoder = JSONEncoder()
+
+
+def iter_json_array(items, buffer_size=BUFFER_SIZE):
+    """Куски JSON-массива из items размером не меньше buffer_size байт, кроме последнего."""
+    buffer = bytearray(b'[')
+    separator = b''
+    for item in items:
+        buffer += separator
+        buffer += orjson.dumps(item, default=encoder.default)
+        separator = b','
+        if len(buffer) >= buffer_size:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b']'
+    yield bytes(buffer)
+
+
+async def iterate_in_thread(iterator):
+    """
+    Асинхронный итератор по синхронному.
+
+    Каждый шаг выполняется в потоке синхронного кода запроса (thread_sensitive), в том же, где выполнялось
+    представление, поэтому выборка использует то же подключение к базе данных.
+    """
+    step = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await step(iterator, None)) is not None:
+        yield chunk
+
+
+class StreamingJSONResponse(StreamingHttpResponse):
+    """Ответ с JSON-массивом элементов items, отдаваемым по частям."""
+
+    def __init__(self, items, request, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        content = iter_json_array(items)
+        if isinstance(getattr(request, '_request', request), ASGIRequest):
+            content = iterate_in_thread(content)
+        super().__init__(content, **kwargs)
+
+
+class StreamingListMixin:
+    """
+    Выдача списка целиком без пагинации потоком JSON-массива (?stream=true).
+
+    Элементы идут в порядке страниц пагинатора вьюсета и читаются из базы пачками по stream_chunk_size.
+    """
+
+    stream_query_param = 'stream'
+    stream_chunk_size = 500
+
+    def is_streaming(self):
+        return self.request.query_params.get(self.stream_query_param, '').lower() in ('1', 'true')
+
+    def get_streaming_response(self, queryset, represent):
+        """Ответ со списком represent(элемент) для всех элементов queryset."""
+        if self.paginator is not None:
+            queryset = self.paginator.order_queryset(queryset, self.request)
+        items = map(represent, queryset.iterator(chunk_size=self.stream_chunk_size))
+        return StreamingJSONResponse(items, self.request)
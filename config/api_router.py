@@ -7,6 +7,7 @@ from apps.orders.views import DeliveryTypeViewSet, DeliveryViewSet, OrderViewSet
 from apps.product.cart_views import (
     add_cartitem,
     add_favorite,
+    cart_batch,
     cart_items,
     delete_cartitem,
     delete_favorite,
@@ -45,6 +46,7 @@ urlpatterns = [
     path('carts/items/', cart_items, name='items'),
     path('carts/add_item/', add_cartitem, name='add_item'),
     path('carts/delete_item/<int:id>/', delete_cartitem, name='delete_item'),
+    path('carts/batch/', cart_batch, name='cart_batch'),
     path('favorites/list/', favorite_list, name='fav_list'),
     path('favorites/add_favorite/', add_favorite, name='add_favorite'),
     path('favorites/delete_favorite/<int:id>/', delete_favorite, name='delete_favorite'),
@@ -59,6 +59,7 @@ DJANGO_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.admin',
+    'django.contrib.postgres',
     'django.forms',
 ]
 THIRD_PARTY_APPS = [
@@ -108,6 +109,8 @@ AUTH_PASSWORD_VALIDATORS = [
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    'common.metrics.MetricsMiddleware',
+    'common.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -203,6 +206,29 @@ ADMINS = [("""backend team """, 'backend-team@example.com')]
 # https://docs.djangoproject.com/en/dev/ref/settings/#managers
 MANAGERS = ADMINS
 
+# PROFILING
+# ------------------------------------------------------------------------------
+# Доля запросов, которые профилирует common.profiling.ProfilingMiddleware (0 - только по заголовку).
+PROFILING_SAMPLE_RATE = env.float('DJANGO_PROFILING_SAMPLE_RATE', default=0)
+# Заголовок запроса, включающий профилирование; его значение должно совпасть с PROFILING_TOKEN.
+PROFILING_HEADER = 'X-Profile'
+# Без токена профилирование по заголовку работает только при DEBUG.
+PROFILING_TOKEN = env('DJANGO_PROFILING_TOKEN', default='')
+# В файл пишут все процессы сервиса, поэтому сами они его не ротируют: файл ротируется снаружи (logrotate
+# без copytruncate), а WatchedFileHandler открывает новый файл после переименования.
+PROFILING_LOG_HANDLER = {
+    'level': 'INFO',
+    'class': 'logging.handlers.WatchedFileHandler',
+    'filename': env('DJANGO_PROFILING_LOG_FILE', default=str(BASE_DIR / 'profiles.log')),
+    'delay': True,
+}
+
+# METRICS
+# ------------------------------------------------------------------------------
+# Токен для /metrics/ (заголовок Authorization: Bearer <токен>); без токена метрики отдаются только при DEBUG.
+# Метрики процессов суммируются, если задана переменная окружения PROMETHEUS_MULTIPROC_DIR (см. common.metrics).
+METRICS_TOKEN = env('DJANGO_METRICS_TOKEN', default='')
+
 # LOGGING
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#logging
@@ -212,8 +238,12 @@ LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {'verbose': {'format': '%(levelname)s %(asctime)s %(module)s %(process)d %(thread)d %(message)s'}},
-    'handlers': {'console': {'level': 'DEBUG', 'class': 'logging.StreamHandler', 'formatter': 'verbose'}},
+    'handlers': {
+        'console': {'level': 'DEBUG', 'class': 'logging.StreamHandler', 'formatter': 'verbose'},
+        'profiling': PROFILING_LOG_HANDLER,
+    },
     'root': {'level': 'INFO', 'handlers': ['console']},
+    'loggers': {'profiling': {'handlers': ['profiling'], 'level': 'INFO', 'propagate': False}},
 }
 
 
@@ -256,9 +286,47 @@ SIMPLE_JWT = {
 ADMIN_EMPTY_VALUE_DISPLAY = '--пусто--'
 
 CART_SESSION_ID = 'cart'
+# Хранилище корзины и избранного анонимного пользователя (см. apps.product.cart_storage)
+CART_STORAGE = {'BACKEND': 'apps.product.cart_storage.SessionCartStorage'}
+# Количество товара, который при входе есть и в анонимной корзине, и в корзине пользователя:
+# sum - сумма, max - большее, account - из корзины пользователя, anonymous - из анонимной корзины
+CART_MERGE_POLICY = env('DJANGO_CART_MERGE_POLICY', default='sum')
+# Наибольшее количество операций в одном запросе /api/carts/batch/
+CART_BATCH_MAX_OPERATIONS = 100
 
 FAVORITE_SESSION_ID = 'favorite'
 
+# Количество похожих товаров, предрассчитываемых для каждого товара
+SIMILAR_PRODUCTS_COUNT = 12
+# Задержка пересчёта похожих товаров после изменения характеристик, секунды: изменения за это время
+# пересчитываются одной пачкой
+SIMILAR_PRODUCTS_UPDATE_DELAY = 30
+
+# Время жизни ответов каталога в кэше, секунды: записи устаревают раньше при изменении версии каталога
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Максимальный возраст индекса подсказок поиска в процессе до полной перестройки, секунды
+SUGGEST_INDEX_MAX_AGE = 60 * 5
+
+# Как часто процесс сверяет версии справочников в памяти с общим кэшем, секунды
+REFERENCE_CACHE_CHECK_INTERVAL = 1
+
+# Ширины уменьшенных копий изображений товаров, пиксели
+IMAGE_RENDITION_WIDTHS = (320, 640, 1280)
+# Форматы копий, неподдерживаемые установленным Pillow пропускаются (AVIF требует pillow-avif-plugin)
+IMAGE_RENDITION_FORMATS = ('avif', 'webp', 'jpeg')
+# Качество сжатия копий
+IMAGE_RENDITION_QUALITY = 80
+# Количество фоновых потоков процесса, строящих копии после загрузки изображений; 0 - копии строит только
+# команда build_renditions (в production и dev_prod её запускает сервис scheduler)
+IMAGE_RENDITION_WORKERS = env.int('DJANGO_IMAGE_RENDITION_WORKERS', default=2)
+
+# Файл бюджетов SQL-запросов и времени сериализации маршрутов API (команда check_query_budgets)
+QUERY_BUDGET_FILE = BASE_DIR / 'config' / 'query_budgets.json'
+
+# Период полураспада популярности товаров, дни
+POPULARITY_HALF_LIFE_DAYS = 30
+
 
 # Djoser settings
 DJOSER = {
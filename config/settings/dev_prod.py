@@ -12,8 +12,20 @@ ALLOWED_HOSTS = env.list('DJANGO_ALLOWED_HOSTS', default=['0.0.0.0'])
 # CACHES
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#caches
-CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': ''}}
+# Версии каталога, справочники и кэш ответов общие для веб-процесса и сервиса scheduler, поэтому кэш в Redis.
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': env('REDIS_URL', default='redis://redis:6379/0'),
+        'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient', 'IGNORE_EXCEPTIONS': True},
+    }
+}
+
 
+# IMAGES
+# ------------------------------------------------------------------------------
+# Копии изображений строит сервис scheduler, а не потоки веб-процессов (см. apps.product.renditions).
+IMAGE_RENDITION_WORKERS = env.int('DJANGO_IMAGE_RENDITION_WORKERS', default=0)
 
 # SECURITY
 # ------------------------------------------------------------------------------
@@ -71,9 +83,11 @@ LOGGING = {
             'class': 'django.utils.log.AdminEmailHandler',
         },
         'console': {'level': 'ERROR', 'class': 'logging.StreamHandler', 'formatter': 'verbose'},
+        'profiling': PROFILING_LOG_HANDLER,  # noqa: F405
     },
     'root': {'level': 'INFO', 'handlers': ['console']},
     'loggers': {
+        'profiling': {'handlers': ['profiling'], 'level': 'INFO', 'propagate': False},
         'django.request': {'handlers': ['mail_admins'], 'level': 'ERROR', 'propagate': True},
         'django.security.DisallowedHost': {
             'level': 'ERROR',
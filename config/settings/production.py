@@ -28,6 +28,21 @@ CACHES = {
     }
 }
 
+# CART
+# ------------------------------------------------------------------------------
+# Корзина и избранное анонимных пользователей хранятся в хешах Redis, а не в сессии.
+CART_STORAGE = {'BACKEND': 'apps.product.cart_storage.RedisCartStorage', 'LOCATION': env('REDIS_URL')}
+
+# METRICS
+# ------------------------------------------------------------------------------
+# Без токена /metrics/ в production не отдаётся, поэтому он обязателен.
+METRICS_TOKEN = env('DJANGO_METRICS_TOKEN')
+
+# IMAGES
+# ------------------------------------------------------------------------------
+# Копии изображений строит сервис scheduler, а не потоки веб-процессов (см. apps.product.renditions).
+IMAGE_RENDITION_WORKERS = env.int('DJANGO_IMAGE_RENDITION_WORKERS', default=0)
+
 # SECURITY
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#secure-proxy-ssl-header
@@ -100,9 +115,11 @@ LOGGING = {
             'class': 'django.utils.log.AdminEmailHandler',
         },
         'console': {'level': 'DEBUG', 'class': 'logging.StreamHandler', 'formatter': 'verbose'},
+        'profiling': PROFILING_LOG_HANDLER,  # noqa: F405
     },
     'root': {'level': 'INFO', 'handlers': ['console']},
     'loggers': {
+        'profiling': {'handlers': ['profiling'], 'level': 'INFO', 'propagate': False},
         'django.request': {'handlers': ['mail_admins'], 'level': 'ERROR', 'propagate': True},
         'django.security.DisallowedHost': {
             'level': 'ERROR',
@@ -20,6 +20,10 @@ PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
+# CART
+# ------------------------------------------------------------------------------
+CART_STORAGE = {'BACKEND': 'apps.product.cart_storage.LocMemCartStorage'}
+
 # DEBUGGING FOR TEMPLATES
 # ------------------------------------------------------------------------------
 TEMPLATES[0]['OPTIONS']['debug'] = True  # type: ignore # noqa: F405
@@ -3,10 +3,13 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.views import defaults as default_views
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from apps.users.views import TokenObtainPairView
+from common.metrics import metrics_view
+
 urlpatterns = [path(settings.ADMIN_URL, admin.site.urls)] + static(
     settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
 )
@@ -18,10 +21,13 @@ if settings.DEBUG:
 urlpatterns += [
     # API base url
     path('api/', include('config.api_router')),
-    # DRF auth token
+    # DRF auth token: выдача токена переносит анонимную корзину в аккаунт
+    re_path(r'^api/auth/jwt/create/?$', TokenObtainPairView.as_view(), name='jwt-create'),
     path('api/auth/', include('djoser.urls.jwt')),
     path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='api-schema'), name='api-docs'),
+    # Метрики Prometheus
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG: